@@ -0,0 +1,90 @@
+import pickle
+import random
+import time
+import uuid
+import codec
+import data
+
+
+# Сравнение формата кеша (codec) с pickle на месяце закрытых позиций
+# Запуск: python bench.py [количество позиций]
+
+SYMBOLS = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "XRPUSDT", "DOGEUSDT", "1000PEPEUSDT", "WIFUSDT", "TONUSDT"]
+REPEATS = 7
+
+
+def generate_closed_pnl(count, start_ms=1727740800000):
+    """Записи в формате ответа /v5/position/closed-pnl (все числа - строки, как у Bybit)"""
+    rnd = random.Random(42)
+    month_ms = 30 * 24 * 60 * 60 * 1000
+    records = []
+    for i in range(count):
+        updated = start_ms + i * month_ms // count
+        qty = round(rnd.uniform(0.001, 50), 3)
+        entry = round(rnd.uniform(0.1, 70000), 4)
+        exit_price = round(entry * rnd.uniform(0.97, 1.03), 4)
+        records.append({
+            "symbol": rnd.choice(SYMBOLS),
+            "orderType": rnd.choice(["Market", "Limit"]),
+            "leverage": str(rnd.choice([5, 10, 20])),
+            "updatedTime": str(updated),
+            "side": rnd.choice(["Buy", "Sell"]),
+            "orderId": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "closedPnl": f"{(exit_price - entry) * qty:.8f}",
+            "openFee": f"{entry * qty * 0.00055:.8f}",
+            "closeFee": f"{exit_price * qty * 0.00055:.8f}",
+            "avgEntryPrice": str(entry),
+            "qty": str(qty),
+            "cumEntryValue": f"{entry * qty:.4f}",
+            "createdTime": str(updated - rnd.randint(1000, 3600000)),
+            "orderPrice": str(exit_price),
+            "closedSize": str(qty),
+            "avgExitPrice": str(exit_price),
+            "execType": "Trade",
+            "fillCount": str(rnd.randint(1, 5)),
+            "cumExitValue": f"{exit_price * qty:.4f}"
+        })
+    return records
+
+
+def best_time(func, *args):
+    best = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(count):
+    records = generate_closed_pnl(count)
+    print(f"Закрытых позиций: {count}\n")
+    print(f"{'формат':<10}{'сохранение, мс':>16}{'загрузка, мс':>16}{'загрузка+график, мс':>22}{'размер, КБ':>14}")
+
+    results = {}
+    for name, dumps, loads in (
+        ("pickle", pickle.dumps, pickle.loads),
+        ("codec", codec.dumps, codec.loads),
+        # Локальное хранилище (DirectoryBackend): pickle в заголовке codec
+        ("local", lambda value: codec.dumps(value, compact=False), lambda blob: codec.loads(blob, allow_pickle=True)),
+    ):
+        blob = dumps(records)
+        # Загрузка вместе с подготовкой графика
+        prepare_s = best_time(lambda: data.prepare_data_for_plotly(loads(blob)))
+        results[name] = (best_time(dumps, records), best_time(loads, blob), len(blob))
+        save_s, load_s, size = results[name]
+        print(f"{name:<10}{save_s * 1000:>16.1f}{load_s * 1000:>16.1f}{prepare_s * 1000:>22.1f}{size / 1024:>14.1f}")
+
+    pickle_result = results["pickle"]
+    print()
+    for name in ("codec", "local"):
+        result = results[name]
+        print(f"{name} / pickle: сохранение x{result[0] / pickle_result[0]:.2f}, "
+              f"загрузка x{result[1] / pickle_result[1]:.2f}, "
+              f"размер x{result[2] / pickle_result[2]:.2f}")
+
+
+if __name__ == "__main__":
+    import sys
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,425 @@
+import os
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+
+# Хранилища записей кеша (второй уровень после памяти). Запись - байты codec.dumps;
+# хранилище знает, когда она записана (свежесть) и когда ее последний раз читали (вытеснение).
+#
+#   DirectoryBackend - файлы в локальной папке (по умолчанию)
+#   SQLiteBackend    - один файл SQLite, например на общем томе
+#   RedisBackend     - любой сервер с протоколом Redis (RESP): общий кеш нескольких хостов
+#
+# Выбирается в config.CACHE_BACKEND_URL (см. create_backend). Общим становится только
+# кеш: база записей и карта покрытия (store), контрольные точки загрузки (exchange) и
+# блокировки (utils.cache_lock) остаются на каждом хосте - одинаковый запрос, пришедший
+# на два хоста одновременно, загрузится с биржи дважды.
+# Проверка клиента RESP без сервера Redis: python local_redis_test.py
+
+REDIS_KEY_PREFIX = "pnl_tools:"
+REDIS_TIMEOUT = 5
+
+_WRITTEN_AT = struct.Struct("<d")
+
+
+class CacheBackend:
+    """Интерфейс хранилища кеша"""
+
+    name = "cache"
+    # Общее для нескольких хостов: записи кодируются колоночным форматом codec
+    # (меньше и без исполнения кода при чтении), в своем локальном - быстрым pickle
+    shared = True
+
+    def get(self, key, max_age=None):
+        """Читает запись и отмечает ее использование
+
+        Returns:
+            None, если записи нет, иначе (данные, время записи); если запись
+            старше max_age секунд, данные - None (хранилище может их не читать)
+        """
+        raise NotImplementedError
+
+    def put(self, key, raw):
+        """Записывает запись целиком: читатель видит либо старую запись, либо новую"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def evict(self, max_age, max_bytes):
+        """Удаляет записи, которые не читали дольше max_age секунд, затем самые давно
+        использованные, пока общий объем больше max_bytes
+
+        Returns:
+            list: ключи удаленных записей
+        """
+        raise NotImplementedError
+
+    def describe(self, key):
+        """Где лежит запись - для сообщений в лог"""
+        return f"{self.name}:{key}"
+
+
+class DirectoryBackend(CacheBackend):
+    """Файл на запись в папке path
+
+    Время записи - mtime файла, время использования - atime: get выставляет его
+    явно, не полагаясь на настройки монтирования (noatime/relatime).
+    """
+
+    name = "dir"
+    shared = False
+
+    def __init__(self, path, extension, legacy_extensions=(), tmp_max_age=0):
+        self.path = path
+        self.extension = extension
+        self.legacy_extensions = tuple(legacy_extensions)
+        self.tmp_max_age = tmp_max_age
+        os.makedirs(path, exist_ok=True)
+
+    def file_path(self, key):
+        return os.path.join(self.path, f"{key}{self.extension}")
+
+    def describe(self, key):
+        return self.file_path(key)
+
+    def get(self, key, max_age=None):
+        path = self.file_path(key)
+        try:
+            written_at = os.path.getmtime(path)
+            if max_age is not None and time.time() - written_at > max_age:
+                return None, written_at
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+
+        try:
+            os.utime(path, (time.time(), written_at))
+        except OSError:
+            pass
+        return raw, written_at
+
+    def put(self, key, raw):
+        path = self.file_path(key)
+        # Пишем во временный файл и атомарно подменяем
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def delete(self, key):
+        try:
+            os.remove(self.file_path(key))
+        except FileNotFoundError:
+            pass
+
+    def evict(self, max_age, max_bytes):
+        files = []
+        now = time.time()
+        for entry in os.scandir(self.path):
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.name.endswith((self.extension,) + self.legacy_extensions):
+                files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, entry.path))
+            elif entry.name.endswith(".tmp") and now - stat.st_mtime > self.tmp_max_age:
+                # Недописанный временный файл упавшего процесса - удаляем первым
+                files.append((0, stat.st_size, entry.path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = []
+
+        for used_at, size, path in files:
+            if now - used_at <= max_age and total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if used_at:
+                removed.append(os.path.splitext(os.path.basename(path))[0])
+        return removed
+
+
+class SQLiteBackend(CacheBackend):
+    """Записи в одной таблице SQLite
+
+    Подходит для общего тома нескольких воркеров или хостов без отдельного сервера:
+    одна база вместо тысяч мелких файлов, вытеснение - одним запросом по индексу.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                written_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_used_at ON cache (used_at)")
+        conn.commit()
+
+    def _connection(self):
+        """Соединение для текущего потока (sqlite3 не делит соединения между потоками)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def describe(self, key):
+        return f"{self.path}:{key}"
+
+    def get(self, key, max_age=None):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT written_at, CASE WHEN ? IS NULL OR written_at >= ? THEN data END FROM cache WHERE key = ?",
+            (max_age, now - (max_age or 0), key)
+        ).fetchone()
+        if row is None:
+            return None
+
+        written_at, raw = row
+        if raw is not None:
+            conn.execute("UPDATE cache SET used_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+        return raw, written_at
+
+    def put(self, key, raw):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, data, size, written_at, used_at) VALUES (?, ?, ?, ?, ?)",
+            (key, sqlite3.Binary(raw), len(raw), now, now)
+        )
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._connection()
+        conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        conn.commit()
+
+    def evict(self, max_age, max_bytes):
+        conn = self._connection()
+        cutoff = time.time() - max_age
+        removed = [key for (key,) in conn.execute("SELECT key FROM cache WHERE used_at < ?", (cutoff,))]
+
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache WHERE used_at >= ?", (cutoff,)).fetchone()
+        if total > max_bytes:
+            for key, size in conn.execute("SELECT key, size FROM cache WHERE used_at >= ? ORDER BY used_at", (cutoff,)):
+                if total <= max_bytes:
+                    break
+                removed.append(key)
+                total -= size
+
+        conn.executemany("DELETE FROM cache WHERE key = ?", [(key,) for key in removed])
+        conn.commit()
+        return removed
+
+
+class RedisError(Exception):
+    """Ошибка, которую вернул сервер Redis"""
+
+
+class RedisBackend(CacheBackend):
+    """Записи на сервере с протоколом Redis (Redis, Valkey, KeyDB, локальная заглушка для тестов)
+
+    Клиент - минимальная реализация RESP на сокетах, без отдельной зависимости.
+    Значение - время записи (8 байт) и данные. Запись, которую не читали дольше
+    idle_ttl секунд, удаляет сам сервер (EXPIRE продлевается при каждом чтении),
+    ограничение объема - настройка сервера maxmemory (политика allkeys-lru).
+    """
+
+    name = "redis"
+
+    def __init__(self, host="localhost", port=6379, db=0, password=None, idle_ttl=None,
+                 prefix=REDIS_KEY_PREFIX, timeout=REDIS_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.idle_ttl = idle_ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """redis://[:пароль@]хост[:порт][/база]"""
+        parts = urlsplit(url)
+        db = parts.path.strip("/")
+        return cls(
+            host=parts.hostname or "localhost",
+            port=parts.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parts.password) if parts.password else None,
+            **kwargs
+        )
+
+    def describe(self, key):
+        return f"redis://{self.host}:{self.port}/{self.db} {self.prefix}{key}"
+
+    def _connection(self):
+        """Соединение текущего потока: (сокет, файл для чтения ответов)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            setup = []
+            if self.password:
+                setup.append(("AUTH", self.password))
+            if self.db:
+                setup.append(("SELECT", self.db))
+            if setup:
+                try:
+                    self._raise_errors(self._call(conn, *setup))
+                except RedisError:
+                    # Неверный пароль или база: соединение без них не используем
+                    self._close()
+                    raise
+        return conn
+
+    def _close(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def _call(self, conn, *commands):
+        """Отправляет команды одним пакетом (pipeline) и читает ответы"""
+        conn[0].sendall(b"".join(_encode_command(command) for command in commands))
+        return [_read_reply(conn[1]) for _ in commands]
+
+    def execute(self, *commands):
+        """Выполняет команды; при обрыве соединения переподключается один раз
+
+        Returns:
+            list: ответы сервера по порядку; ответ-ошибка возвращается как RedisError
+        """
+        for attempt in range(2):
+            try:
+                return self._call(self._connection(), *commands)
+            except OSError:
+                self._close()
+                if attempt:
+                    raise
+
+    def _raise_errors(self, replies):
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def get(self, key, max_age=None):
+        key = self.prefix + key
+        commands = [("GET", key)]
+        if self.idle_ttl:
+            commands.append(("EXPIRE", key, int(self.idle_ttl)))
+        value = self._raise_errors(self.execute(*commands))[0]
+        if value is None:
+            return None
+
+        (written_at,) = _WRITTEN_AT.unpack_from(value)
+        if max_age is not None and time.time() - written_at > max_age:
+            return None, written_at
+        return value[_WRITTEN_AT.size:], written_at
+
+    def put(self, key, raw):
+        command = ("SET", self.prefix + key, _WRITTEN_AT.pack(time.time()) + raw)
+        if self.idle_ttl:
+            command += ("EX", int(self.idle_ttl))
+        self._raise_errors(self.execute(command))
+
+    def delete(self, key):
+        self._raise_errors(self.execute(("DEL", self.prefix + key)))
+
+    def evict(self, max_age, max_bytes):
+        # Срок и объем соблюдает сервер (EXPIRE и maxmemory)
+        return []
+
+
+def _encode_command(args):
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+def _read_reply(reader):
+    line = reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Соединение с Redis закрыто")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        return RedisError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        size = int(payload)
+        if size < 0:
+            return None
+        data = reader.read(size + 2)
+        if len(data) != size + 2:
+            raise ConnectionError("Соединение с Redis закрыто")
+        return data[:-2]
+    if kind == b"*":
+        count = int(payload)
+        return None if count < 0 else [_read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Неожиданный ответ Redis: {line!r}")
+
+
+def create_backend(url, directory, extension, legacy_extensions=(), tmp_max_age=0, idle_ttl=None):
+    """Хранилище по адресу из настроек
+
+    Args:
+        url: None или "dir:путь" - папка (по умолчанию directory),
+             "sqlite:путь" - файл SQLite,
+             "redis://[:пароль@]хост[:порт][/база]" - сервер Redis
+        idle_ttl: для Redis - через сколько секунд без чтений запись удаляет сервер
+    """
+    if not url:
+        return DirectoryBackend(directory, extension, legacy_extensions, tmp_max_age)
+    if url.startswith("dir:"):
+        return DirectoryBackend(url[len("dir:"):] or directory, extension, legacy_extensions, tmp_max_age)
+    if url.startswith("sqlite:"):
+        return SQLiteBackend(url[len("sqlite:"):] or os.path.join(directory, "cache.sqlite3"))
+    if url.startswith(("redis://", "rediss://")):
+        if url.startswith("rediss://"):
+            raise ValueError("TLS (rediss://) не поддерживается, используйте redis://")
+        return RedisBackend.from_url(url, idle_ttl=idle_ttl)
+    raise ValueError(f"Неизвестное хранилище кеша: {url}")
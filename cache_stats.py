@@ -0,0 +1,123 @@
+import threading
+from collections import defaultdict
+
+
+# Границы корзин гистограмм задержек, мс (последняя корзина - все, что больше)
+LATENCY_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+COUNTERS = (
+    "hits_memory",      # отдано из памяти
+    "hits_disk",        # прочитано с диска
+    "misses",           # записи нет
+    "stale",            # запись есть, но устарела (max_age)
+    "errors",           # файл поврежден или не читается
+    "writes",
+    "bytes_read",
+    "bytes_written",
+    "evictions_memory",
+    "evictions_disk",
+)
+
+HISTOGRAMS = (
+    "load_ms",          # load_from_cache целиком
+    "decode_ms",        # codec.loads
+    "encode_ms",        # codec.dumps
+)
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, share):
+        """Верхняя граница корзины, в которую попадает доля share наблюдений"""
+        if not self.count:
+            return 0.0
+        target = share * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "buckets": dict(zip([str(bound) for bound in self.buckets] + ["inf"], self.counts))
+        }
+
+
+class CacheStats:
+    """Счетчики и гистограммы кеша в разрезе вида данных (pnl, executions, transfers...)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+            self._histograms = defaultdict(lambda: {name: Histogram() for name in HISTOGRAMS})
+
+    def count(self, kind, name, value=1):
+        with self._lock:
+            self._counters[kind][name] += value
+
+    def observe(self, kind, name, seconds):
+        with self._lock:
+            self._histograms[kind][name].observe(seconds * 1000)
+
+    def snapshot(self):
+        """Все счетчики и гистограммы: {вид: {счетчик: значение, ..., гистограмма: {...}}}"""
+        with self._lock:
+            result = {}
+            for kind in sorted(set(self._counters) | set(self._histograms)):
+                counters = dict(self._counters[kind])
+                hits = counters["hits_memory"] + counters["hits_disk"]
+                lookups = hits + counters["misses"] + counters["stale"] + counters["errors"]
+                counters["hit_rate"] = hits / lookups if lookups else 0.0
+                for name, histogram in self._histograms[kind].items():
+                    counters[name] = histogram.snapshot()
+                result[kind] = counters
+            return result
+
+    def summary(self):
+        """Сводка для лога: одна строка key=value на вид данных"""
+        lines = []
+        for kind, stats in self.snapshot().items():
+            lines.append(
+                f"cache kind={kind} hit_rate={stats['hit_rate']:.1%} "
+                f"hits_memory={stats['hits_memory']} hits_disk={stats['hits_disk']} "
+                f"misses={stats['misses']} stale={stats['stale']} errors={stats['errors']} "
+                f"writes={stats['writes']} read_kb={stats['bytes_read'] / 1024:.1f} "
+                f"written_kb={stats['bytes_written'] / 1024:.1f} "
+                f"evictions_memory={stats['evictions_memory']} evictions_disk={stats['evictions_disk']} "
+                f"load_p50_ms={stats['load_ms']['p50']} load_p95_ms={stats['load_ms']['p95']} "
+                f"decode_avg_ms={stats['decode_ms']['avg']:.2f} encode_avg_ms={stats['encode_ms']['avg']:.2f}"
+            )
+        return "\n".join(lines) if lines else "cache: нет обращений"
+
+
+stats = CacheStats()
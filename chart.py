@@ -88,6 +88,8 @@ def create_plotly_chart(plotly_data, chart_type='pnl'):
                 row=3, col=1
             )
 
+        # x - время в миллисекундах: на оси типа date plotly показывает его как дату UTC
+        fig.update_xaxes(type='date')
         fig.update_xaxes(title_text="Время (UTC)", row=3, col=1)
         fig.update_yaxes(title_text="PnL", row=1, col=1)
         fig.update_yaxes(title_text="Комиссии", row=2, col=1)
@@ -146,6 +148,7 @@ def create_plotly_chart(plotly_data, chart_type='pnl'):
         fig.update_layout(
             height=600,
             xaxis_title="Время (UTC)",
+            xaxis_type='date',
             yaxis_title=y_title,
             hovermode='x unified',
             template='simple_white',
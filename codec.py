@@ -0,0 +1,339 @@
+import json
+import pickle
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    # Без numpy строки-числа разбираются int()/float() по одной
+    np = None
+
+
+# Формат файла кеша:
+#   MAGIC | версия (1 байт) | crc32 всего, что после заголовка (4 байта) |
+#   размер данных без сжатия (4 байта) | размер сжатой части (4 байта) | сжатая часть (zlib) | float64 колонки
+# Сжатая часть: длина схемы (4 байта) | схема (JSON) | целочисленные колонки подряд (little-endian)
+#
+# Списки одинаковых словарей (записи Bybit) хранятся по колонкам: строки-числа
+# хранятся int64/float64 массивами, время - int64 микросекунд, остальное - JSON.
+# Загрузка возвращает ровно то, что было сохранено (строки остаются строками)
+# и, в отличие от pickle, не исполняет код из файла. float64 сжимаются плохо
+# (на треть при времени сжатия больше, чем у всего остального), поэтому лежат
+# после сжатой части как есть.
+#
+# Колоночный формат в 2-3 раза меньше pickle, но кодируется медленнее. Для
+# локального хранилища есть быстрый вариант - pickle в том же заголовке
+# (PICKLE_MAGIC, без сжатия, см. dumps(compact=False)).
+MAGIC = b"PNLC"
+PICKLE_MAGIC = b"PNLK"
+VERSION = 3
+COMPRESS_LEVEL = 1
+
+_HEADER = struct.Struct("<4sBIII")
+_SCHEMA_SIZE = struct.Struct("<I")
+
+# Сколько первых строк колонки смотрим, прежде чем считать уникальные значения всей колонки
+_SAMPLE_SIZE = 256
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_JSON_SCALARS = {str, int, float, bool, type(None)}
+
+
+class CodecError(ValueError):
+    """Файл кеша поврежден, другой версии или не в этом формате"""
+
+
+# ============================================================================
+# Кодирование
+# ============================================================================
+
+class _Encoder:
+    def __init__(self):
+        # Сжимаемая часть и несжимаемая (float64): буферы и текущее смещение
+        self.buffers = ([], [])
+        self.offsets = [0, 0]
+
+    def add_array(self, typecode, values, packed=True):
+        """Кладет числовую колонку в сжимаемую (packed) или несжимаемую часть, возвращает ее положение"""
+        arr = values if isinstance(values, array) else array(typecode, values)
+        if sys.byteorder != "little":
+            arr.byteswap()
+        raw = arr.tobytes()
+        section = 0 if packed else 1
+        self.buffers[section].append(raw)
+        position = [self.offsets[section], len(arr)]
+        self.offsets[section] += len(raw)
+        return position
+
+    def column(self, values):
+        """Кодирует колонку значений: typed массив, если получится, иначе JSON"""
+        kind = _column_kind(values)
+        if kind == "n":
+            # Повторяющиеся строки (symbol, side, leverage...) кодируются словарем без разбора,
+            # остальные разбираются в числа - проверкой служит сам разбор. Если почти все
+            # значения разные уже в начале колонки (цены, время), словарь не строим
+            if len(set(values[:_SAMPLE_SIZE])) * 2 <= min(len(values), _SAMPLE_SIZE):
+                unique = dict.fromkeys(values)
+                if len(unique) * 2 <= len(values):
+                    return self.strings(values, list(unique))
+            for typecode, number_kind, packed in (("q", "si", True), ("d", "sf", False)):
+                # Сначала пробуем начало колонки: цены с нулями в конце ("1.50") отсеиваются сразу
+                if _exact_numbers(typecode, values[:_SAMPLE_SIZE]) is None:
+                    continue
+                numbers = _exact_numbers(typecode, values)
+                if numbers is not None:
+                    return {"t": number_kind, "b": self.add_array(typecode, numbers, packed)}
+            kind = "j"
+        if kind == "i":
+            try:
+                return {"t": "i", "b": self.add_array("q", map(int, values))}
+            except OverflowError:
+                kind = "j"
+        if kind == "f":
+            return {"t": "f", "b": self.add_array("d", map(float, values), packed=False)}
+        if kind == "dt":
+            aware = values[0].tzinfo is not None
+            return {"t": "dt", "tz": aware, "b": self.add_array("q", [_to_micros(value) for value in values])}
+        if kind == "j":
+            return {"t": "j", "v": list(values)}
+        return {"t": "v", "v": [self.node(value) for value in values]}
+
+    def strings(self, values, unique):
+        """Повторяющиеся строки (symbol, side...) - словарь уникальных значений и индексы"""
+        index = dict(zip(unique, range(len(unique))))
+        typecode = "B" if len(unique) <= 0xFF else "H" if len(unique) <= 0xFFFF else "I"
+        return {"t": "s", "v": unique, "w": typecode, "b": self.add_array(typecode, map(index.__getitem__, values))}
+
+    def node(self, value):
+        if isinstance(value, dict):
+            if not all(isinstance(key, str) for key in value):
+                raise TypeError("Ключи словаря должны быть строками")
+            return {"t": "dict", "k": list(value), "v": [self.node(item) for item in value.values()]}
+
+        if isinstance(value, (list, tuple)):
+            tag = "tuple" if isinstance(value, tuple) else "list"
+            table = _table_columns(value)
+            if table is not None:
+                keys, columns = table
+                return {"t": "table", "tuple": tag == "tuple", "k": keys, "c": list(map(self.column, columns))}
+            return {"t": tag, "c": self.column(list(value))}
+
+        if isinstance(value, datetime):
+            return {"t": "dts", "tz": value.tzinfo is not None, "v": _to_micros(value)}
+
+        if type(value) in _JSON_SCALARS:
+            return {"t": "x", "v": value}
+
+        raise TypeError(f"Тип {type(value).__name__} не поддерживается кодеком кеша")
+
+
+def _parse_numbers(typecode, values):
+    """Строки-числа -> array('q') через int() или array('d') через float()
+
+    Raises:
+        ValueError: не число; OverflowError: целое не помещается в int64
+    """
+    if np is not None:
+        arr = array(typecode)
+        arr.frombytes(np.array(values, dtype=typecode).tobytes())
+        return arr
+    return array(typecode, map(int if typecode == "q" else float, values))
+
+
+def _exact_numbers(typecode, values):
+    """Строки-числа массивом, если str() каждого числа возвращает исходную строку, иначе None
+
+    Так "007", "1.50", "1_000", " 5" и целые больше int64 остаются строками,
+    а загрузка отдает ровно сохраненные значения.
+    """
+    try:
+        numbers = _parse_numbers(typecode, values)
+    except (ValueError, OverflowError):
+        return None
+    if all(map(str.__eq__, map(str, numbers.tolist()), values)):
+        return numbers
+    return None
+
+
+def _table_columns(values):
+    """(ключи, колонки), если values - непустой список словарей с одинаковым набором строковых ключей"""
+    if not values or not isinstance(values[0], dict):
+        return None
+    keys = list(values[0])
+    if not keys or not all(isinstance(key, str) for key in keys):
+        return None
+    # Одинаковое число ключей и каждый ключ первой записи в каждой записи - тот же набор ключей
+    if not all(map(isinstance, values, repeat(dict))) or set(map(len, values)) != {len(keys)}:
+        return None
+    try:
+        return keys, [list(map(itemgetter(key), values)) for key in keys]
+    except KeyError:
+        return None
+
+
+def _column_kind(values):
+    """Тип колонки: n - строки (словарь, числа или JSON - решает _Encoder.column),
+    i - целые, f - дробные, dt - время, j - JSON скаляры (и смесь int с float), v - прочее"""
+    if not values:
+        return "j"
+    types = set(map(type, values))
+
+    if types == {str}:
+        return "n"
+    if types == {int}:
+        return "i"
+    if types == {float}:
+        return "f"
+    if types == {datetime}:
+        aware = values[0].tzinfo is not None
+        if all((value.tzinfo is not None) == aware and (not aware or not value.utcoffset()) for value in values):
+            return "dt"
+    if types <= _JSON_SCALARS:
+        return "j"
+    return "v"
+
+
+def _to_micros(value):
+    if value.tzinfo is not None:
+        if value.utcoffset():
+            raise TypeError("Поддерживается только время в UTC")
+        delta = value - _EPOCH_UTC
+    else:
+        delta = value - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def dumps(value, compact=True):
+    """Кодирует данные кеша в байты
+
+    Args:
+        compact: True - колоночный формат (для общего хранилища, где важны размер
+                 и безопасность); False - pickle: быстрее, но читается только
+                 с loads(allow_pickle=True), то есть из своего локального хранилища
+
+    Raises:
+        TypeError: данные содержат неподдерживаемый тип
+    """
+    if not compact:
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        header = _HEADER.pack(PICKLE_MAGIC, VERSION, zlib.crc32(payload), len(payload), len(payload))
+        return b"".join((header, payload))
+
+    encoder = _Encoder()
+    schema = json.dumps(encoder.node(value), ensure_ascii=False, separators=(",", ":")).encode()
+    packed_buffers, raw_buffers = encoder.buffers
+    body = b"".join([_SCHEMA_SIZE.pack(len(schema)), schema] + packed_buffers)
+    compressed = zlib.compress(body, COMPRESS_LEVEL)
+    raw = b"".join(raw_buffers)
+    checksum = zlib.crc32(raw, zlib.crc32(compressed))
+    header = _HEADER.pack(MAGIC, VERSION, checksum, len(body) + len(raw), len(compressed))
+    return b"".join((header, compressed, raw))
+
+
+# ============================================================================
+# Декодирование
+# ============================================================================
+
+def _read_header(blob):
+    if len(blob) < _HEADER.size:
+        raise CodecError("Файл кеша обрезан")
+    magic, version, checksum, size, compressed_size = _HEADER.unpack_from(blob)
+    if magic not in (MAGIC, PICKLE_MAGIC):
+        raise CodecError("Не файл кеша")
+    if version != VERSION:
+        raise CodecError(f"Версия формата кеша {version}, ожидается {VERSION}")
+    return magic, checksum, size, compressed_size
+
+
+def payload_size(blob):
+    """Размер распакованных данных - оценка памяти, которую займет запись"""
+    return _read_header(blob)[2]
+
+
+class _Decoder:
+    def __init__(self, buffers, raw_buffers):
+        self.buffers = (buffers, raw_buffers)
+
+    def array(self, typecode, position, packed=True):
+        offset, count = position
+        buffers = self.buffers[0 if packed else 1]
+        arr = array(typecode)
+        arr.frombytes(buffers[offset:offset + count * arr.itemsize])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        return arr
+
+    def column(self, node):
+        kind = node["t"]
+        if kind == "i":
+            return self.array("q", node["b"]).tolist()
+        if kind == "f":
+            return self.array("d", node["b"], packed=False).tolist()
+        if kind == "si":
+            return list(map(str, self.array("q", node["b"]).tolist()))
+        if kind == "sf":
+            return list(map(str, self.array("d", node["b"], packed=False).tolist()))
+        if kind == "dt":
+            epoch = _EPOCH_UTC if node["tz"] else _EPOCH
+            return [epoch + timedelta(microseconds=micros) for micros in self.array("q", node["b"])]
+        if kind == "s":
+            return list(map(node["v"].__getitem__, self.array(node["w"], node["b"])))
+        if kind == "j":
+            return node["v"]
+        return [self.node(item) for item in node["v"]]
+
+    def node(self, node):
+        kind = node["t"]
+        if kind == "x":
+            return node["v"]
+        if kind == "table":
+            keys = node["k"]
+            columns = [self.column(column) for column in node["c"]]
+            records = list(map(dict, map(zip, repeat(keys), zip(*columns))))
+            return tuple(records) if node["tuple"] else records
+        if kind == "list":
+            return self.column(node["c"])
+        if kind == "tuple":
+            return tuple(self.column(node["c"]))
+        if kind == "dict":
+            return dict(zip(node["k"], (self.node(item) for item in node["v"])))
+        if kind == "dts":
+            return (_EPOCH_UTC if node["tz"] else _EPOCH) + timedelta(microseconds=node["v"])
+        raise CodecError(f"Неизвестный тип узла: {kind}")
+
+
+def loads(blob, allow_pickle=False):
+    """Декодирует байты кеша
+
+    Args:
+        allow_pickle: читать и записи dumps(compact=False) - только из своего хранилища
+
+    Raises:
+        CodecError: файл поврежден (не сошлась контрольная сумма), другой версии,
+                    не кеш или pickle, который читать не разрешено
+    """
+    magic, checksum, size, compressed_size = _read_header(blob)
+    data = memoryview(blob)[_HEADER.size:]
+    if magic == PICKLE_MAGIC and not allow_pickle:
+        raise CodecError("Запись в формате pickle из общего хранилища не читается")
+    if zlib.crc32(data) != checksum:
+        raise CodecError("Контрольная сумма файла кеша не совпадает")
+    if magic == PICKLE_MAGIC:
+        return pickle.loads(data)
+
+    body = zlib.decompress(data[:compressed_size])
+    raw = data[compressed_size:]
+    if len(body) + len(raw) != size:
+        raise CodecError("Размер данных кеша не совпадает с заголовком")
+
+    (schema_size,) = _SCHEMA_SIZE.unpack_from(body)
+    schema_end = _SCHEMA_SIZE.size + schema_size
+    schema = json.loads(body[_SCHEMA_SIZE.size:schema_end])
+    return _Decoder(memoryview(body)[schema_end:], raw).node(schema)
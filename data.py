@@ -1,5 +1,51 @@
-from datetime import datetime, timezone
-from collections import defaultdict
+from bisect import bisect_right
+from itertools import accumulate, chain, islice
+from frame import TradeFrame, to_datetime
+
+
+# Колонки закрытых позиций: значение - сумма полей записи /v5/position/closed-pnl
+POSITION_VALUES = {
+    'pnl': ('closedPnl',),
+    'fees': ('closeFee', 'openFee'),
+    'volume': ('cumEntryValue', 'cumExitValue')
+}
+
+
+def iter_records(pages):
+    """Разворачивает поток страниц (exchange.iter_*_pages) в поток записей"""
+    return chain.from_iterable(pages)
+
+
+def positions_frame(data):
+    """Закрытые позиции в TradeFrame с колонками pnl, fees, volume"""
+    return TradeFrame.from_records(data, 'updatedTime', POSITION_VALUES)
+
+
+def _cumulative_series(positions):
+    """Накопительные ряды по позициям, отсортированным по времени"""
+    return {
+        'x': positions.times.tolist(),
+        'pnl': positions.cumsum('pnl'),
+        'fees': positions.cumsum('fees'),
+        'volume': positions.cumsum('volume')
+    }
+
+
+def _plotly_series(positions):
+    """Накопительные ряды по каждому символу и общая линия __ALL__"""
+    if not len(positions):
+        return {}
+
+    # Обрабатываем данные для каждого символа
+    result = {}
+
+    for symbol, symbol_positions in positions.groups():
+        result[symbol] = _cumulative_series(symbol_positions)
+
+    # Добавляем общую линию по всем символам
+    result['__ALL__'] = _cumulative_series(positions.by_time())
+
+    return result
 
 
 def prepare_data_for_plotly(data):
@@ -8,110 +54,90 @@ def prepare_data_for_plotly(data):
 
     Args:
         data: список словарей с данными закрытых позиций
+              (или любой итератор записей, например iter_records(exchange.iter_closed_pnl_pages(...)))
 
     Returns:
-        dict: данные готовые для plotly, сгруппированные по символам
+        dict: данные готовые для plotly, сгруппированные по символам:
+              {символ: {'x': время в мс UTC, 'pnl', 'fees', 'volume': накопительные ряды}}
     """
     if not data:
         return {}
 
-    # Группируем данные по символам
-    symbol_data = defaultdict(list)
-    all_positions = []  # Для общей линии
-
-    for position in data:
-        symbol = position.get('symbol', 'UNKNOWN')
-        created_time = position.get('updatedTime', '0')
-        closed_pnl = position.get('closedPnl', '0')
-        close_fee = position.get('closeFee', '0')
-        open_fee = position.get('openFee', '0')
-        cum_entry_value = position.get('cumEntryValue', '0')
-        cum_exit_value = position.get('cumExitValue', '0')
-
-        # Преобразуем время из миллисекунд в datetime
-        timestamp_ms = int(created_time)
-        dt = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
-
-        # Вычисляем метрики
-        net_pnl = float(closed_pnl)
-        total_fees = float(close_fee) + float(open_fee)
-        total_volume = float(cum_entry_value) + float(cum_exit_value)
-
-        position_data = {
-            'time': dt,
-            'pnl': net_pnl,
-            'fees': total_fees,
-            'volume': total_volume
-        }
+    return _plotly_series(positions_frame(data))
 
-        symbol_data[symbol].append(position_data)
-        all_positions.append(position_data)
 
-    # Обрабатываем данные для каждого символа
-    result = {}
+async def prepare_data_for_plotly_async(pages):
+    """
+    То же, что prepare_data_for_plotly, но потребляет асинхронный поток страниц
+    (exchange.aiter_closed_pnl_pages): каждая страница разбирается, пока грузится следующая
 
-    for symbol, positions in symbol_data.items():
-        # Сортируем по времени
-        positions_sorted = sorted(positions, key=lambda x: x['time'])
-
-        # Вычисляем накопительные итоги
-        cumulative_pnl = 0
-        cumulative_fees = 0
-        cumulative_volume = 0
-
-        x_values = []
-        y_pnl = []
-        y_fees = []
-        y_volume = []
-
-        for pos in positions_sorted:
-            cumulative_pnl += pos['pnl']
-            cumulative_fees += pos['fees']
-            cumulative_volume += pos['volume']
-
-            x_values.append(pos['time'])
-            y_pnl.append(cumulative_pnl)
-            y_fees.append(cumulative_fees)
-            y_volume.append(cumulative_volume)
-
-        result[symbol] = {
-            'x': x_values,
-            'pnl': y_pnl,
-            'fees': y_fees,
-            'volume': y_volume
-        }
+    Returns:
+        dict: данные готовые для plotly, сгруппированные по символам
+    """
+    frames = [positions_frame(page) async for page in pages]
+    if not frames:
+        return {}
 
-    # Добавляем общую линию по всем символам
-    if all_positions:
-        all_positions_sorted = sorted(all_positions, key=lambda x: x['time'])
-
-        cumulative_pnl = 0
-        cumulative_fees = 0
-        cumulative_volume = 0
-
-        x_values = []
-        y_pnl = []
-        y_fees = []
-        y_volume = []
-
-        for pos in all_positions_sorted:
-            cumulative_pnl += pos['pnl']
-            cumulative_fees += pos['fees']
-            cumulative_volume += pos['volume']
-
-            x_values.append(pos['time'])
-            y_pnl.append(cumulative_pnl)
-            y_fees.append(cumulative_fees)
-            y_volume.append(cumulative_volume)
-
-        result['__ALL__'] = {
-            'x': x_values,
-            'pnl': y_pnl,
-            'fees': y_fees,
-            'volume': y_volume
-        }
+    return _plotly_series(TradeFrame.concat(frames))
+
+
+def _append_series(series, positions):
+    """Дописывает позиции (кадр по времени) в накопительный ряд series"""
+    times = positions.times.tolist()
+    x = series['x']
+    start = bisect_right(x, times[0])
+
+    if start == len(x):
+        # Все позиции не раньше последней точки: продолжаем накопительные итоги с нее
+        x.extend(times)
+        for name in ('pnl', 'fees', 'volume'):
+            running = series[name][-1] if series[name] else 0
+            series[name].extend(islice(accumulate(positions.columns[name], initial=running), 1, None))
+        return
+
+    # Запоздавшие позиции: хвост ряда после первой из них сливается с ними по времени
+    # (при равном времени уже учтенные идут раньше) и пересчитывается с этого места
+    tail = len(x) - start
+    merged = sorted(
+        [(x[i], 0, i) for i in range(start, len(x))] + [(t, 1, i) for i, t in enumerate(times)]
+    )
+    x[start:] = [t for t, _, _ in merged]
+    for name in ('pnl', 'fees', 'volume'):
+        values = series[name]
+        running = values[start - 1] if start else 0
+        old_steps = [values[i] - (values[i - 1] if i else 0) for i in range(start, start + tail)]
+        column = positions.columns[name]
+        steps = [old_steps[i - start] if is_new == 0 else column[i] for _, is_new, i in merged]
+        values[start:] = islice(accumulate(steps, initial=running), 1, None)
+
+
+def append_to_plotly_series(plotly_data, data):
+    """
+    Дописывает новые закрытые позиции в готовые накопительные ряды prepare_data_for_plotly
 
-    return result
+    Позиции не раньше последней точки ряда дописываются в конец за O(новых) - от
+    сохраненных в ряду итогов, как если бы ряд строился заново. Запоздавшие позиции
+    вставляются на место по времени, и ряд пересчитывается только с этой точки.
+
+    Args:
+        plotly_data: результат prepare_data_for_plotly (изменяется на месте)
+        data: позиции, которых еще нет в plotly_data
+
+    Returns:
+        dict: plotly_data
+    """
+    positions = positions_frame(data)
+    if not len(positions):
+        return plotly_data
+
+    total = plotly_data.pop('__ALL__', None)
+    for symbol, symbol_positions in positions.groups():
+        _append_series(plotly_data.setdefault(symbol, {'x': [], 'pnl': [], 'fees': [], 'volume': []}), symbol_positions)
+
+    # Общая линия остается последней
+    plotly_data['__ALL__'] = total or {'x': [], 'pnl': [], 'fees': [], 'volume': []}
+    _append_series(plotly_data['__ALL__'], positions.by_time())
+    return plotly_data
 
 
 def data_summary(plotly_data):
@@ -141,8 +167,8 @@ def data_summary(plotly_data):
         final_pnl = data['pnl'][-1] if data['pnl'] else 0
         total_fees = data['fees'][-1] if data['fees'] else 0
         total_volume = data['volume'][-1] if data['volume'] else 0
-        first_trade = data['x'][0] if data['x'] else None
-        last_trade = data['x'][-1] if data['x'] else None
+        first_trade = to_datetime(data['x'][0]) if data['x'] else None
+        last_trade = to_datetime(data['x'][-1]) if data['x'] else None
 
         symbols_data.append({
             'symbol': symbol,
@@ -162,10 +188,88 @@ def data_summary(plotly_data):
     }
 
 
+def aggregate_rollups(rollups):
+    """Складывает дневные итоги (store.query_rollups) по символам
+
+    Returns:
+        dict: символ -> суммы колонок за период, first_time и last_time (мс);
+              символы в порядке первой сделки
+    """
+    totals = {}
+    for row in sorted(rollups, key=lambda row: (row['first_time'], row['symbol'])):
+        symbol_totals = totals.get(row['symbol'])
+        if symbol_totals is None:
+            totals[row['symbol']] = {key: value for key, value in row.items() if key not in ('day', 'symbol')}
+            continue
+        for key, value in row.items():
+            if key == 'first_time':
+                symbol_totals[key] = min(symbol_totals[key], value)
+            elif key == 'last_time':
+                symbol_totals[key] = max(symbol_totals[key], value)
+            elif key not in ('day', 'symbol'):
+                symbol_totals[key] += value
+    return totals
+
+
+def rollup_summary(rollups):
+    """
+    То же, что data_summary, но по дневным итогам закрытых позиций
+    (store.query_rollups("closed_pnl", ...) или history.query_rollups_async): для месяца, квартала
+    или года читается несколько сотен строк итогов вместо всех позиций
+
+    Returns:
+        dict: Словарь с общей информацией и данными по каждому символу
+    """
+    totals = aggregate_rollups(rollups)
+    if not totals:
+        return {
+            'total_symbols': 0,
+            'symbols': []
+        }
+
+    symbols_data = []
+    for symbol, symbol_totals in totals.items():
+        symbols_data.append({
+            'symbol': symbol,
+            'display_name': symbol,
+            'is_total': False,
+            'total_trades': int(symbol_totals['trades']),
+            'final_pnl': symbol_totals['pnl'],
+            'total_fees': symbol_totals['fees'],
+            'total_volume': symbol_totals['volume'],
+            'first_trade': to_datetime(symbol_totals['first_time']),
+            'last_trade': to_datetime(symbol_totals['last_time'])
+        })
+
+    symbols_data.append({
+        'symbol': '__ALL__',
+        'display_name': "ВСЕ СИМВОЛЫ (ИТОГО)",
+        'is_total': True,
+        'total_trades': sum(item['total_trades'] for item in symbols_data),
+        'final_pnl': sum(item['final_pnl'] for item in symbols_data),
+        'total_fees': sum(item['total_fees'] for item in symbols_data),
+        'total_volume': sum(item['total_volume'] for item in symbols_data),
+        'first_trade': to_datetime(min(symbol_totals['first_time'] for symbol_totals in totals.values())),
+        'last_trade': to_datetime(max(symbol_totals['last_time'] for symbol_totals in totals.values()))
+    })
+
+    return {
+        'total_symbols': len(totals),
+        'symbols': symbols_data
+    }
+
+
 def get_data_summary_html(plotly_data):
     """Возвращает HTML с краткой статистикой по подготовленным данным в виде таблицы"""
-    summary = data_summary(plotly_data)
-    
+    return _summary_table_html(data_summary(plotly_data))
+
+
+def get_rollup_summary_html(rollups):
+    """HTML статистики по дневным итогам закрытых позиций (см. rollup_summary)"""
+    return _summary_table_html(rollup_summary(rollups))
+
+
+def _summary_table_html(summary):
     if summary['total_symbols'] == 0:
         return "<p>Нет данных для отображения</p>"
 
@@ -224,22 +328,62 @@ def get_data_summary_html(plotly_data):
     return ''.join(html_parts)
 
 
-def prepare_executions_for_table(data):
-    """
-    Преобразует данные исполненных сделок (/v5/execution/list) для отображения в таблице
+# Колонки исполненных сделок /v5/execution/list
+EXECUTION_VALUES = {
+    'qty': ('execQty',),
+    'price': ('execPrice',),
+    'value': ('execValue',),
+    'fee': ('execFee',),
+    'fee_rate': ('feeRate',)
+}
+EXECUTION_TAGS = {
+    'side': ('side', 'Unknown'),
+    'exec_type': ('execType', 'Unknown'),
+    'order_id': ('orderId', ''),
+    'exec_id': ('execId', ''),
+    'is_maker': ('isMaker', False)
+}
+
+
+def executions_frame(data):
+    """Исполненные сделки в TradeFrame"""
+    return TradeFrame.from_records(data, 'execTime', EXECUTION_VALUES, EXECUTION_TAGS)
+
+
+def _side_is(side):
+    return lambda value: str(value).lower() == side
+
+
+def _executions_table(executions):
+    """Статистика по символам; сделки символа - кадр, отсортированный по времени"""
+    symbol_data = {}
+
+    for symbol, symbol_executions in executions.groups():
+        buys = symbol_executions.where('side', _side_is('buy'))
+        sells = symbol_executions.where('side', _side_is('sell'))
+
+        symbol_data[symbol] = {
+            'executions': symbol_executions,
+            'count': len(symbol_executions),
+            'first_time': symbol_executions.time_at(0),
+            'last_time': symbol_executions.time_at(-1),
+            'total_qty': symbol_executions.total('qty'),
+            'total_value': symbol_executions.total('value'),
+            'total_fee': symbol_executions.total('fee'),
+            'buy_count': len(buys),
+            'sell_count': len(sells),
+            'buy_qty': buys.total('qty'),
+            'sell_qty': sells.total('qty')
+        }
 
-    Args:
-        data: список словарей с данными исполненных сделок
+    return symbol_data
 
-    Returns:
-        dict: данные готовые для таблицы, сгруппированные по символам
-    """
-    if not data:
-        return {}
 
-    # Группируем данные по символам
-    symbol_data = defaultdict(lambda: {
-        'executions': [],
+def _new_execution_totals():
+    return {
+        'count': 0,
+        'first_time': None,
+        'last_time': None,
         'total_qty': 0,
         'total_value': 0,
         'total_fee': 0,
@@ -247,62 +391,94 @@ def prepare_executions_for_table(data):
         'sell_count': 0,
         'buy_qty': 0,
         'sell_qty': 0
-    })
+    }
 
+
+def _aggregate_executions(symbol_data, data):
+    """Накапливает итоги по символам, не сохраняя сами сделки
+
+    Память - одна запись итогов на символ, сколько бы сделок ни прошло через итератор.
+    Время (first_time, last_time) копится в миллисекундах, в datetime переводит _finish_totals.
+    """
     for execution in data:
         symbol = execution.get('symbol', 'UNKNOWN')
-        exec_time = execution.get('execTime', '0')
-        exec_type = execution.get('execType', 'Unknown')
-        side = execution.get('side', 'Unknown')
-        exec_qty = execution.get('execQty', '0')
-        exec_price = execution.get('execPrice', '0')
-        exec_value = execution.get('execValue', '0')
-        exec_fee = execution.get('execFee', '0')
-        order_id = execution.get('orderId', '')
-        exec_id = execution.get('execId', '')
-        fee_rate = execution.get('feeRate', '0')
-        is_maker = execution.get('isMaker', False)
-
-        # Преобразуем время из миллисекунд в datetime
-        timestamp_ms = int(exec_time)
-        dt = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
-
-        qty = float(exec_qty)
-        value = float(exec_value)
-        fee = float(exec_fee)
-        price = float(exec_price)
-
-        execution_record = {
-            'time': dt,
-            'exec_id': exec_id,
-            'order_id': order_id,
-            'side': side,
-            'exec_type': exec_type,
-            'qty': qty,
-            'price': price,
-            'value': value,
-            'fee': fee,
-            'fee_rate': float(fee_rate),
-            'is_maker': is_maker
-        }
+        totals = symbol_data.get(symbol)
+        if totals is None:
+            totals = symbol_data[symbol] = _new_execution_totals()
+
+        timestamp_ms = int(execution.get('execTime', '0'))
+        qty = float(execution.get('execQty', '0'))
+        side = str(execution.get('side', 'Unknown')).lower()
+
+        totals['count'] += 1
+        if totals['first_time'] is None or timestamp_ms < totals['first_time']:
+            totals['first_time'] = timestamp_ms
+        if totals['last_time'] is None or timestamp_ms > totals['last_time']:
+            totals['last_time'] = timestamp_ms
+        totals['total_qty'] += qty
+        totals['total_value'] += float(execution.get('execValue', '0'))
+        totals['total_fee'] += float(execution.get('execFee', '0'))
+
+        if side == 'buy':
+            totals['buy_count'] += 1
+            totals['buy_qty'] += qty
+        elif side == 'sell':
+            totals['sell_count'] += 1
+            totals['sell_qty'] += qty
+
+
+def _finish_totals(symbol_data):
+    for totals in symbol_data.values():
+        totals['first_time'] = to_datetime(totals['first_time'])
+        totals['last_time'] = to_datetime(totals['last_time'])
+    return symbol_data
+
+
+def prepare_executions_for_table(data, details=True):
+    """
+    Преобразует данные исполненных сделок (/v5/execution/list) для отображения в таблице
+
+    Args:
+        data: список словарей с данными исполненных сделок (или любой итератор записей)
+        details: сохранять ли сами сделки; False - только итоги по символам
+                 (executions_summary хватает их), данные читаются потоком
+                 и память не растет с числом сделок
 
-        symbol_data[symbol]['executions'].append(execution_record)
-        symbol_data[symbol]['total_qty'] += qty
-        symbol_data[symbol]['total_value'] += value
-        symbol_data[symbol]['total_fee'] += fee
+    Returns:
+        dict: данные готовые для таблицы, сгруппированные по символам;
+              при details=True сделки символа ('executions') - TradeFrame,
+              строки-словари дает .rows()
+    """
+    if not data:
+        return {}
 
-        if side.lower() == 'buy':
-            symbol_data[symbol]['buy_count'] += 1
-            symbol_data[symbol]['buy_qty'] += qty
-        elif side.lower() == 'sell':
-            symbol_data[symbol]['sell_count'] += 1
-            symbol_data[symbol]['sell_qty'] += qty
+    if not details:
+        symbol_data = {}
+        _aggregate_executions(symbol_data, data)
+        return _finish_totals(symbol_data)
 
-    # Сортируем исполнения по времени для каждого символа
-    for symbol in symbol_data:
-        symbol_data[symbol]['executions'].sort(key=lambda x: x['time'])
+    return _executions_table(executions_frame(data))
 
-    return dict(symbol_data)
+
+async def prepare_executions_for_table_async(pages, details=True):
+    """
+    То же, что prepare_executions_for_table, но потребляет асинхронный поток страниц
+    (exchange.aiter_execution_pages); при details=False в памяти остаются только итоги
+
+    Returns:
+        dict: данные готовые для таблицы, сгруппированные по символам
+    """
+    if not details:
+        symbol_data = {}
+        async for page in pages:
+            _aggregate_executions(symbol_data, page)
+        return _finish_totals(symbol_data)
+
+    frames = [executions_frame(page) async for page in pages]
+    if not frames:
+        return {}
+
+    return _executions_table(TradeFrame.concat(frames))
 
 
 def executions_summary(executions_data):
@@ -330,13 +506,9 @@ def executions_summary(executions_data):
     total_sell = 0
 
     for symbol, data in executions_data.items():
-        executions_list = data['executions']
-        total_trades = len(executions_list)
+        total_trades = data['count']
         total_executions += total_trades
 
-        first_exec = executions_list[0] if executions_list else None
-        last_exec = executions_list[-1] if executions_list else None
-
         avg_price = (data['total_value'] / data['total_qty']) if data['total_qty'] > 0 else 0
 
         symbols_stats.append({
@@ -350,8 +522,8 @@ def executions_summary(executions_data):
             'total_value': data['total_value'],
             'total_fee': data['total_fee'],
             'avg_price': avg_price,
-            'first_exec_time': first_exec['time'] if first_exec else None,
-            'last_exec_time': last_exec['time'] if last_exec else None
+            'first_exec_time': data['first_time'],
+            'last_exec_time': data['last_time']
         })
 
         total_value += data['total_value']
@@ -436,6 +608,33 @@ def get_executions_summary_html(executions_data):
     return ''.join(html_parts)
 
 
+# Источники переводов: (ключ в таблице, префикс итогов, поле времени, строковые колонки)
+TRANSFER_SOURCES = (
+    ('inter_transfers', 'inter', 'timestamp', {
+        'transfer_id': ('transferId', ''),
+        'from': ('fromAccountType', ''),
+        'to': ('toAccountType', ''),
+        'status': ('status', '')
+    }),
+    ('universal_transfers', 'universal', 'timestamp', {
+        'transfer_id': ('transferId', ''),
+        'from': ('fromMemberId', ''),
+        'to': ('toMemberId', ''),
+        'status': ('status', '')
+    }),
+    ('deposits', 'deposit', 'successAt', {
+        'tx_id': ('txID', ''),
+        'chain': ('chain', ''),
+        'status': ('status', '')
+    }),
+    ('withdraws', 'withdraw', 'createTime', {
+        'withdraw_id': ('withdrawId', ''),
+        'chain': ('chain', ''),
+        'status': ('status', '')
+    })
+)
+
+
 def prepare_transfers_for_table(inter_transfers=None, universal_transfers=None, deposits=None, withdraws=None):
     """
     Преобразует данные переводов, депозитов и выводов для отображения в таблице
@@ -452,138 +651,31 @@ def prepare_transfers_for_table(inter_transfers=None, universal_transfers=None,
         withdraws: список выводов
 
     Returns:
-        dict: данные готовые для таблицы, сгруппированные по монетам
+        dict: данные готовые для таблицы, сгруппированные по монетам;
+              записи каждого вида - TradeFrame по времени (время 0 - неизвестно)
     """
-    # Группируем данные по монетам (coin)
-    coin_data = defaultdict(lambda: {
-        'inter_transfers': [],
-        'universal_transfers': [],
-        'deposits': [],
-        'withdraws': [],
-        'total_inter_amount': 0,
-        'total_universal_amount': 0,
-        'total_deposit_amount': 0,
-        'total_withdraw_amount': 0,
-        'inter_count': 0,
-        'universal_count': 0,
-        'deposit_count': 0,
-        'withdraw_count': 0
-    })
-
-    # Обрабатываем внутренние переводы
-    if inter_transfers:
-        for transfer in inter_transfers:
-            coin = transfer.get('coin', 'UNKNOWN')
-            timestamp = transfer.get('timestamp', '0')
-            amount = transfer.get('amount', '0')
-            from_account = transfer.get('fromAccountType', '')
-            to_account = transfer.get('toAccountType', '')
-            transfer_id = transfer.get('transferId', '')
-            status = transfer.get('status', '')
-
-            dt = datetime.fromtimestamp(int(timestamp) / 1000, tz=timezone.utc)
-            amt = float(amount)
-
-            record = {
-                'time': dt,
-                'transfer_id': transfer_id,
-                'from': from_account,
-                'to': to_account,
-                'amount': amt,
-                'status': status,
-                'type': 'inter'
-            }
-
-            coin_data[coin]['inter_transfers'].append(record)
-            coin_data[coin]['total_inter_amount'] += amt
-            coin_data[coin]['inter_count'] += 1
-
-    # Обрабатываем универсальные переводы
-    if universal_transfers:
-        for transfer in universal_transfers:
-            coin = transfer.get('coin', 'UNKNOWN')
-            timestamp = transfer.get('timestamp', '0')
-            amount = transfer.get('amount', '0')
-            from_member = transfer.get('fromMemberId', '')
-            to_member = transfer.get('toMemberId', '')
-            transfer_id = transfer.get('transferId', '')
-            status = transfer.get('status', '')
-
-            dt = datetime.fromtimestamp(int(timestamp) / 1000, tz=timezone.utc)
-            amt = float(amount)
-
-            record = {
-                'time': dt,
-                'transfer_id': transfer_id,
-                'from': from_member,
-                'to': to_member,
-                'amount': amt,
-                'status': status,
-                'type': 'universal'
-            }
-
-            coin_data[coin]['universal_transfers'].append(record)
-            coin_data[coin]['total_universal_amount'] += amt
-            coin_data[coin]['universal_count'] += 1
-
-    # Обрабатываем депозиты
-    if deposits:
-        for deposit in deposits:
-            coin = deposit.get('coin', 'UNKNOWN')
-            success_at = deposit.get('successAt', '0')
-            amount = deposit.get('amount', '0')
-            tx_id = deposit.get('txID', '')
-            status = deposit.get('status', '')
-            chain = deposit.get('chain', '')
-
-            dt = datetime.fromtimestamp(int(success_at) / 1000, tz=timezone.utc) if success_at != '0' else None
-            amt = float(amount)
-
-            record = {
-                'time': dt,
-                'tx_id': tx_id,
-                'chain': chain,
-                'amount': amt,
-                'status': status,
-                'type': 'deposit'
-            }
-
-            coin_data[coin]['deposits'].append(record)
-            coin_data[coin]['total_deposit_amount'] += amt
-            coin_data[coin]['deposit_count'] += 1
-
-    # Обрабатываем выводы
-    if withdraws:
-        for withdraw in withdraws:
-            coin = withdraw.get('coin', 'UNKNOWN')
-            create_time = withdraw.get('createTime', '0')
-            amount = withdraw.get('amount', '0')
-            withdraw_id = withdraw.get('withdrawId', '')
-            status = withdraw.get('status', '')
-            chain = withdraw.get('chain', '')
-
-            dt = datetime.fromtimestamp(int(create_time) / 1000, tz=timezone.utc) if create_time != '0' else None
-            amt = float(amount)
-
-            record = {
-                'time': dt,
-                'withdraw_id': withdraw_id,
-                'chain': chain,
-                'amount': amt,
-                'status': status,
-                'type': 'withdraw'
-            }
-
-            coin_data[coin]['withdraws'].append(record)
-            coin_data[coin]['total_withdraw_amount'] += amt
-            coin_data[coin]['withdraw_count'] += 1
-
-    # Сортируем записи по времени для каждой монеты
-    for coin in coin_data:
-        for key in ['inter_transfers', 'universal_transfers', 'deposits', 'withdraws']:
-            coin_data[coin][key].sort(key=lambda x: x['time'] if x['time'] else datetime.min.replace(tzinfo=timezone.utc))
-
-    return dict(coin_data)
+    sources = (inter_transfers, universal_transfers, deposits, withdraws)
+    # Каждый источник сортируется по монете один раз - дальше строки монеты берутся бинарным поиском
+    frames = [
+        (key, prefix, TradeFrame.from_records(
+            records or [], time_field, {'amount': ('amount',)}, tags, symbol_field='coin'
+        ).sort())
+        for records, (key, prefix, time_field, tags) in zip(sources, TRANSFER_SOURCES)
+    ]
+
+    # Монеты в порядке появления: сначала из внутренних переводов, затем из остальных источников
+    coins = dict.fromkeys(coin for _, _, frame in frames for coin in frame.symbols)
+
+    coin_data = {}
+    for coin in coins:
+        coin_data[coin] = {}
+        for key, prefix, frame in frames:
+            coin_records = frame.symbol(coin)
+            coin_data[coin][key] = coin_records
+            coin_data[coin][f'total_{prefix}_amount'] = coin_records.total('amount')
+            coin_data[coin][f'{prefix}_count'] = len(coin_records)
+
+    return coin_data
 
 
 def transfers_summary(transfers_data):
@@ -615,16 +707,12 @@ def transfers_summary(transfers_data):
         # Упрощенно: deposits - withdraws (для более точного расчета нужно анализировать направление переводов)
         net_flow = data['total_deposit_amount'] - data['total_withdraw_amount']
 
-        # Собираем все временные метки
-        all_times = []
-        for transfers_list in [data['inter_transfers'], data['universal_transfers'], 
-                              data['deposits'], data['withdraws']]:
-            for item in transfers_list:
-                if item['time']:
-                    all_times.append(item['time'])
-
-        first_time = min(all_times) if all_times else None
-        last_time = max(all_times) if all_times else None
+        # Первая и последняя известные временные метки по всем видам операций
+        ranges = [data[key].time_range() for key, _, _, _ in TRANSFER_SOURCES]
+        first_times = [first for first, _ in ranges if first]
+        last_times = [last for _, last in ranges if last]
+        first_time = min(first_times) if first_times else None
+        last_time = max(last_times) if last_times else None
 
         coins_stats.append({
             'coin': coin,
@@ -1,9 +1,41 @@
+import asyncio
+import os
+import pickle
+import random
 import requests
+import httpx
 import time
 import hmac
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 from datetime import datetime, timezone, timedelta
+import ratelimit
+from singleflight import flights, flight_key
+
+
+BASE_URL = "https://api.bybit.com"
+REQUEST_TIMEOUT = 10
+
+# Один пул соединений на процесс: keep-alive вместо нового TCP+TLS на каждую страницу
+HTTP_POOL_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+# Сколько периодов (окон по 7/30 дней) асинхронные get_all_*_async грузят одновременно
+WINDOW_CONCURRENCY = 4
+
+# Повторы временных сбоев: таймауты, 5xx/429 и коды Bybit
+# 10000 (server timeout), 10006 (rate limit), 10016 (server error)
+MAX_RETRIES = 4
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8.0
+TRANSIENT_RET_CODES = {10000, 10006, 10016}
+
+# Постраничные чекпоинты незавершенных загрузок: следующий запрос продолжит с последнего курсора
+CHECKPOINT_DIR = os.path.join("cache", "checkpoints")
+CHECKPOINT_TTL = 24 * 60 * 60
+
+_session = None
+_async_client = None
 
 
 def generate_signature(api_secret, params):
@@ -17,137 +49,134 @@ def generate_signature(api_secret, params):
     return hash_obj.hexdigest()
 
 
-def send_request(api_key, api_secret, endpoint, params=None):
-    """Отправка запроса к API Bybit"""
+def sign_params(api_key, api_secret, params=None):
+    """Добавляет к параметрам ключ, метку времени и подпись"""
     if params is None:
         params = {}
 
-    base_url = "https://api.bybit.com"
-    timestamp = str(int(time.time() * 1000))
-
     params["api_key"] = api_key
-    params["timestamp"] = timestamp
+    params["timestamp"] = str(int(time.time() * 1000))
     params["recv_window"] = "5000"
 
-    signature = generate_signature(api_secret, params)
-    params["sign"] = signature
-
-    url = f"{base_url}{endpoint}"
-
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка запроса: {e}")
-        return None
-
-
-def get_closed_pnl(api_key, api_secret, category="linear", symbol=None,
-                   start_time=None, end_time=None, limit=50, cursor=None):
-    """Получение одной страницы закрытых позиций"""
-    endpoint = "/v5/position/closed-pnl"
-    params = {
-        "category": category,
-        "limit": min(limit, 100)
-    }
-
-    if symbol:
-        params["symbol"] = symbol
-    if start_time:
-        params["startTime"] = start_time
-    if end_time:
-        params["endTime"] = end_time
-    if cursor:
-        params["cursor"] = cursor
-
-    response = send_request(api_key, api_secret, endpoint, params)
-
-    if response and response.get("retCode") == 0:
-        return response.get("result", {})
-    else:
-        print(f"Ошибка API: {response}")
-        return {}
-
-
-def get_all_closed_pnl(api_key, api_secret, category="linear", symbol=None,
-                       start_time=None, end_time=None):
-    """Получение всех закрытых позиций с пагинацией и разбивкой на периоды по 7 дней"""
-
-    # Если указаны временные рамки, проверяем их размер
-    if start_time and end_time:
-        # Максимальный диапазон - 7 дней в миллисекундах
-        max_range_ms = 7 * 24 * 60 * 60 * 1000
-        time_diff = end_time - start_time
-
-        # Если диапазон больше 7 дней, разбиваем на куски
-        if time_diff > max_range_ms:
-            print(f"Диапазон превышает 7 дней, разбиваем на периоды...")
-            all_data = []
-            current_start = start_time
-
-            while current_start < end_time:
-                current_end = min(current_start + max_range_ms, end_time)
-
-                print(
-                    f"\nЗагрузка периода: {datetime.fromtimestamp(current_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(current_end / 1000, tz=timezone.utc)}")
-
-                period_data = get_all_closed_pnl_single_period(
-                    api_key, api_secret, category, symbol, current_start, current_end
-                )
-
-                all_data.extend(period_data)
-                current_start = current_end + 1  # Переходим к следующему периоду
-
-                # Задержка между периодами
-                time.sleep(0.3)
-
-            print(f"\nВсего загружено записей за весь период: {len(all_data)}")
-            return all_data
-
-    # Если диапазон 7 дней или меньше (или не указан), используем обычную загрузку
-    return get_all_closed_pnl_single_period(api_key, api_secret, category, symbol, start_time, end_time)
+    params["sign"] = generate_signature(api_secret, params)
+    return params
 
 
-def get_all_closed_pnl_single_period(api_key, api_secret, category="linear", symbol=None,
-                                     start_time=None, end_time=None):
-    """Получение всех закрытых позиций для одного периода (до 7 дней) с пагинацией"""
-    all_data = []
-    cursor = None
-    page = 1
+def get_session():
+    """Возвращает общую для процесса requests-сессию (keep-alive)"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
 
-    while True:
-        print(f"  Загрузка страницы {page}...")
 
-        result = get_closed_pnl(
-            api_key, api_secret, category, symbol,
-            start_time, end_time, limit=100, cursor=cursor
+def get_async_client():
+    """Возвращает общий для процесса httpx.AsyncClient с пулом соединений"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            timeout=REQUEST_TIMEOUT,
+            limits=HTTP_POOL_LIMITS
         )
+    return _async_client
 
-        if not result:
-            break
 
-        data_list = result.get("list", [])
+async def close_async_client():
+    """Закрывает общий httpx.AsyncClient (вызывается при остановке приложения)"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
 
-        if not data_list:
-            break
 
-        all_data.extend(data_list)
-        print(f"  Получено записей: {len(data_list)}")
+def _backoff_delay(attempt):
+    """Экспоненциальная задержка с полным джиттером перед повтором attempt (с 0)"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
 
-        # Проверка наличия следующей страницы
-        next_cursor = result.get("nextPageCursor")
-        if not next_cursor:
-            break
 
-        cursor = next_cursor
-        page += 1
+def _is_transient_status(status_code):
+    return status_code == 429 or status_code >= 500
 
-        # Небольшая задержка между запросами
-        time.sleep(0.2)
 
-    print(f"  Всего записей за период: {len(all_data)}")
-    return all_data
+def send_request(api_key, api_secret, endpoint, params=None):
+    """Отправка запроса к API Bybit
+
+    Временные сбои (таймауты, 5xx, 429, TRANSIENT_RET_CODES) повторяются
+    до MAX_RETRIES раз с экспоненциальной задержкой и джиттером.
+    """
+    url = f"{BASE_URL}{endpoint}"
+    payload = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            delay = _backoff_delay(attempt - 1)
+            print(f"Повтор запроса {endpoint} ({attempt}/{MAX_RETRIES}) через {delay:.2f} с")
+            time.sleep(delay)
+
+        # Темп запросов задает бюджет ключа по заголовкам X-Bapi-Limit*, а не фиксированные паузы
+        ratelimit.acquire(api_key, endpoint)
+        # Подписываем копию: при повторе нужна свежая метка времени
+        signed_params = sign_params(api_key, api_secret, dict(params or {}))
+
+        try:
+            response = get_session().get(url, params=signed_params, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            payload = response.json()
+        except requests.exceptions.HTTPError as e:
+            print(f"Ошибка запроса: {e}")
+            payload = None
+            if not _is_transient_status(e.response.status_code):
+                return None
+            continue
+        except requests.exceptions.RequestException as e:
+            print(f"Ошибка запроса: {e}")
+            payload = None
+            continue
+
+        ratelimit.update_from_response(api_key, endpoint, response.headers, payload)
+        if payload.get("retCode") not in TRANSIENT_RET_CODES:
+            return payload
+
+    return payload
+
+
+async def send_request_async(api_key, api_secret, endpoint, params=None):
+    """Асинхронная отправка запроса к API Bybit через общий пул соединений
+
+    Повторяет временные сбои так же, как send_request.
+    """
+    payload = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            delay = _backoff_delay(attempt - 1)
+            print(f"Повтор запроса {endpoint} ({attempt}/{MAX_RETRIES}) через {delay:.2f} с")
+            await asyncio.sleep(delay)
+
+        await ratelimit.acquire_async(api_key, endpoint)
+        signed_params = sign_params(api_key, api_secret, dict(params or {}))
+
+        try:
+            response = await get_async_client().get(endpoint, params=signed_params)
+            response.raise_for_status()
+            payload = response.json()
+        except httpx.HTTPStatusError as e:
+            print(f"Ошибка запроса: {e}")
+            payload = None
+            if not _is_transient_status(e.response.status_code):
+                return None
+            continue
+        except (httpx.HTTPError, ValueError) as e:
+            print(f"Ошибка запроса: {e}")
+            payload = None
+            continue
+
+        ratelimit.update_from_response(api_key, endpoint, response.headers, payload)
+        if payload.get("retCode") not in TRANSIENT_RET_CODES:
+            return payload
+
+    return payload
 
 
 def get_current_day_utc():
@@ -213,53 +242,111 @@ def get_previous_month_utc():
     return start_ms, end_ms
 
 
-def get_pnl_today(api_key, api_secret, category="linear", symbol=None):
-    """Получить данные за текущий день по UTC"""
-    start_ms, end_ms = get_current_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_closed_pnl(api_key, api_secret, category, symbol, start_ms, end_ms)
-
-
-def get_pnl_yesterday(api_key, api_secret, category="linear", symbol=None):
-    """Получить данные за прошлый день по UTC"""
-    start_ms, end_ms = get_previous_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_closed_pnl(api_key, api_secret, category, symbol, start_ms, end_ms)
+# Стандартные периоды для get_*_today / get_*_yesterday / get_*_current_month / get_*_previous_month
+PERIOD_RANGES = {
+    "today": get_current_day_utc,
+    "yesterday": get_previous_day_utc,
+    "current_month": get_current_month_utc,
+    "previous_month": get_previous_month_utc,
+}
 
 
-def get_pnl_current_month(api_key, api_secret, category="linear", symbol=None):
-    """Получить данные за текущий месяц по UTC"""
-    start_ms, end_ms = get_current_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_closed_pnl(api_key, api_secret, category, symbol, start_ms, end_ms)
+# ============================================================================
+# Реестр эндпоинтов с пагинацией
+# ============================================================================
+#
+# path        - путь эндпоинта
+# max_limit   - максимальный размер страницы
+# window_days - максимальная длина диапазона startTime..endTime в одном запросе
+# list_key    - ключ списка записей в result
+# time_field  - поле записи с меткой времени (мс)
+# id_fields   - поля, однозначно определяющие запись (для дедупликации)
+# filters     - необязательные фильтры: имя аргумента функции -> имя параметра API
+
+ENDPOINTS = {
+    "closed_pnl": {
+        "path": "/v5/position/closed-pnl",
+        "max_limit": 100,
+        "window_days": 7,
+        "list_key": "list",
+        "time_field": "updatedTime",
+        "id_fields": ("orderId",),
+        "filters": {"category": "category", "symbol": "symbol"},
+    },
+    "executions": {
+        "path": "/v5/execution/list",
+        "max_limit": 100,
+        "window_days": 7,
+        "list_key": "list",
+        "time_field": "execTime",
+        "id_fields": ("execId",),
+        "filters": {"category": "category", "symbol": "symbol"},
+    },
+    "inter_transfers": {
+        "path": "/v5/asset/transfer/query-inter-transfer-list",
+        "max_limit": 50,
+        "window_days": 30,
+        "list_key": "list",
+        "time_field": "timestamp",
+        "id_fields": ("transferId",),
+        "filters": {"coin": "coin"},
+    },
+    "universal_transfers": {
+        "path": "/v5/asset/transfer/query-universal-transfer-list",
+        "max_limit": 50,
+        "window_days": 30,
+        "list_key": "list",
+        "time_field": "timestamp",
+        "id_fields": ("transferId",),
+        "filters": {"coin": "coin"},
+    },
+    "withdraws": {
+        "path": "/v5/asset/withdraw/query-record",
+        "max_limit": 50,
+        "window_days": 30,
+        "list_key": "rows",  # Для withdraw используется "rows", а не "list"
+        "time_field": "createTime",
+        "id_fields": ("withdrawId",),
+        "filters": {"coin": "coin", "withdraw_type": "withdrawType"},
+    },
+    "deposits": {
+        "path": "/v5/asset/deposit/query-record",
+        "max_limit": 50,
+        "window_days": 30,
+        "list_key": "rows",  # Для deposit используется "rows", а не "list"
+        "time_field": "successAt",
+        "id_fields": ("id", "txID", "txIndex"),
+        "filters": {"coin": "coin"},
+    },
+}
+
+
+def record_time(name, record):
+    """Метка времени записи эндпоинта name в миллисекундах (0, если ее нет)"""
+    try:
+        return int(record.get(ENDPOINTS[name]["time_field"]) or 0)
+    except (TypeError, ValueError):
+        return 0
 
 
-def get_pnl_previous_month(api_key, api_secret, category="linear", symbol=None):
-    """Получить данные за прошлый месяц по UTC"""
-    start_ms, end_ms = get_previous_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_closed_pnl(api_key, api_secret, category, symbol, start_ms, end_ms)
+def record_id(name, record):
+    """Ключ дедупликации записи эндпоинта name"""
+    return tuple(str(record.get(field, "")) for field in ENDPOINTS[name]["id_fields"])
 
 
 # ============================================================================
-# Функции для работы с исполненными сделками на споте /v5/execution/list
+# Движок пагинации: общий для всех эндпоинтов реестра
 # ============================================================================
 
-def get_execution_list(api_key, api_secret, category="spot", symbol=None,
-                       start_time=None, end_time=None, limit=50, cursor=None):
-    """Получение одной страницы исполненных сделок"""
-    endpoint = "/v5/execution/list"
+def _page_params(spec, start_time=None, end_time=None, limit=None, cursor=None, **filters):
+    """Собирает параметры запроса одной страницы по описанию эндпоинта"""
     params = {
-        "category": category,
-        "limit": min(limit, 100)
+        "limit": min(limit or spec["max_limit"], spec["max_limit"])
     }
 
-    if symbol:
-        params["symbol"] = symbol
+    for arg_name, api_name in spec["filters"].items():
+        if filters.get(arg_name):
+            params[api_name] = filters[arg_name]
     if start_time:
         params["startTime"] = start_time
     if end_time:
@@ -267,8 +354,18 @@ def get_execution_list(api_key, api_secret, category="spot", symbol=None,
     if cursor:
         params["cursor"] = cursor
 
-    response = send_request(api_key, api_secret, endpoint, params)
+    return params
 
+
+class FetchError(Exception):
+    """Диапазон не удалось загрузить полностью (после всех повторов)
+
+    Загруженные страницы остаются в чекпоинте, повторный вызов продолжит с них.
+    """
+
+
+def _extract_result(response):
+    """Возвращает result ответа или {} при ошибке"""
     if response and response.get("retCode") == 0:
         return response.get("result", {})
     else:
@@ -276,687 +373,1043 @@ def get_execution_list(api_key, api_secret, category="spot", symbol=None,
         return {}
 
 
-def get_all_executions(api_key, api_secret, category="spot", symbol=None,
-                       start_time=None, end_time=None):
-    """Получение всех исполненных сделок с пагинацией и разбивкой на периоды по 7 дней"""
-
-    # Если указаны временные рамки, проверяем их размер
-    if start_time and end_time:
-        # Максимальный диапазон - 7 дней в миллисекундах
-        max_range_ms = 7 * 24 * 60 * 60 * 1000
-        time_diff = end_time - start_time
+def _require_result(name, response):
+    """Возвращает result ответа или поднимает FetchError"""
+    if response and response.get("retCode") == 0:
+        return response.get("result") or {}
+    raise FetchError(f"{name}: {response}")
 
-        # Если диапазон больше 7 дней, разбиваем на куски
-        if time_diff > max_range_ms:
-            print(f"Диапазон превышает 7 дней, разбиваем на периоды...")
-            all_data = []
-            current_start = start_time
 
-            while current_start < end_time:
-                current_end = min(current_start + max_range_ms, end_time)
+def fetch_page(name, api_key, api_secret, start_time=None, end_time=None, limit=None, cursor=None, **filters):
+    """Получение одной страницы эндпоинта name из ENDPOINTS"""
+    spec = ENDPOINTS[name]
+    params = _page_params(spec, start_time, end_time, limit, cursor, **filters)
+    return _extract_result(send_request(api_key, api_secret, spec["path"], params))
 
-                print(
-                    f"\nЗагрузка периода: {datetime.fromtimestamp(current_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(current_end / 1000, tz=timezone.utc)}")
 
-                period_data = get_all_executions_single_period(
-                    api_key, api_secret, category, symbol, current_start, current_end
-                )
+async def fetch_page_async(name, api_key, api_secret, start_time=None, end_time=None, limit=None, cursor=None,
+                           **filters):
+    """Асинхронное получение одной страницы эндпоинта name из ENDPOINTS"""
+    spec = ENDPOINTS[name]
+    params = _page_params(spec, start_time, end_time, limit, cursor, **filters)
+    return _extract_result(await send_request_async(api_key, api_secret, spec["path"], params))
 
-                all_data.extend(period_data)
-                current_start = current_end + 1  # Переходим к следующему периоду
 
-                # Задержка между периодами
-                time.sleep(0.3)
+def _checkpoint_path(name, api_key, start_time, end_time, filters):
+    """Путь к чекпоинту загрузки одного периода"""
+    api_hash = hashlib.md5(api_key.encode()).hexdigest()[:8]
+    filters_str = "_".join(f"{key}={filters[key]}" for key in sorted(filters) if filters[key])
+    params_hash = hashlib.md5(f"{start_time}_{end_time}_{filters_str}".encode()).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{api_hash}_{name}_{params_hash}.ckpt")
 
-            print(f"\nВсего загружено записей за весь период: {len(all_data)}")
-            return all_data
 
-    # Если диапазон 7 дней или меньше (или не указан), используем обычную загрузку
-    return get_all_executions_single_period(api_key, api_secret, category, symbol, start_time, end_time)
+def _load_checkpoint(path):
+    """Читает чекпоинт периода
 
+    Чекпоинт - последовательность pickle-кадров {"list": [...], "next_cursor": ...},
+    по одному на загруженную страницу. Оборванный последний кадр игнорируется.
+    Кадр с next_cursor=None означает, что период загружен целиком.
 
-def get_all_executions_single_period(api_key, api_secret, category="spot", symbol=None,
-                                     start_time=None, end_time=None):
-    """Получение всех исполненных сделок для одного периода (до 7 дней) с пагинацией"""
-    all_data = []
+    Returns:
+        tuple: (страницы, курсор следующей страницы, номер следующей страницы, период загружен целиком)
+    """
+    pages = []
     cursor = None
-    page = 1
+    complete = False
 
-    while True:
-        print(f"  Загрузка страницы {page}...")
+    if not os.path.exists(path):
+        return pages, cursor, 1, complete
 
-        result = get_execution_list(
-            api_key, api_secret, category, symbol,
-            start_time, end_time, limit=100, cursor=cursor
-        )
+    if time.time() - os.path.getmtime(path) > CHECKPOINT_TTL:
+        _drop_checkpoint(path)
+        return pages, cursor, 1, complete
+
+    try:
+        with open(path, "rb") as f:
+            while True:
+                frame = pickle.load(f)
+                pages.append(frame["list"])
+                cursor = frame["next_cursor"]
+                complete = cursor is None
+    except EOFError:
+        pass
+    except Exception as e:
+        print(f"Чекпоинт {path} поврежден, продолжаем с последней целой страницы: {e}")
+
+    if not complete and cursor is None:
+        # Нет ни одной целой страницы - начинаем заново
+        pages = []
+
+    return pages, cursor, len(pages) + 1, complete
+
+
+def _append_checkpoint(path, data_list, next_cursor):
+    """Дописывает в чекпоинт страницу и курсор следующей страницы"""
+    try:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        with open(path, "ab") as f:
+            pickle.dump({"list": data_list, "next_cursor": next_cursor}, f)
+    except OSError as e:
+        print(f"Ошибка записи чекпоинта: {e}")
 
-        if not result:
-            break
 
-        data_list = result.get("list", [])
+def _drop_checkpoint(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Ошибка удаления чекпоинта: {e}")
 
-        if not data_list:
-            break
 
-        all_data.extend(data_list)
-        print(f"  Получено записей: {len(data_list)}")
+def sweep_checkpoints(max_age=CHECKPOINT_TTL):
+    """Удаляет чекпоинты, которые не дописывались дольше max_age секунд
+
+    Чекпоинт адресуется точным концом периода: прерванная загрузка открытого
+    периода ("сегодня" до текущего момента) оставляет файл, который следующий
+    запрос с другим концом уже не прочитает. Идущая загрузка дописывает
+    чекпоинт постранично, так что ее файл моложе max_age.
+
+    Returns:
+        int: сколько файлов удалено
+    """
+    try:
+        file_names = os.listdir(CHECKPOINT_DIR)
+    except FileNotFoundError:
+        return 0
+
+    cutoff = time.time() - max_age
+    removed = 0
+    for file_name in file_names:
+        if not file_name.endswith(".ckpt"):
+            continue
+        path = os.path.join(CHECKPOINT_DIR, file_name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Ошибка удаления чекпоинта: {e}")
+    return removed
+
+
+def _drop_window_checkpoints(name, api_key, windows, filters):
+    """Удаляет чекпоинты всех периодов полностью загруженного диапазона"""
+    for window_start, window_end in windows:
+        _drop_checkpoint(_checkpoint_path(name, api_key, window_start, window_end, filters))
+
+
+def _is_open_period(end_time):
+    """Конец периода еще не наступил: записи за него продолжают появляться"""
+    return end_time is None or end_time >= int(time.time() * 1000)
+
+
+def _resume_period(name, api_key, start_time, end_time, filters):
+    """Поднимает чекпоинт периода и печатает, с чего продолжаем
+
+    Чекпоинт открытого периода не используется: страницы в нем сняты до записей,
+    появившихся позже, и "загруженный целиком" период на деле неполон - он загружается заново.
+    """
+    checkpoint = _checkpoint_path(name, api_key, start_time, end_time, filters)
+    if _is_open_period(end_time):
+        _drop_checkpoint(checkpoint)
+        return checkpoint, [], None, 1, False
+
+    pages, cursor, page, complete = _load_checkpoint(checkpoint)
+    if complete:
+        print(f"  Период уже загружен (чекпоинт): {sum(map(len, pages))} записей")
+    elif cursor:
+        print(f"  Продолжаем с чекпоинта: {sum(map(len, pages))} записей, страница {page}")
+    return checkpoint, pages, cursor, page, complete
+
+
+def iter_period_pages(name, api_key, api_secret, start_time=None, end_time=None, keep_checkpoint=False,
+                      **filters):
+    """Генератор страниц эндпоинта name для одного периода (до window_days дней)
+
+    Отдает список записей каждой страницы сразу по получении. Каждая страница
+    сохраняется в чекпоинт; если загрузка прервется (FetchError), следующий вызов
+    с теми же параметрами сначала отдаст сохраненные страницы и продолжит с последнего курсора.
+
+    Args:
+        keep_checkpoint: не удалять чекпоинт после успешной загрузки (его удалит вызывающий,
+            когда загрузятся все периоды диапазона); чекпоинт открытого периода удаляется всегда
+    """
+    spec = ENDPOINTS[name]
+    checkpoint, pages, cursor, page, complete = _resume_period(name, api_key, start_time, end_time, filters)
+    yield from pages
+
+    while not complete:
+        print(f"  Загрузка страницы {page}...")
+
+        params = _page_params(spec, start_time, end_time, cursor=cursor, **filters)
+        result = _require_result(name, send_request(api_key, api_secret, spec["path"], params))
 
+        data_list = result.get(spec["list_key"], [])
         # Проверка наличия следующей страницы
-        next_cursor = result.get("nextPageCursor")
-        if not next_cursor:
-            break
+        next_cursor = (result.get("nextPageCursor") or None) if data_list else None
+        print(f"  Получено записей: {len(data_list)}")
 
+        _append_checkpoint(checkpoint, data_list, next_cursor)
         cursor = next_cursor
+        complete = next_cursor is None
         page += 1
 
-        # Небольшая задержка между запросами
-        time.sleep(0.2)
+        if data_list:
+            yield data_list
 
-    print(f"  Всего записей за период: {len(all_data)}")
-    return all_data
+    if not keep_checkpoint or _is_open_period(end_time):
+        _drop_checkpoint(checkpoint)
 
 
-def get_executions_today(api_key, api_secret, category="spot", symbol=None):
-    """Получить исполненные сделки за текущий день по UTC"""
-    start_ms, end_ms = get_current_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_executions(api_key, api_secret, category, symbol, start_ms, end_ms)
+async def aiter_period_pages(name, api_key, api_secret, start_time=None, end_time=None, keep_checkpoint=False,
+                             **filters):
+    """Асинхронный генератор страниц эндпоинта name для одного периода (см. iter_period_pages)
 
+    Чтение и запись чекпоинта (файлы и pickle) идут в потоке, не останавливая цикл событий.
+    """
+    spec = ENDPOINTS[name]
+    checkpoint, pages, cursor, page, complete = await asyncio.to_thread(
+        _resume_period, name, api_key, start_time, end_time, filters
+    )
+    for data_list in pages:
+        yield data_list
 
-def get_executions_yesterday(api_key, api_secret, category="spot", symbol=None):
-    """Получить исполненные сделки за прошлый день по UTC"""
-    start_ms, end_ms = get_previous_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_executions(api_key, api_secret, category, symbol, start_ms, end_ms)
+    while not complete:
+        print(f"  Загрузка страницы {page}...")
 
+        params = _page_params(spec, start_time, end_time, cursor=cursor, **filters)
+        result = _require_result(name, await send_request_async(api_key, api_secret, spec["path"], params))
 
-def get_executions_current_month(api_key, api_secret, category="spot", symbol=None):
-    """Получить исполненные сделки за текущий месяц по UTC"""
-    start_ms, end_ms = get_current_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_executions(api_key, api_secret, category, symbol, start_ms, end_ms)
+        data_list = result.get(spec["list_key"], [])
+        # Проверка наличия следующей страницы
+        next_cursor = (result.get("nextPageCursor") or None) if data_list else None
+        print(f"  Получено записей: {len(data_list)}")
 
+        await asyncio.to_thread(_append_checkpoint, checkpoint, data_list, next_cursor)
+        cursor = next_cursor
+        complete = next_cursor is None
+        page += 1
 
-def get_executions_previous_month(api_key, api_secret, category="spot", symbol=None):
-    """Получить исполненные сделки за прошлый месяц по UTC"""
-    start_ms, end_ms = get_previous_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_executions(api_key, api_secret, category, symbol, start_ms, end_ms)
+        if data_list:
+            yield data_list
 
+    if not keep_checkpoint or _is_open_period(end_time):
+        await asyncio.to_thread(_drop_checkpoint, checkpoint)
 
-# ============================================================================
-# Функции для работы с внутренними переводами /v5/asset/transfer/query-inter-transfer-list
-# ============================================================================
 
-def get_inter_transfer_list(api_key, api_secret, coin=None,
-                            start_time=None, end_time=None, limit=50, cursor=None):
-    """Получение одной страницы внутренних переводов"""
-    endpoint = "/v5/asset/transfer/query-inter-transfer-list"
-    params = {
-        "limit": min(limit, 50)  # Максимум 50 для этого эндпоинта
-    }
+def fetch_single_period(name, api_key, api_secret, start_time=None, end_time=None, keep_checkpoint=False,
+                        **filters):
+    """Получение всех записей эндпоинта name для одного периода (до window_days дней) с пагинацией
 
-    if coin:
-        params["coin"] = coin
-    if start_time:
-        params["startTime"] = start_time
-    if end_time:
-        params["endTime"] = end_time
-    if cursor:
-        params["cursor"] = cursor
+    Args:
+        keep_checkpoint: не удалять чекпоинт после успешной загрузки (его удалит fetch_all,
+            когда загрузятся все периоды диапазона)
+    """
+    all_data = []
+    for data_list in iter_period_pages(name, api_key, api_secret, start_time, end_time, keep_checkpoint, **filters):
+        all_data.extend(data_list)
 
-    response = send_request(api_key, api_secret, endpoint, params)
+    print(f"  Всего записей за период: {len(all_data)}")
+    return all_data
 
-    if response and response.get("retCode") == 0:
-        return response.get("result", {})
-    else:
-        print(f"Ошибка API: {response}")
-        return {}
 
+async def fetch_single_period_async(name, api_key, api_secret, start_time=None, end_time=None,
+                                    keep_checkpoint=False, **filters):
+    """Асинхронное получение всех записей эндпоинта name для одного периода с пагинацией и чекпоинтами"""
+    all_data = []
+    async for data_list in aiter_period_pages(name, api_key, api_secret, start_time, end_time, keep_checkpoint,
+                                              **filters):
+        all_data.extend(data_list)
 
-def get_all_inter_transfers(api_key, api_secret, coin=None,
-                            start_time=None, end_time=None):
-    """Получение всех внутренних переводов с пагинацией и разбивкой на периоды по 30 дней"""
+    print(f"  Всего записей за период: {len(all_data)}")
+    return all_data
 
-    # Если указаны временные рамки, проверяем их размер
-    if start_time and end_time:
-        # Максимальный диапазон - 30 дней в миллисекундах
-        max_range_ms = 30 * 24 * 60 * 60 * 1000
-        time_diff = end_time - start_time
 
-        # Если диапазон больше 30 дней, разбиваем на куски
-        if time_diff > max_range_ms:
-            print(f"Диапазон превышает 30 дней, разбиваем на периоды...")
-            all_data = []
-            current_start = start_time
+def split_time_range(start_time, end_time, max_days):
+    """Разбивает диапазон [start_time, end_time] на периоды не длиннее max_days дней
 
-            while current_start < end_time:
-                current_end = min(current_start + max_range_ms, end_time)
+    Returns:
+        list: список пар (start_ms, end_ms) в порядке возрастания времени
+    """
+    if not (start_time and end_time):
+        return [(start_time, end_time)]
 
-                print(
-                    f"\nЗагрузка периода: {datetime.fromtimestamp(current_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(current_end / 1000, tz=timezone.utc)}")
+    max_range_ms = max_days * 24 * 60 * 60 * 1000
+    if end_time - start_time <= max_range_ms:
+        return [(start_time, end_time)]
 
-                period_data = get_all_inter_transfers_single_period(
-                    api_key, api_secret, coin, current_start, current_end
-                )
+    windows = []
+    current_start = start_time
+    while current_start < end_time:
+        current_end = min(current_start + max_range_ms, end_time)
+        windows.append((current_start, current_end))
+        current_start = current_end + 1  # Переходим к следующему периоду
+    return windows
 
-                all_data.extend(period_data)
-                current_start = current_end + 1  # Переходим к следующему периоду
 
-                # Задержка между периодами
-                time.sleep(0.3)
+def _print_window(window_start, window_end):
+    print(
+        f"\nЗагрузка периода: {datetime.fromtimestamp(window_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(window_end / 1000, tz=timezone.utc)}")
 
-            print(f"\nВсего загружено записей за весь период: {len(all_data)}")
-            return all_data
 
-    # Если диапазон 30 дней или меньше (или не указан), используем обычную загрузку
-    return get_all_inter_transfers_single_period(api_key, api_secret, coin, start_time, end_time)
+def _print_period(start_ms, end_ms):
+    print(
+        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
 
 
-def get_all_inter_transfers_single_period(api_key, api_secret, coin=None,
-                                         start_time=None, end_time=None):
-    """Получение всех внутренних переводов для одного периода (до 30 дней) с пагинацией"""
-    all_data = []
-    cursor = None
-    page = 1
+def fetch_all(name, api_key, api_secret, start_time=None, end_time=None, max_workers=1, **filters):
+    """Получение всех записей эндпоинта name с пагинацией и разбивкой на периоды по window_days дней
 
-    while True:
-        print(f"  Загрузка страницы {page}...")
+    Одновременные вызовы для того же аккаунта, эндпоинта, диапазона и фильтров
+    объединяются в одну загрузку (singleflight).
 
-        result = get_inter_transfer_list(
-            api_key, api_secret, coin,
-            start_time, end_time, limit=50, cursor=cursor
-        )
+    Args:
+        max_workers: сколько периодов загружать одновременно (1 - последовательно)
 
-        if not result:
-            break
+    Returns:
+        list: записи всех периодов в порядке следования периодов
+    """
+    return flights.do(
+        "fetch_all", flight_key(name, api_key, start_time, end_time, filters),
+        lambda: _fetch_all(name, api_key, api_secret, start_time, end_time, max_workers, **filters)
+    )
 
-        data_list = result.get("list", [])
 
-        if not data_list:
-            break
+def _fetch_all(name, api_key, api_secret, start_time, end_time, max_workers, **filters):
+    max_days = ENDPOINTS[name]["window_days"]
+    windows = split_time_range(start_time, end_time, max_days)
 
-        all_data.extend(data_list)
-        print(f"  Получено записей: {len(data_list)}")
+    # Если диапазон window_days дней или меньше (или не указан), используем обычную загрузку
+    if len(windows) == 1:
+        return fetch_single_period(name, api_key, api_secret, start_time, end_time, **filters)
 
-        # Проверка наличия следующей страницы
-        next_cursor = result.get("nextPageCursor")
-        if not next_cursor:
-            break
+    print(f"Диапазон превышает {max_days} дней, разбиваем на {len(windows)} периодов...")
 
-        cursor = next_cursor
-        page += 1
+    def fetch_window(window):
+        _print_window(*window)
+        # Чекпоинты готовых периодов храним, пока не загрузится весь диапазон
+        return fetch_single_period(name, api_key, api_secret, *window, keep_checkpoint=True, **filters)
 
-        # Небольшая задержка между запросами
-        time.sleep(0.2)
+    if max_workers > 1:
+        # Периоды независимы - грузим их параллельно, результат собираем в исходном порядке
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(fetch_window, windows))
+    else:
+        results = [fetch_window(window) for window in windows]
 
-    print(f"  Всего записей за период: {len(all_data)}")
-    return all_data
+    _drop_window_checkpoints(name, api_key, windows, filters)
 
+    all_data = [record for period_data in results for record in period_data]
+    print(f"\nВсего загружено записей за весь период: {len(all_data)}")
+    return all_data
 
-def get_inter_transfers_today(api_key, api_secret, coin=None):
-    """Получить внутренние переводы за текущий день по UTC"""
-    start_ms, end_ms = get_current_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_inter_transfers(api_key, api_secret, coin, start_ms, end_ms)
 
+async def fetch_all_async(name, api_key, api_secret, start_time=None, end_time=None, max_concurrency=None,
+                          **filters):
+    """Асинхронное получение всех записей эндпоинта name с разбивкой на периоды по window_days дней
 
-def get_inter_transfers_yesterday(api_key, api_secret, coin=None):
-    """Получить внутренние переводы за прошлый день по UTC"""
-    start_ms, end_ms = get_previous_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_inter_transfers(api_key, api_secret, coin, start_ms, end_ms)
+    Одновременные вызовы для того же аккаунта, эндпоинта, диапазона и фильтров
+    объединяются в одну загрузку (singleflight).
 
+    Args:
+        max_concurrency: сколько периодов загружать одновременно
+            (по умолчанию WINDOW_CONCURRENCY, 1 - последовательно)
 
-def get_inter_transfers_current_month(api_key, api_secret, coin=None):
-    """Получить внутренние переводы за текущий месяц по UTC"""
-    start_ms, end_ms = get_current_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_inter_transfers(api_key, api_secret, coin, start_ms, end_ms)
+    Returns:
+        list: записи всех периодов в порядке следования периодов
+    """
+    return await flights.do_async(
+        "fetch_all", flight_key(name, api_key, start_time, end_time, filters),
+        lambda: _fetch_all_async(name, api_key, api_secret, start_time, end_time, max_concurrency, **filters)
+    )
 
 
-def get_inter_transfers_previous_month(api_key, api_secret, coin=None):
-    """Получить внутренние переводы за прошлый месяц по UTC"""
-    start_ms, end_ms = get_previous_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_inter_transfers(api_key, api_secret, coin, start_ms, end_ms)
+async def _fetch_all_async(name, api_key, api_secret, start_time, end_time, max_concurrency, **filters):
+    if max_concurrency is None:
+        max_concurrency = WINDOW_CONCURRENCY
 
+    max_days = ENDPOINTS[name]["window_days"]
+    windows = split_time_range(start_time, end_time, max_days)
 
-# ============================================================================
-# Функции для работы с внешними переводами /v5/asset/transfer/query-universal-transfer-list
-# ============================================================================
+    if len(windows) == 1:
+        return await fetch_single_period_async(name, api_key, api_secret, start_time, end_time, **filters)
 
-def get_universal_transfer_list(api_key, api_secret, coin=None,
-                                start_time=None, end_time=None, limit=50, cursor=None):
-    """Получение одной страницы универсальных (внешних) переводов"""
-    endpoint = "/v5/asset/transfer/query-universal-transfer-list"
-    params = {
-        "limit": min(limit, 50)  # Максимум 50 для этого эндпоинта
-    }
+    print(f"Диапазон превышает {max_days} дней, разбиваем на {len(windows)} периодов...")
 
-    if coin:
-        params["coin"] = coin
-    if start_time:
-        params["startTime"] = start_time
-    if end_time:
-        params["endTime"] = end_time
-    if cursor:
-        params["cursor"] = cursor
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
 
-    response = send_request(api_key, api_secret, endpoint, params)
+    async def fetch_window(window_start, window_end):
+        async with semaphore:
+            _print_window(window_start, window_end)
+            return await fetch_single_period_async(name, api_key, api_secret, window_start, window_end,
+                                                   keep_checkpoint=True, **filters)
 
-    if response and response.get("retCode") == 0:
-        return response.get("result", {})
-    else:
-        print(f"Ошибка API: {response}")
-        return {}
+    # gather сохраняет порядок периодов, поэтому записи остаются упорядочены по времени.
+    # Ошибку одного периода поднимаем только после остальных, чтобы их страницы успели попасть в чекпоинты
+    results = await asyncio.gather(*(fetch_window(*window) for window in windows), return_exceptions=True)
+    for period_data in results:
+        if isinstance(period_data, BaseException):
+            raise period_data
 
+    await asyncio.to_thread(_drop_window_checkpoints, name, api_key, windows, filters)
 
-def get_all_universal_transfers(api_key, api_secret, coin=None,
-                                start_time=None, end_time=None):
-    """Получение всех универсальных переводов с пагинацией и разбивкой на периоды по 30 дней"""
+    all_data = [record for period_data in results for record in period_data]
+    print(f"\nВсего загружено записей за весь период: {len(all_data)}")
+    return all_data
 
-    # Если указаны временные рамки, проверяем их размер
-    if start_time and end_time:
-        # Максимальный диапазон - 30 дней в миллисекундах
-        max_range_ms = 30 * 24 * 60 * 60 * 1000
-        time_diff = end_time - start_time
 
-        # Если диапазон больше 30 дней, разбиваем на куски
-        if time_diff > max_range_ms:
-            print(f"Диапазон превышает 30 дней, разбиваем на периоды...")
-            all_data = []
-            current_start = start_time
+def iter_pages(name, api_key, api_secret, start_time=None, end_time=None, **filters):
+    """Генератор страниц эндпоинта name за весь диапазон (периоды по window_days дней идут по порядку)
 
-            while current_start < end_time:
-                current_end = min(current_start + max_range_ms, end_time)
+    В памяти одновременно держится одна страница, а не весь диапазон.
+    """
+    windows = split_time_range(start_time, end_time, ENDPOINTS[name]["window_days"])
+    keep_checkpoint = len(windows) > 1
 
-                print(
-                    f"\nЗагрузка периода: {datetime.fromtimestamp(current_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(current_end / 1000, tz=timezone.utc)}")
+    for window in windows:
+        if keep_checkpoint:
+            _print_window(*window)
+        yield from iter_period_pages(name, api_key, api_secret, *window, keep_checkpoint, **filters)
 
-                period_data = get_all_universal_transfers_single_period(
-                    api_key, api_secret, coin, current_start, current_end
-                )
+    if keep_checkpoint:
+        _drop_window_checkpoints(name, api_key, windows, filters)
 
-                all_data.extend(period_data)
-                current_start = current_end + 1  # Переходим к следующему периоду
 
-                # Задержка между периодами
-                time.sleep(0.3)
+async def aiter_pages(name, api_key, api_secret, start_time=None, end_time=None, **filters):
+    """Асинхронный генератор страниц эндпоинта name за весь диапазон (см. iter_pages)"""
+    windows = split_time_range(start_time, end_time, ENDPOINTS[name]["window_days"])
+    keep_checkpoint = len(windows) > 1
 
-            print(f"\nВсего загружено записей за весь период: {len(all_data)}")
-            return all_data
+    for window in windows:
+        if keep_checkpoint:
+            _print_window(*window)
+        async for data_list in aiter_period_pages(name, api_key, api_secret, *window, keep_checkpoint, **filters):
+            yield data_list
 
-    # Если диапазон 30 дней или меньше (или не указан), используем обычную загрузку
-    return get_all_universal_transfers_single_period(api_key, api_secret, coin, start_time, end_time)
+    if keep_checkpoint:
+        await asyncio.to_thread(_drop_window_checkpoints, name, api_key, windows, filters)
 
 
-def get_all_universal_transfers_single_period(api_key, api_secret, coin=None,
-                                              start_time=None, end_time=None):
-    """Получение всех универсальных переводов для одного периода (до 30 дней) с пагинацией"""
-    all_data = []
-    cursor = None
-    page = 1
+def fetch_for_period(name, period, api_key, api_secret, **filters):
+    """Получение всех записей эндпоинта name за стандартный период из PERIOD_RANGES"""
+    start_ms, end_ms = PERIOD_RANGES[period]()
+    _print_period(start_ms, end_ms)
+    return fetch_all(name, api_key, api_secret, start_ms, end_ms, **filters)
 
-    while True:
-        print(f"  Загрузка страницы {page}...")
 
-        result = get_universal_transfer_list(
-            api_key, api_secret, coin,
-            start_time, end_time, limit=50, cursor=cursor
-        )
+async def fetch_for_period_async(name, period, api_key, api_secret, **filters):
+    """Асинхронное получение всех записей эндпоинта name за стандартный период из PERIOD_RANGES"""
+    start_ms, end_ms = PERIOD_RANGES[period]()
+    _print_period(start_ms, end_ms)
+    return await fetch_all_async(name, api_key, api_secret, start_ms, end_ms, **filters)
 
-        if not result:
-            break
 
-        data_list = result.get("list", [])
+# ============================================================================
+# Функции для работы с закрытыми позициями /v5/position/closed-pnl
+# ============================================================================
 
-        if not data_list:
-            break
+def get_closed_pnl(api_key, api_secret, category="linear", symbol=None,
+                   start_time=None, end_time=None, limit=50, cursor=None):
+    """Получение одной страницы закрытых позиций"""
+    return fetch_page("closed_pnl", api_key, api_secret, start_time, end_time, limit, cursor,
+                      category=category, symbol=symbol)
 
-        all_data.extend(data_list)
-        print(f"  Получено записей: {len(data_list)}")
 
-        # Проверка наличия следующей страницы
-        next_cursor = result.get("nextPageCursor")
-        if not next_cursor:
-            break
+def get_all_closed_pnl(api_key, api_secret, category="linear", symbol=None,
+                       start_time=None, end_time=None, max_workers=1):
+    """Получение всех закрытых позиций с пагинацией и разбивкой на периоды по 7 дней"""
+    return fetch_all("closed_pnl", api_key, api_secret, start_time, end_time, max_workers=max_workers,
+                     category=category, symbol=symbol)
 
-        cursor = next_cursor
-        page += 1
 
-        # Небольшая задержка между запросами
-        time.sleep(0.2)
+def get_all_closed_pnl_single_period(api_key, api_secret, category="linear", symbol=None,
+                                     start_time=None, end_time=None):
+    """Получение всех закрытых позиций для одного периода (до 7 дней) с пагинацией"""
+    return fetch_single_period("closed_pnl", api_key, api_secret, start_time, end_time,
+                               category=category, symbol=symbol)
 
-    print(f"  Всего записей за период: {len(all_data)}")
-    return all_data
 
+def iter_closed_pnl_pages(api_key, api_secret, category="linear", symbol=None,
+                          start_time=None, end_time=None):
+    """Генератор страниц закрытых позиций за диапазон (по одной странице в памяти)"""
+    return iter_pages("closed_pnl", api_key, api_secret, start_time, end_time, category=category, symbol=symbol)
 
-def get_universal_transfers_today(api_key, api_secret, coin=None):
-    """Получить универсальные переводы за текущий день по UTC"""
-    start_ms, end_ms = get_current_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_universal_transfers(api_key, api_secret, coin, start_ms, end_ms)
 
+def get_pnl_today(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за текущий день по UTC"""
+    return fetch_for_period("closed_pnl", "today", api_key, api_secret, category=category, symbol=symbol)
 
-def get_universal_transfers_yesterday(api_key, api_secret, coin=None):
-    """Получить универсальные переводы за прошлый день по UTC"""
-    start_ms, end_ms = get_previous_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_universal_transfers(api_key, api_secret, coin, start_ms, end_ms)
 
+def get_pnl_yesterday(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за прошлый день по UTC"""
+    return fetch_for_period("closed_pnl", "yesterday", api_key, api_secret, category=category, symbol=symbol)
 
-def get_universal_transfers_current_month(api_key, api_secret, coin=None):
-    """Получить универсальные переводы за текущий месяц по UTC"""
-    start_ms, end_ms = get_current_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_universal_transfers(api_key, api_secret, coin, start_ms, end_ms)
 
+def get_pnl_current_month(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за текущий месяц по UTC"""
+    return fetch_for_period("closed_pnl", "current_month", api_key, api_secret,
+                            category=category, symbol=symbol)
 
-def get_universal_transfers_previous_month(api_key, api_secret, coin=None):
-    """Получить универсальные переводы за прошлый месяц по UTC"""
-    start_ms, end_ms = get_previous_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_universal_transfers(api_key, api_secret, coin, start_ms, end_ms)
+
+def get_pnl_previous_month(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за прошлый месяц по UTC"""
+    return fetch_for_period("closed_pnl", "previous_month", api_key, api_secret,
+                            category=category, symbol=symbol)
+
+
+async def get_closed_pnl_async(api_key, api_secret, category="linear", symbol=None,
+                               start_time=None, end_time=None, limit=50, cursor=None):
+    """Асинхронное получение одной страницы закрытых позиций"""
+    return await fetch_page_async("closed_pnl", api_key, api_secret, start_time, end_time, limit, cursor,
+                                  category=category, symbol=symbol)
+
+
+async def get_all_closed_pnl_async(api_key, api_secret, category="linear", symbol=None,
+                                   start_time=None, end_time=None, max_concurrency=None):
+    """Асинхронное получение всех закрытых позиций с пагинацией и разбивкой на периоды по 7 дней"""
+    return await fetch_all_async("closed_pnl", api_key, api_secret, start_time, end_time,
+                                 max_concurrency=max_concurrency, category=category, symbol=symbol)
+
+
+async def get_all_closed_pnl_single_period_async(api_key, api_secret, category="linear", symbol=None,
+                                                 start_time=None, end_time=None):
+    """Асинхронное получение всех закрытых позиций для одного периода (до 7 дней) с пагинацией"""
+    return await fetch_single_period_async("closed_pnl", api_key, api_secret, start_time, end_time,
+                                           category=category, symbol=symbol)
+
+
+def aiter_closed_pnl_pages(api_key, api_secret, category="linear", symbol=None,
+                           start_time=None, end_time=None):
+    """Асинхронный генератор страниц закрытых позиций за диапазон"""
+    return aiter_pages("closed_pnl", api_key, api_secret, start_time, end_time, category=category, symbol=symbol)
+
+
+async def get_pnl_today_async(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за текущий день по UTC (асинхронно)"""
+    return await fetch_for_period_async("closed_pnl", "today", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+async def get_pnl_yesterday_async(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за прошлый день по UTC (асинхронно)"""
+    return await fetch_for_period_async("closed_pnl", "yesterday", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+async def get_pnl_current_month_async(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за текущий месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("closed_pnl", "current_month", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+async def get_pnl_previous_month_async(api_key, api_secret, category="linear", symbol=None):
+    """Получить данные за прошлый месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("closed_pnl", "previous_month", api_key, api_secret,
+                                        category=category, symbol=symbol)
 
 
 # ============================================================================
-# Функции для работы с выводами средств /v5/asset/withdraw/query-record
+# Функции для работы с исполненными сделками на споте /v5/execution/list
 # ============================================================================
 
-def get_withdraw_record(api_key, api_secret, coin=None, withdraw_type=None,
-                        start_time=None, end_time=None, limit=50, cursor=None):
-    """Получение одной страницы записей о выводах"""
-    endpoint = "/v5/asset/withdraw/query-record"
-    params = {
-        "limit": min(limit, 50)  # Максимум 50 для этого эндпоинта
-    }
+def get_execution_list(api_key, api_secret, category="spot", symbol=None,
+                       start_time=None, end_time=None, limit=50, cursor=None):
+    """Получение одной страницы исполненных сделок"""
+    return fetch_page("executions", api_key, api_secret, start_time, end_time, limit, cursor,
+                      category=category, symbol=symbol)
 
-    if coin:
-        params["coin"] = coin
-    if withdraw_type:
-        params["withdrawType"] = withdraw_type
-    if start_time:
-        params["startTime"] = start_time
-    if end_time:
-        params["endTime"] = end_time
-    if cursor:
-        params["cursor"] = cursor
 
-    response = send_request(api_key, api_secret, endpoint, params)
+def get_all_executions(api_key, api_secret, category="spot", symbol=None,
+                       start_time=None, end_time=None, max_workers=1):
+    """Получение всех исполненных сделок с пагинацией и разбивкой на периоды по 7 дней"""
+    return fetch_all("executions", api_key, api_secret, start_time, end_time, max_workers=max_workers,
+                     category=category, symbol=symbol)
 
-    if response and response.get("retCode") == 0:
-        return response.get("result", {})
-    else:
-        print(f"Ошибка API: {response}")
-        return {}
 
+def get_all_executions_single_period(api_key, api_secret, category="spot", symbol=None,
+                                     start_time=None, end_time=None):
+    """Получение всех исполненных сделок для одного периода (до 7 дней) с пагинацией"""
+    return fetch_single_period("executions", api_key, api_secret, start_time, end_time,
+                               category=category, symbol=symbol)
 
-def get_all_withdraws(api_key, api_secret, coin=None, withdraw_type=None,
-                     start_time=None, end_time=None):
-    """Получение всех записей о выводах с пагинацией и разбивкой на периоды по 30 дней"""
 
-    # Если указаны временные рамки, проверяем их размер
-    if start_time and end_time:
-        # Максимальный диапазон - 30 дней в миллисекундах
-        max_range_ms = 30 * 24 * 60 * 60 * 1000
-        time_diff = end_time - start_time
+def iter_execution_pages(api_key, api_secret, category="spot", symbol=None,
+                         start_time=None, end_time=None):
+    """Генератор страниц исполненных сделок за диапазон (по одной странице в памяти)"""
+    return iter_pages("executions", api_key, api_secret, start_time, end_time, category=category, symbol=symbol)
 
-        # Если диапазон больше 30 дней, разбиваем на куски
-        if time_diff > max_range_ms:
-            print(f"Диапазон превышает 30 дней, разбиваем на периоды...")
-            all_data = []
-            current_start = start_time
 
-            while current_start < end_time:
-                current_end = min(current_start + max_range_ms, end_time)
+def get_executions_today(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за текущий день по UTC"""
+    return fetch_for_period("executions", "today", api_key, api_secret, category=category, symbol=symbol)
 
-                print(
-                    f"\nЗагрузка периода: {datetime.fromtimestamp(current_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(current_end / 1000, tz=timezone.utc)}")
 
-                period_data = get_all_withdraws_single_period(
-                    api_key, api_secret, coin, withdraw_type, current_start, current_end
-                )
+def get_executions_yesterday(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за прошлый день по UTC"""
+    return fetch_for_period("executions", "yesterday", api_key, api_secret, category=category, symbol=symbol)
 
-                all_data.extend(period_data)
-                current_start = current_end + 1  # Переходим к следующему периоду
 
-                # Задержка между периодами
-                time.sleep(0.3)
+def get_executions_current_month(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за текущий месяц по UTC"""
+    return fetch_for_period("executions", "current_month", api_key, api_secret,
+                            category=category, symbol=symbol)
 
-            print(f"\nВсего загружено записей за весь период: {len(all_data)}")
-            return all_data
 
-    # Если диапазон 30 дней или меньше (или не указан), используем обычную загрузку
-    return get_all_withdraws_single_period(api_key, api_secret, coin, withdraw_type, start_time, end_time)
+def get_executions_previous_month(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за прошлый месяц по UTC"""
+    return fetch_for_period("executions", "previous_month", api_key, api_secret,
+                            category=category, symbol=symbol)
 
 
-def get_all_withdraws_single_period(api_key, api_secret, coin=None, withdraw_type=None,
+async def get_execution_list_async(api_key, api_secret, category="spot", symbol=None,
+                                   start_time=None, end_time=None, limit=50, cursor=None):
+    """Асинхронное получение одной страницы исполненных сделок"""
+    return await fetch_page_async("executions", api_key, api_secret, start_time, end_time, limit, cursor,
+                                  category=category, symbol=symbol)
+
+
+async def get_all_executions_async(api_key, api_secret, category="spot", symbol=None,
+                                   start_time=None, end_time=None, max_concurrency=None):
+    """Асинхронное получение всех исполненных сделок с пагинацией и разбивкой на периоды по 7 дней"""
+    return await fetch_all_async("executions", api_key, api_secret, start_time, end_time,
+                                 max_concurrency=max_concurrency, category=category, symbol=symbol)
+
+
+async def get_all_executions_single_period_async(api_key, api_secret, category="spot", symbol=None,
+                                                 start_time=None, end_time=None):
+    """Асинхронное получение всех исполненных сделок для одного периода (до 7 дней) с пагинацией"""
+    return await fetch_single_period_async("executions", api_key, api_secret, start_time, end_time,
+                                           category=category, symbol=symbol)
+
+
+def aiter_execution_pages(api_key, api_secret, category="spot", symbol=None,
+                          start_time=None, end_time=None):
+    """Асинхронный генератор страниц исполненных сделок за диапазон"""
+    return aiter_pages("executions", api_key, api_secret, start_time, end_time, category=category, symbol=symbol)
+
+
+async def get_executions_today_async(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за текущий день по UTC (асинхронно)"""
+    return await fetch_for_period_async("executions", "today", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+async def get_executions_yesterday_async(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за прошлый день по UTC (асинхронно)"""
+    return await fetch_for_period_async("executions", "yesterday", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+async def get_executions_current_month_async(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за текущий месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("executions", "current_month", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+async def get_executions_previous_month_async(api_key, api_secret, category="spot", symbol=None):
+    """Получить исполненные сделки за прошлый месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("executions", "previous_month", api_key, api_secret,
+                                        category=category, symbol=symbol)
+
+
+# ============================================================================
+# Функции для работы с внутренними переводами /v5/asset/transfer/query-inter-transfer-list
+# ============================================================================
+
+def get_inter_transfer_list(api_key, api_secret, coin=None,
+                            start_time=None, end_time=None, limit=50, cursor=None):
+    """Получение одной страницы внутренних переводов"""
+    return fetch_page("inter_transfers", api_key, api_secret, start_time, end_time, limit, cursor,
+                      coin=coin)
+
+
+def get_all_inter_transfers(api_key, api_secret, coin=None,
+                            start_time=None, end_time=None, max_workers=1):
+    """Получение всех внутренних переводов с пагинацией и разбивкой на периоды по 30 дней"""
+    return fetch_all("inter_transfers", api_key, api_secret, start_time, end_time, max_workers=max_workers,
+                     coin=coin)
+
+
+def get_all_inter_transfers_single_period(api_key, api_secret, coin=None,
+                                          start_time=None, end_time=None):
+    """Получение всех внутренних переводов для одного периода (до 30 дней) с пагинацией"""
+    return fetch_single_period("inter_transfers", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+def iter_inter_transfer_pages(api_key, api_secret, coin=None,
+                              start_time=None, end_time=None):
+    """Генератор страниц внутренних переводов за диапазон (по одной странице в памяти)"""
+    return iter_pages("inter_transfers", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+def get_inter_transfers_today(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за текущий день по UTC"""
+    return fetch_for_period("inter_transfers", "today", api_key, api_secret, coin=coin)
+
+
+def get_inter_transfers_yesterday(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за прошлый день по UTC"""
+    return fetch_for_period("inter_transfers", "yesterday", api_key, api_secret, coin=coin)
+
+
+def get_inter_transfers_current_month(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за текущий месяц по UTC"""
+    return fetch_for_period("inter_transfers", "current_month", api_key, api_secret, coin=coin)
+
+
+def get_inter_transfers_previous_month(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за прошлый месяц по UTC"""
+    return fetch_for_period("inter_transfers", "previous_month", api_key, api_secret, coin=coin)
+
+
+async def get_inter_transfer_list_async(api_key, api_secret, coin=None,
+                                        start_time=None, end_time=None, limit=50, cursor=None):
+    """Асинхронное получение одной страницы внутренних переводов"""
+    return await fetch_page_async("inter_transfers", api_key, api_secret, start_time, end_time, limit, cursor,
+                                  coin=coin)
+
+
+async def get_all_inter_transfers_async(api_key, api_secret, coin=None,
+                                        start_time=None, end_time=None, max_concurrency=None):
+    """Асинхронное получение всех внутренних переводов с пагинацией и разбивкой на периоды по 30 дней"""
+    return await fetch_all_async("inter_transfers", api_key, api_secret, start_time, end_time,
+                                 max_concurrency=max_concurrency, coin=coin)
+
+
+async def get_all_inter_transfers_single_period_async(api_key, api_secret, coin=None,
+                                                      start_time=None, end_time=None):
+    """Асинхронное получение всех внутренних переводов для одного периода (до 30 дней) с пагинацией"""
+    return await fetch_single_period_async("inter_transfers", api_key, api_secret, start_time, end_time,
+                                           coin=coin)
+
+
+def aiter_inter_transfer_pages(api_key, api_secret, coin=None,
+                               start_time=None, end_time=None):
+    """Асинхронный генератор страниц внутренних переводов за диапазон"""
+    return aiter_pages("inter_transfers", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+async def get_inter_transfers_today_async(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за текущий день по UTC (асинхронно)"""
+    return await fetch_for_period_async("inter_transfers", "today", api_key, api_secret, coin=coin)
+
+
+async def get_inter_transfers_yesterday_async(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за прошлый день по UTC (асинхронно)"""
+    return await fetch_for_period_async("inter_transfers", "yesterday", api_key, api_secret, coin=coin)
+
+
+async def get_inter_transfers_current_month_async(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за текущий месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("inter_transfers", "current_month", api_key, api_secret, coin=coin)
+
+
+async def get_inter_transfers_previous_month_async(api_key, api_secret, coin=None):
+    """Получить внутренние переводы за прошлый месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("inter_transfers", "previous_month", api_key, api_secret, coin=coin)
+
+
+# ============================================================================
+# Функции для работы с внешними переводами /v5/asset/transfer/query-universal-transfer-list
+# ============================================================================
+
+def get_universal_transfer_list(api_key, api_secret, coin=None,
+                                start_time=None, end_time=None, limit=50, cursor=None):
+    """Получение одной страницы универсальных (внешних) переводов"""
+    return fetch_page("universal_transfers", api_key, api_secret, start_time, end_time, limit, cursor,
+                      coin=coin)
+
+
+def get_all_universal_transfers(api_key, api_secret, coin=None,
+                                start_time=None, end_time=None, max_workers=1):
+    """Получение всех универсальных переводов с пагинацией и разбивкой на периоды по 30 дней"""
+    return fetch_all("universal_transfers", api_key, api_secret, start_time, end_time, max_workers=max_workers,
+                     coin=coin)
+
+
+def get_all_universal_transfers_single_period(api_key, api_secret, coin=None,
+                                              start_time=None, end_time=None):
+    """Получение всех универсальных переводов для одного периода (до 30 дней) с пагинацией"""
+    return fetch_single_period("universal_transfers", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+def iter_universal_transfer_pages(api_key, api_secret, coin=None,
+                                  start_time=None, end_time=None):
+    """Генератор страниц универсальных переводов за диапазон (по одной странице в памяти)"""
+    return iter_pages("universal_transfers", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+def get_universal_transfers_today(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за текущий день по UTC"""
+    return fetch_for_period("universal_transfers", "today", api_key, api_secret, coin=coin)
+
+
+def get_universal_transfers_yesterday(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за прошлый день по UTC"""
+    return fetch_for_period("universal_transfers", "yesterday", api_key, api_secret, coin=coin)
+
+
+def get_universal_transfers_current_month(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за текущий месяц по UTC"""
+    return fetch_for_period("universal_transfers", "current_month", api_key, api_secret, coin=coin)
+
+
+def get_universal_transfers_previous_month(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за прошлый месяц по UTC"""
+    return fetch_for_period("universal_transfers", "previous_month", api_key, api_secret, coin=coin)
+
+
+async def get_universal_transfer_list_async(api_key, api_secret, coin=None,
+                                            start_time=None, end_time=None, limit=50, cursor=None):
+    """Асинхронное получение одной страницы универсальных (внешних) переводов"""
+    return await fetch_page_async("universal_transfers", api_key, api_secret, start_time, end_time, limit, cursor,
+                                  coin=coin)
+
+
+async def get_all_universal_transfers_async(api_key, api_secret, coin=None,
+                                            start_time=None, end_time=None, max_concurrency=None):
+    """Асинхронное получение всех универсальных переводов с пагинацией и разбивкой на периоды по 30 дней"""
+    return await fetch_all_async("universal_transfers", api_key, api_secret, start_time, end_time,
+                                 max_concurrency=max_concurrency, coin=coin)
+
+
+async def get_all_universal_transfers_single_period_async(api_key, api_secret, coin=None,
+                                                          start_time=None, end_time=None):
+    """Асинхронное получение всех универсальных переводов для одного периода (до 30 дней) с пагинацией"""
+    return await fetch_single_period_async("universal_transfers", api_key, api_secret, start_time, end_time,
+                                           coin=coin)
+
+
+def aiter_universal_transfer_pages(api_key, api_secret, coin=None,
                                    start_time=None, end_time=None):
-    """Получение всех записей о выводах для одного периода (до 30 дней) с пагинацией"""
-    all_data = []
-    cursor = None
-    page = 1
+    """Асинхронный генератор страниц универсальных переводов за диапазон"""
+    return aiter_pages("universal_transfers", api_key, api_secret, start_time, end_time, coin=coin)
 
-    while True:
-        print(f"  Загрузка страницы {page}...")
 
-        result = get_withdraw_record(
-            api_key, api_secret, coin, withdraw_type,
-            start_time, end_time, limit=50, cursor=cursor
-        )
+async def get_universal_transfers_today_async(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за текущий день по UTC (асинхронно)"""
+    return await fetch_for_period_async("universal_transfers", "today", api_key, api_secret, coin=coin)
 
-        if not result:
-            break
 
-        data_list = result.get("rows", [])  # Для withdraw используется "rows", а не "list"
+async def get_universal_transfers_yesterday_async(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за прошлый день по UTC (асинхронно)"""
+    return await fetch_for_period_async("universal_transfers", "yesterday", api_key, api_secret, coin=coin)
 
-        if not data_list:
-            break
 
-        all_data.extend(data_list)
-        print(f"  Получено записей: {len(data_list)}")
+async def get_universal_transfers_current_month_async(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за текущий месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("universal_transfers", "current_month", api_key, api_secret,
+                                        coin=coin)
 
-        # Проверка наличия следующей страницы
-        next_cursor = result.get("nextPageCursor")
-        if not next_cursor:
-            break
 
-        cursor = next_cursor
-        page += 1
+async def get_universal_transfers_previous_month_async(api_key, api_secret, coin=None):
+    """Получить универсальные переводы за прошлый месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("universal_transfers", "previous_month", api_key, api_secret,
+                                        coin=coin)
 
-        # Небольшая задержка между запросами
-        time.sleep(0.2)
 
-    print(f"  Всего записей за период: {len(all_data)}")
-    return all_data
+# ============================================================================
+# Функции для работы с выводами средств /v5/asset/withdraw/query-record
+# ============================================================================
+
+def get_withdraw_record(api_key, api_secret, coin=None, withdraw_type=None,
+                        start_time=None, end_time=None, limit=50, cursor=None):
+    """Получение одной страницы записей о выводах"""
+    return fetch_page("withdraws", api_key, api_secret, start_time, end_time, limit, cursor,
+                      coin=coin, withdraw_type=withdraw_type)
+
+
+def get_all_withdraws(api_key, api_secret, coin=None, withdraw_type=None,
+                      start_time=None, end_time=None, max_workers=1):
+    """Получение всех записей о выводах с пагинацией и разбивкой на периоды по 30 дней"""
+    return fetch_all("withdraws", api_key, api_secret, start_time, end_time, max_workers=max_workers,
+                     coin=coin, withdraw_type=withdraw_type)
+
+
+def get_all_withdraws_single_period(api_key, api_secret, coin=None, withdraw_type=None,
+                                    start_time=None, end_time=None):
+    """Получение всех записей о выводах для одного периода (до 30 дней) с пагинацией"""
+    return fetch_single_period("withdraws", api_key, api_secret, start_time, end_time,
+                               coin=coin, withdraw_type=withdraw_type)
+
+
+def iter_withdraw_pages(api_key, api_secret, coin=None, withdraw_type=None,
+                        start_time=None, end_time=None):
+    """Генератор страниц записей о выводах за диапазон (по одной странице в памяти)"""
+    return iter_pages("withdraws", api_key, api_secret, start_time, end_time, coin=coin, withdraw_type=withdraw_type)
 
 
 def get_withdraws_today(api_key, api_secret, coin=None, withdraw_type=None):
     """Получить записи о выводах за текущий день по UTC"""
-    start_ms, end_ms = get_current_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_withdraws(api_key, api_secret, coin, withdraw_type, start_ms, end_ms)
+    return fetch_for_period("withdraws", "today", api_key, api_secret, coin=coin, withdraw_type=withdraw_type)
 
 
 def get_withdraws_yesterday(api_key, api_secret, coin=None, withdraw_type=None):
     """Получить записи о выводах за прошлый день по UTC"""
-    start_ms, end_ms = get_previous_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_withdraws(api_key, api_secret, coin, withdraw_type, start_ms, end_ms)
+    return fetch_for_period("withdraws", "yesterday", api_key, api_secret,
+                            coin=coin, withdraw_type=withdraw_type)
 
 
 def get_withdraws_current_month(api_key, api_secret, coin=None, withdraw_type=None):
     """Получить записи о выводах за текущий месяц по UTC"""
-    start_ms, end_ms = get_current_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_withdraws(api_key, api_secret, coin, withdraw_type, start_ms, end_ms)
+    return fetch_for_period("withdraws", "current_month", api_key, api_secret,
+                            coin=coin, withdraw_type=withdraw_type)
 
 
 def get_withdraws_previous_month(api_key, api_secret, coin=None, withdraw_type=None):
     """Получить записи о выводах за прошлый месяц по UTC"""
-    start_ms, end_ms = get_previous_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_withdraws(api_key, api_secret, coin, withdraw_type, start_ms, end_ms)
-
+    return fetch_for_period("withdraws", "previous_month", api_key, api_secret,
+                            coin=coin, withdraw_type=withdraw_type)
 
-# ============================================================================
-# Функции для работы с депозитами средств /v5/asset/deposit/query-record
-# ============================================================================
 
-def get_deposit_record(api_key, api_secret, coin=None,
-                       start_time=None, end_time=None, limit=50, cursor=None):
-    """Получение одной страницы записей о депозитах"""
-    endpoint = "/v5/asset/deposit/query-record"
-    params = {
-        "limit": min(limit, 50)  # Максимум 50 для этого эндпоинта
-    }
+async def get_withdraw_record_async(api_key, api_secret, coin=None, withdraw_type=None,
+                                    start_time=None, end_time=None, limit=50, cursor=None):
+    """Асинхронное получение одной страницы записей о выводах"""
+    return await fetch_page_async("withdraws", api_key, api_secret, start_time, end_time, limit, cursor,
+                                  coin=coin, withdraw_type=withdraw_type)
 
-    if coin:
-        params["coin"] = coin
-    if start_time:
-        params["startTime"] = start_time
-    if end_time:
-        params["endTime"] = end_time
-    if cursor:
-        params["cursor"] = cursor
 
-    response = send_request(api_key, api_secret, endpoint, params)
+async def get_all_withdraws_async(api_key, api_secret, coin=None, withdraw_type=None,
+                                  start_time=None, end_time=None, max_concurrency=None):
+    """Асинхронное получение всех записей о выводах с пагинацией и разбивкой на периоды по 30 дней"""
+    return await fetch_all_async("withdraws", api_key, api_secret, start_time, end_time,
+                                 max_concurrency=max_concurrency, coin=coin, withdraw_type=withdraw_type)
 
-    if response and response.get("retCode") == 0:
-        return response.get("result", {})
-    else:
-        print(f"Ошибка API: {response}")
-        return {}
-
-
-def get_all_deposits(api_key, api_secret, coin=None,
-                    start_time=None, end_time=None):
-    """Получение всех записей о депозитах с пагинацией и разбивкой на периоды по 30 дней"""
 
-    # Если указаны временные рамки, проверяем их размер
-    if start_time and end_time:
-        # Максимальный диапазон - 30 дней в миллисекундах
-        max_range_ms = 30 * 24 * 60 * 60 * 1000
-        time_diff = end_time - start_time
+async def get_all_withdraws_single_period_async(api_key, api_secret, coin=None, withdraw_type=None,
+                                                start_time=None, end_time=None):
+    """Асинхронное получение всех записей о выводах для одного периода (до 30 дней) с пагинацией"""
+    return await fetch_single_period_async("withdraws", api_key, api_secret, start_time, end_time,
+                                           coin=coin, withdraw_type=withdraw_type)
 
-        # Если диапазон больше 30 дней, разбиваем на куски
-        if time_diff > max_range_ms:
-            print(f"Диапазон превышает 30 дней, разбиваем на периоды...")
-            all_data = []
-            current_start = start_time
 
-            while current_start < end_time:
-                current_end = min(current_start + max_range_ms, end_time)
+def aiter_withdraw_pages(api_key, api_secret, coin=None, withdraw_type=None,
+                         start_time=None, end_time=None):
+    """Асинхронный генератор страниц записей о выводах за диапазон"""
+    return aiter_pages("withdraws", api_key, api_secret, start_time, end_time, coin=coin, withdraw_type=withdraw_type)
 
-                print(
-                    f"\nЗагрузка периода: {datetime.fromtimestamp(current_start / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(current_end / 1000, tz=timezone.utc)}")
 
-                period_data = get_all_deposits_single_period(
-                    api_key, api_secret, coin, current_start, current_end
-                )
+async def get_withdraws_today_async(api_key, api_secret, coin=None, withdraw_type=None):
+    """Получить записи о выводах за текущий день по UTC (асинхронно)"""
+    return await fetch_for_period_async("withdraws", "today", api_key, api_secret,
+                                        coin=coin, withdraw_type=withdraw_type)
 
-                all_data.extend(period_data)
-                current_start = current_end + 1  # Переходим к следующему периоду
 
-                # Задержка между периодами
-                time.sleep(0.3)
+async def get_withdraws_yesterday_async(api_key, api_secret, coin=None, withdraw_type=None):
+    """Получить записи о выводах за прошлый день по UTC (асинхронно)"""
+    return await fetch_for_period_async("withdraws", "yesterday", api_key, api_secret,
+                                        coin=coin, withdraw_type=withdraw_type)
 
-            print(f"\nВсего загружено записей за весь период: {len(all_data)}")
-            return all_data
 
-    # Если диапазон 30 дней или меньше (или не указан), используем обычную загрузку
-    return get_all_deposits_single_period(api_key, api_secret, coin, start_time, end_time)
+async def get_withdraws_current_month_async(api_key, api_secret, coin=None, withdraw_type=None):
+    """Получить записи о выводах за текущий месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("withdraws", "current_month", api_key, api_secret,
+                                        coin=coin, withdraw_type=withdraw_type)
 
 
-def get_all_deposits_single_period(api_key, api_secret, coin=None,
-                                  start_time=None, end_time=None):
-    """Получение всех записей о депозитах для одного периода (до 30 дней) с пагинацией"""
-    all_data = []
-    cursor = None
-    page = 1
-
-    while True:
-        print(f"  Загрузка страницы {page}...")
+async def get_withdraws_previous_month_async(api_key, api_secret, coin=None, withdraw_type=None):
+    """Получить записи о выводах за прошлый месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("withdraws", "previous_month", api_key, api_secret,
+                                        coin=coin, withdraw_type=withdraw_type)
 
-        result = get_deposit_record(
-            api_key, api_secret, coin,
-            start_time, end_time, limit=50, cursor=cursor
-        )
 
-        if not result:
-            break
+# ============================================================================
+# Функции для работы с депозитами средств /v5/asset/deposit/query-record
+# ============================================================================
 
-        data_list = result.get("rows", [])  # Для deposit используется "rows", а не "list"
+def get_deposit_record(api_key, api_secret, coin=None,
+                       start_time=None, end_time=None, limit=50, cursor=None):
+    """Получение одной страницы записей о депозитах"""
+    return fetch_page("deposits", api_key, api_secret, start_time, end_time, limit, cursor,
+                      coin=coin)
 
-        if not data_list:
-            break
 
-        all_data.extend(data_list)
-        print(f"  Получено записей: {len(data_list)}")
+def get_all_deposits(api_key, api_secret, coin=None,
+                     start_time=None, end_time=None, max_workers=1):
+    """Получение всех записей о депозитах с пагинацией и разбивкой на периоды по 30 дней"""
+    return fetch_all("deposits", api_key, api_secret, start_time, end_time, max_workers=max_workers,
+                     coin=coin)
 
-        # Проверка наличия следующей страницы
-        next_cursor = result.get("nextPageCursor")
-        if not next_cursor:
-            break
 
-        cursor = next_cursor
-        page += 1
+def get_all_deposits_single_period(api_key, api_secret, coin=None,
+                                   start_time=None, end_time=None):
+    """Получение всех записей о депозитах для одного периода (до 30 дней) с пагинацией"""
+    return fetch_single_period("deposits", api_key, api_secret, start_time, end_time, coin=coin)
 
-        # Небольшая задержка между запросами
-        time.sleep(0.2)
 
-    print(f"  Всего записей за период: {len(all_data)}")
-    return all_data
+def iter_deposit_pages(api_key, api_secret, coin=None,
+                       start_time=None, end_time=None):
+    """Генератор страниц записей о депозитах за диапазон (по одной странице в памяти)"""
+    return iter_pages("deposits", api_key, api_secret, start_time, end_time, coin=coin)
 
 
 def get_deposits_today(api_key, api_secret, coin=None):
     """Получить записи о депозитах за текущий день по UTC"""
-    start_ms, end_ms = get_current_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_deposits(api_key, api_secret, coin, start_ms, end_ms)
+    return fetch_for_period("deposits", "today", api_key, api_secret, coin=coin)
 
 
 def get_deposits_yesterday(api_key, api_secret, coin=None):
     """Получить записи о депозитах за прошлый день по UTC"""
-    start_ms, end_ms = get_previous_day_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_deposits(api_key, api_secret, coin, start_ms, end_ms)
+    return fetch_for_period("deposits", "yesterday", api_key, api_secret, coin=coin)
 
 
 def get_deposits_current_month(api_key, api_secret, coin=None):
     """Получить записи о депозитах за текущий месяц по UTC"""
-    start_ms, end_ms = get_current_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_deposits(api_key, api_secret, coin, start_ms, end_ms)
+    return fetch_for_period("deposits", "current_month", api_key, api_secret, coin=coin)
 
 
 def get_deposits_previous_month(api_key, api_secret, coin=None):
     """Получить записи о депозитах за прошлый месяц по UTC"""
-    start_ms, end_ms = get_previous_month_utc()
-    print(
-        f"Период: {datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc)} - {datetime.fromtimestamp(end_ms / 1000, tz=timezone.utc)}")
-    return get_all_deposits(api_key, api_secret, coin, start_ms, end_ms)
+    return fetch_for_period("deposits", "previous_month", api_key, api_secret, coin=coin)
+
+
+async def get_deposit_record_async(api_key, api_secret, coin=None,
+                                   start_time=None, end_time=None, limit=50, cursor=None):
+    """Асинхронное получение одной страницы записей о депозитах"""
+    return await fetch_page_async("deposits", api_key, api_secret, start_time, end_time, limit, cursor,
+                                  coin=coin)
+
+
+async def get_all_deposits_async(api_key, api_secret, coin=None,
+                                 start_time=None, end_time=None, max_concurrency=None):
+    """Асинхронное получение всех записей о депозитах с пагинацией и разбивкой на периоды по 30 дней"""
+    return await fetch_all_async("deposits", api_key, api_secret, start_time, end_time,
+                                 max_concurrency=max_concurrency, coin=coin)
+
+
+async def get_all_deposits_single_period_async(api_key, api_secret, coin=None,
+                                               start_time=None, end_time=None):
+    """Асинхронное получение всех записей о депозитах для одного периода (до 30 дней) с пагинацией"""
+    return await fetch_single_period_async("deposits", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+def aiter_deposit_pages(api_key, api_secret, coin=None,
+                        start_time=None, end_time=None):
+    """Асинхронный генератор страниц записей о депозитах за диапазон"""
+    return aiter_pages("deposits", api_key, api_secret, start_time, end_time, coin=coin)
+
+
+async def get_deposits_today_async(api_key, api_secret, coin=None):
+    """Получить записи о депозитах за текущий день по UTC (асинхронно)"""
+    return await fetch_for_period_async("deposits", "today", api_key, api_secret, coin=coin)
+
+
+async def get_deposits_yesterday_async(api_key, api_secret, coin=None):
+    """Получить записи о депозитах за прошлый день по UTC (асинхронно)"""
+    return await fetch_for_period_async("deposits", "yesterday", api_key, api_secret, coin=coin)
+
+
+async def get_deposits_current_month_async(api_key, api_secret, coin=None):
+    """Получить записи о депозитах за текущий месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("deposits", "current_month", api_key, api_secret, coin=coin)
+
 
+async def get_deposits_previous_month_async(api_key, api_secret, coin=None):
+    """Получить записи о депозитах за прошлый месяц по UTC (асинхронно)"""
+    return await fetch_for_period_async("deposits", "previous_month", api_key, api_secret, coin=coin)
 
 # ============================================================================
 # Функции для работы с информацией об API ключе /v5/user/query-api
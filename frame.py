@@ -0,0 +1,231 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from functools import reduce
+from itertools import accumulate, compress
+from operator import add
+
+try:
+    import numpy as np
+except ImportError:
+    # Без numpy сортировка и накопительные суммы считаются циклами Python
+    np = None
+
+
+def to_datetime(timestamp_ms):
+    """Время в миллисекундах -> datetime UTC (0 - время неизвестно, None)"""
+    if not timestamp_ms:
+        return None
+    return datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+
+
+def _encode(values):
+    """Словарное кодирование: (уникальные значения в порядке появления, array кодов)"""
+    index = {}
+    codes = array('I', [index.setdefault(value, len(index)) for value in values])
+    return list(index), codes
+
+
+def _take(column, order):
+    """Строки колонки в порядке order"""
+    if np is not None and isinstance(order, np.ndarray):
+        taken = array(column.typecode)
+        taken.frombytes(np.frombuffer(column, dtype=column.typecode)[order].tobytes())
+        return taken
+    return array(column.typecode, map(column.__getitem__, order))
+
+
+class TradeFrame:
+    """Сделки по колонкам (struct of arrays) вместо списка словарей на каждую запись
+
+    Время хранится в int64 миллисекундах UTC, числа - в float64, символ и строковые
+    поля (side, execType...) - кодами в словаре уникальных значений. Запись занимает
+    десятки байт вместо сотен, а datetime создаются только для того, что показывается.
+
+    Attributes:
+        symbols: словарь символов (код -> имя) в порядке первого появления
+        codes: array('I') - код символа каждой строки
+        times: array('q') - время строки, мс
+        columns: {имя: array('d')} - числовые колонки
+        tags: {имя: (словарь значений, array('I') кодов)} - строковые колонки
+        order: None, 'time' (строки по времени) или 'symbol' (по символу, внутри - по времени)
+    """
+
+    def __init__(self, symbols, codes, times, columns, tags=None, order=None):
+        self.symbols = symbols
+        self.codes = codes
+        self.times = times
+        self.columns = columns
+        self.tags = tags or {}
+        self.order = order
+
+    @classmethod
+    def from_records(cls, records, time_field, values, tags=None, symbol_field='symbol', default_symbol='UNKNOWN'):
+        """Разбирает записи Bybit (строки-числа или уже числа из кеша) в колонки
+
+        Args:
+            records: список записей или итератор
+            time_field: поле времени в миллисекундах (updatedTime, execTime...)
+            values: {колонка: (поле, ...)} - числовые колонки, значение - сумма полей по порядку
+            tags: {колонка: (поле, значение по умолчанию)} - строковые колонки
+        """
+        if not isinstance(records, list):
+            records = list(records)
+
+        symbols, codes = _encode([record.get(symbol_field, default_symbol) for record in records])
+        times = array('q', map(int, [record.get(time_field, '0') for record in records]))
+
+        columns = {}
+        for name, fields in values.items():
+            column = array('d', map(float, [record.get(fields[0], '0') for record in records]))
+            for field in fields[1:]:
+                column = array('d', map(add, column, map(float, [record.get(field, '0') for record in records])))
+            columns[name] = column
+
+        tag_columns = {
+            name: _encode([record.get(field, default) for record in records])
+            for name, (field, default) in (tags or {}).items()
+        }
+        return cls(symbols, codes, times, columns, tag_columns)
+
+    @classmethod
+    def concat(cls, frames):
+        """Склеивает кадры с одинаковыми колонками (например, разобранные по страницам)"""
+        first = frames[0]
+        symbol_index = {}
+        codes = array('I')
+        times = array('q')
+        columns = {name: array('d') for name in first.columns}
+        tag_index = {name: {} for name in first.tags}
+        tag_codes = {name: array('I') for name in first.tags}
+
+        for frame in frames:
+            remap = [symbol_index.setdefault(symbol, len(symbol_index)) for symbol in frame.symbols]
+            codes.extend(map(remap.__getitem__, frame.codes))
+            times.extend(frame.times)
+            for name, column in columns.items():
+                column.extend(frame.columns[name])
+            for name, (dictionary, values) in frame.tags.items():
+                index = tag_index[name]
+                remap = [index.setdefault(value, len(index)) for value in dictionary]
+                tag_codes[name].extend(map(remap.__getitem__, values))
+
+        tags = {name: (list(tag_index[name]), tag_codes[name]) for name in tag_codes}
+        return cls(list(symbol_index), codes, times, columns, tags)
+
+    def __len__(self):
+        return len(self.times)
+
+    def _derive(self, transform, order):
+        """Новый кадр с теми же словарями, колонки которого - transform(колонка)"""
+        return TradeFrame(
+            self.symbols,
+            transform(self.codes),
+            transform(self.times),
+            {name: transform(column) for name, column in self.columns.items()},
+            {name: (dictionary, transform(values)) for name, (dictionary, values) in self.tags.items()},
+            order
+        )
+
+    def take(self, rows, order=None):
+        """Кадр из строк rows (индексы) в заданном порядке"""
+        return self._derive(lambda column: _take(column, rows), order)
+
+    def _slice(self, start, end, order):
+        return self._derive(lambda column: column[start:end], order)
+
+    def _filter(self, mask):
+        mask = list(mask)
+        return self._derive(lambda column: array(column.typecode, compress(column, mask)), self.order)
+
+    def sort(self):
+        """Кадр, отсортированный по символу (в порядке появления), внутри символа - по времени
+
+        Сортировка стабильная: строки с одинаковым временем сохраняют исходный порядок.
+        """
+        if self.order == 'symbol':
+            return self
+        if np is not None:
+            rows = np.lexsort((np.frombuffer(self.times, dtype=np.int64), np.frombuffer(self.codes, dtype=np.uint32)))
+        else:
+            rows = sorted(range(len(self)), key=lambda i: (self.codes[i], self.times[i]))
+        return self.take(rows, 'symbol')
+
+    def by_time(self):
+        """Кадр, отсортированный по времени (стабильно)"""
+        if self.order == 'time':
+            return self
+        if np is not None:
+            rows = np.argsort(np.frombuffer(self.times, dtype=np.int64), kind='stable')
+        else:
+            rows = sorted(range(len(self)), key=self.times.__getitem__)
+        return self.take(rows, 'time')
+
+    def groups(self):
+        """(символ, кадр символа по времени) для каждого символа в порядке первого появления"""
+        frame = self.sort()
+        for code, symbol in enumerate(frame.symbols):
+            start, end = bisect_left(frame.codes, code), bisect_right(frame.codes, code)
+            if start < end:
+                yield symbol, frame._slice(start, end, 'time')
+
+    def symbol(self, name):
+        """Строки символа name по времени (пустой кадр, если символа нет)
+
+        Несортированный кадр сортируется при каждом вызове - для выборки нескольких
+        символов сортируйте один раз (sort()) или используйте groups().
+        """
+        frame = self.sort()
+        try:
+            code = frame.symbols.index(name)
+        except ValueError:
+            return frame._slice(0, 0, 'time')
+        return frame._slice(bisect_left(frame.codes, code), bisect_right(frame.codes, code), 'time')
+
+    def between(self, start_ms, end_ms):
+        """Строки со временем в [start_ms, end_ms]"""
+        if self.order == 'time':
+            return self._slice(bisect_left(self.times, start_ms), bisect_right(self.times, end_ms), 'time')
+        return self._filter(start_ms <= timestamp_ms <= end_ms for timestamp_ms in self.times)
+
+    def where(self, tag, predicate):
+        """Строки, у которых значение строковой колонки tag удовлетворяет predicate"""
+        dictionary, values = self.tags[tag]
+        wanted = {code for code, value in enumerate(dictionary) if predicate(value)}
+        return self._filter(map(wanted.__contains__, values))
+
+    def total(self, name):
+        """Сумма колонки (последовательно, как накопительный итог)"""
+        return reduce(add, self.columns[name], 0)
+
+    def cumsum(self, name):
+        """Накопительный итог колонки списком float"""
+        if np is not None:
+            return np.cumsum(np.frombuffer(self.columns[name], dtype=np.float64)).tolist()
+        return list(accumulate(self.columns[name]))
+
+    def time_at(self, row):
+        """Время строки row как datetime"""
+        return to_datetime(self.times[row])
+
+    def time_range(self):
+        """(первое, последнее) известное время как datetime или (None, None)"""
+        known = [timestamp_ms for timestamp_ms in self.times if timestamp_ms]
+        if not known:
+            return None, None
+        return to_datetime(min(known)), to_datetime(max(known))
+
+    def rows(self):
+        """Строки словарями {'symbol', 'time', колонки...} - только для детального просмотра"""
+        names = list(self.columns)
+        tag_names = list(self.tags)
+        result = []
+        for row in range(len(self)):
+            record = {'symbol': self.symbols[self.codes[row]], 'time': self.time_at(row)}
+            for name in names:
+                record[name] = self.columns[name][row]
+            for name in tag_names:
+                dictionary, values = self.tags[name]
+                record[name] = dictionary[values[row]]
+            result.append(record)
+        return result
@@ -0,0 +1,178 @@
+import asyncio
+import time
+import exchange
+import store
+from singleflight import flights, flight_key
+from utils import CLOSED_PERIOD_DELAY, cache_lock, cache_lock_async, run_in_cache_pool
+
+
+# Насколько раньше конца загруженного интервала начинаем догрузку: запись с той же
+# миллисекундой или попавшая в выдачу биржи с задержкой не потеряется, дубли отсеются по id
+SYNC_OVERLAP_MS = 5 * 60 * 1000
+
+
+def plan_gaps(coverage, start_ms, end_ms):
+    """Делит [start_ms, end_ms] на загруженные и недостающие части
+
+    Args:
+        coverage: загруженные интервалы, отсортированный список (start_ms, end_ms)
+
+    Returns:
+        list: недостающие интервалы [(gap_start, gap_end, after)], где after -
+              загруженный интервал, сразу за которым начинается пропуск (или None)
+    """
+    gaps = []
+    cursor = start_ms
+    after = None
+
+    for covered_start, covered_end in coverage:
+        if covered_end < cursor:
+            continue
+        if covered_start > end_ms:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, covered_start - 1, after))
+        cursor = covered_end + 1
+        after = (covered_start, covered_end)
+        if cursor > end_ms:
+            return gaps
+
+    gaps.append((cursor, end_ms, after))
+    return gaps
+
+
+def _gap_fetch_from(name, account, category, gap_start, after):
+    """С какого момента грузить пропуск
+
+    Пропуск сразу за загруженным интервалом начинаем чуть раньше последней
+    записи этого интервала (high-water mark) - так догрузка "текущего месяца"
+    стоит одну-две страницы, а запоздавшие записи не теряются.
+    """
+    if after is None:
+        return gap_start
+
+    covered_start, covered_end = after
+    mark = store.latest_time(name, account, category, covered_start, covered_end)
+    mark = covered_end if mark is None else min(mark, covered_end)
+    return min(gap_start, max(covered_start, mark - SYNC_OVERLAP_MS))
+
+
+def _save_gap(name, account, category, records, fetch_from, gap_end):
+    """Записывает загруженный пропуск и отмечает его в карте покрытия"""
+    # Будущее не считается загруженным: "сегодня" заканчивается в 23:59, а синхронизировали сейчас
+    now_ms = int(time.time() * 1000)
+    loaded_end = min(gap_end, now_ms)
+
+    # Запись без времени пришла в ответ на запрос за [fetch_from, gap_end] - кладем ее
+    # в конец загруженной части, чтобы выборки этого периода ее видели
+    store.save_records(name, account, category, records, default_time=max(fetch_from, loaded_end))
+
+    # Последние CLOSED_PERIOD_DELAY секунд биржа еще дописывает поздние исполнения -
+    # покрытыми они не отмечаются, и следующая синхронизация загрузит их заново
+    covered_end = min(loaded_end, now_ms - CLOSED_PERIOD_DELAY * 1000)
+    if covered_end >= fetch_from:
+        store.add_coverage(name, account, category, fetch_from, covered_end)
+
+
+def _lock_key(name, account, category):
+    return f"sync_{account}_{name}_{category}"
+
+
+def _print_gaps(name, gaps, start_ms, end_ms):
+    if gaps:
+        print(f"Синхронизация {name} [{start_ms}, {end_ms}]: догружаем пропуски {[gap[:2] for gap in gaps]}")
+
+
+def sync_range(name, api_key, api_secret, start_ms, end_ms, **filters):
+    """Возвращает записи эндпоинта name за [start_ms, end_ms], догружая с биржи только пропуски
+
+    Записи хранятся в локальной базе (store), там же по каждому аккаунту,
+    эндпоинту и набору фильтров - карта покрытия: какие интервалы уже
+    загружены полностью. Запрос делится на загруженные и недостающие части,
+    с биржи запрашиваются только пропуски, ответ собирается из базы.
+    Одновременные одинаковые вызовы внутри процесса объединяются (singleflight).
+    """
+    return flights.do(
+        "sync_range", flight_key(name, api_key, start_ms, end_ms, filters),
+        lambda: _sync_range(name, api_key, api_secret, start_ms, end_ms, **filters)
+    )
+
+
+def _sync_range(name, api_key, api_secret, start_ms, end_ms, **filters):
+    account, category = _fill_gaps(name, api_key, api_secret, start_ms, end_ms, filters)
+    return store.query_records(name, account, category, start_ms, end_ms)
+
+
+def _fill_gaps(name, api_key, api_secret, start_ms, end_ms, filters):
+    """Догружает в базу недостающие части [start_ms, end_ms]
+
+    Returns:
+        tuple: (account, category) - под ними источник хранится в базе
+    """
+    account = store.account_hash(api_key)
+    category = store.filters_key(filters)
+
+    # Пропуски считаются под блокировкой источника: воркер, пришедший вторым,
+    # дождется первого и увидит уже загруженные им интервалы
+    with cache_lock(_lock_key(name, account, category)):
+        gaps = plan_gaps(store.get_coverage(name, account, category), start_ms, end_ms)
+        _print_gaps(name, gaps, start_ms, end_ms)
+
+        for gap_start, gap_end, after in gaps:
+            fetch_from = _gap_fetch_from(name, account, category, gap_start, after)
+            records = exchange.fetch_all(name, api_key, api_secret, fetch_from, gap_end, **filters)
+            _save_gap(name, account, category, records, fetch_from, gap_end)
+
+    return account, category
+
+
+async def sync_range_async(name, api_key, api_secret, start_ms, end_ms, **filters):
+    """Асинхронный вариант sync_range: пропуски загружаются одновременно"""
+    return await flights.do_async(
+        "sync_range", flight_key(name, api_key, start_ms, end_ms, filters),
+        lambda: _sync_range_async(name, api_key, api_secret, start_ms, end_ms, **filters)
+    )
+
+
+async def _sync_range_async(name, api_key, api_secret, start_ms, end_ms, **filters):
+    account, category = await _fill_gaps_async(name, api_key, api_secret, start_ms, end_ms, filters)
+    return await run_in_cache_pool(store.query_records, name, account, category, start_ms, end_ms)
+
+
+async def _fill_gaps_async(name, api_key, api_secret, start_ms, end_ms, filters):
+    """Асинхронный _fill_gaps: пропуски загружаются одновременно
+
+    Чтение и запись базы (sqlite3 блокирует поток) идут в пуле потоков кеша,
+    а не в цикле событий.
+    """
+    account = store.account_hash(api_key)
+    category = store.filters_key(filters)
+
+    async def fill(gap_start, gap_end, after):
+        fetch_from = await run_in_cache_pool(_gap_fetch_from, name, account, category, gap_start, after)
+        records = await exchange.fetch_all_async(name, api_key, api_secret, fetch_from, gap_end, **filters)
+        await run_in_cache_pool(_save_gap, name, account, category, records, fetch_from, gap_end)
+
+    async with cache_lock_async(_lock_key(name, account, category)):
+        coverage = await run_in_cache_pool(store.get_coverage, name, account, category)
+        gaps = plan_gaps(coverage, start_ms, end_ms)
+        _print_gaps(name, gaps, start_ms, end_ms)
+        results = await asyncio.gather(*(fill(*gap) for gap in gaps), return_exceptions=True)
+
+    # Успешно загруженные пропуски уже в базе; ошибку отдаем после того, как отработали все
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    return account, category
+
+
+async def query_rollups_async(name, api_key, start_ms, end_ms, **filters):
+    """Итоги источника по дням и символам (store.query_rollups) за [start_ms, end_ms] без догрузки с биржи
+
+    Вызывается после sync_range_async за тот же период: записи уже в базе, а сводка
+    за месяц, квартал или год читается из нескольких сотен строк итогов вместо всех записей.
+    """
+    return await run_in_cache_pool(
+        store.query_rollups, name, store.account_hash(api_key), store.filters_key(filters), start_ms, end_ms
+    )
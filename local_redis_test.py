@@ -0,0 +1,164 @@
+import io
+import socket
+import threading
+import time
+import cache_backend
+from cache_backend import RedisBackend, RedisError, _read_reply
+
+
+# Проверка клиента RESP (cache_backend.RedisBackend) на локальной заглушке сервера Redis
+# Запуск: python local_redis_test.py [redis://хост:порт/база] - с адресом проверяется и настоящий сервер
+
+
+class StubRedis:
+    """Заглушка сервера Redis в потоке: GET, SET [EX], DEL, EXPIRE, AUTH, SELECT, PING
+
+    drop() обрывает открытые соединения, как перезапуск сервера; stop() закрывает порт.
+    """
+
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        self.commands = []
+        self._connections = []
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def url(self, db=0):
+        auth = f":{self.password}@" if self.password else ""
+        return f"redis://{auth}127.0.0.1:{self.port}/{db}"
+
+    def drop(self):
+        for conn in self._connections:
+            conn.shutdown(socket.SHUT_RDWR)
+            conn.close()
+        self._connections = []
+
+    def stop(self):
+        self.drop()
+        # shutdown будит поток, ждущий в accept, - иначе порт останется открытым
+        self._server.shutdown(socket.SHUT_RDWR)
+        self._server.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            self._connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = conn.makefile("rb")
+        authorized = self.password is None
+        try:
+            while True:
+                args = _read_reply(reader)
+                name = args[0].decode().upper()
+                self.commands.append(name)
+                if name == "AUTH":
+                    authorized = args[1].decode() == self.password
+                    conn.sendall(b"+OK\r\n" if authorized else b"-WRONGPASS invalid password\r\n")
+                elif not authorized:
+                    conn.sendall(b"-NOAUTH Authentication required\r\n")
+                elif name in ("PING", "SELECT"):
+                    conn.sendall(b"+OK\r\n")
+                elif name == "GET":
+                    value = self.data.get(args[1])
+                    conn.sendall(b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value))
+                elif name == "SET":
+                    self.data[args[1]] = args[2]
+                    conn.sendall(b"+OK\r\n")
+                elif name in ("DEL", "EXPIRE"):
+                    found = args[1] in self.data
+                    if name == "DEL":
+                        self.data.pop(args[1], None)
+                    conn.sendall(b":%d\r\n" % found)
+                else:
+                    conn.sendall(b"-ERR unknown command '%s'\r\n" % args[0])
+        except (OSError, TypeError, IndexError):
+            # Соединение оборвано (drop) или клиент закрыл его
+            pass
+
+
+def check_replies():
+    """Разбор всех видов ответов RESP и обрезанного ответа"""
+    assert _read_reply(io.BytesIO(b"+OK\r\n")) == "OK"
+    assert _read_reply(io.BytesIO(b":42\r\n")) == 42
+    assert _read_reply(io.BytesIO(b"$-1\r\n")) is None
+    assert _read_reply(io.BytesIO(b"*-1\r\n")) is None
+    assert _read_reply(io.BytesIO(b"$4\r\na\r\nb\r\n")) == b"a\r\nb"
+    assert _read_reply(io.BytesIO(b"*3\r\n:1\r\n$0\r\n\r\n*1\r\n+x\r\n")) == [1, b"", ["x"]]
+
+    error = _read_reply(io.BytesIO(b"-ERR boom\r\n"))
+    assert isinstance(error, RedisError) and str(error) == "ERR boom"
+
+    for truncated in (b"", b"+OK", b"$5\r\nab", b"*2\r\n:1\r\n"):
+        try:
+            _read_reply(io.BytesIO(truncated))
+        except ConnectionError:
+            continue
+        raise AssertionError(f"Обрезанный ответ {truncated!r} не распознан")
+    print("Ответы RESP: OK")
+
+
+def check_backend(backend):
+    """get/put/delete, свежесть по max_age, ответ-ошибка"""
+    raw = bytes(range(256)) * 4 + b"\r\n"
+    backend.delete("check")
+    assert backend.get("check") is None
+
+    backend.put("check", raw)
+    value, written_at = backend.get("check")
+    assert value == raw and abs(time.time() - written_at) < 5
+    time.sleep(0.05)
+    assert backend.get("check", max_age=0.01) == (None, written_at)
+
+    backend.delete("check")
+    assert backend.get("check") is None
+
+    # Ответ-ошибка возвращается, а не рвет соединение: следующая команда работает
+    replies = backend.execute(("NO_SUCH_COMMAND",), ("SET", backend.prefix + "check", b"1"))
+    assert isinstance(replies[0], RedisError) and replies[1] == "OK"
+    backend.delete("check")
+    print(f"Чтение и запись ({backend.describe('check')}): OK")
+
+
+def check_reconnect():
+    """Обрыв соединения - одно переподключение; сервер недоступен - ошибка наружу"""
+    server = StubRedis(password="secret")
+    backend = cache_backend.create_backend(server.url(db=3), "cache", ".pnlc", idle_ttl=60)
+    check_backend(backend)
+    assert server.commands[:2] == ["AUTH", "SELECT"]
+
+    server.drop()
+    backend.put("after_drop", b"x")
+    assert backend.get("after_drop")[0] == b"x"
+    assert server.commands.count("AUTH") == 2
+
+    wrong = RedisBackend(port=server.port, password="wrong")
+    try:
+        wrong.execute(("PING",))
+    except RedisError as e:
+        print(f"Неверный пароль: {e}")
+    else:
+        raise AssertionError("Неверный пароль не распознан")
+
+    server.stop()
+    try:
+        backend.get("after_drop")
+    except OSError as e:
+        print(f"Сервер недоступен: {type(e).__name__}")
+    else:
+        raise AssertionError("Недоступный сервер не распознан")
+    print("Переподключение: OK")
+
+
+if __name__ == "__main__":
+    import sys
+    check_replies()
+    check_reconnect()
+    if len(sys.argv) > 1:
+        check_backend(cache_backend.create_backend(sys.argv[1], "cache", ".pnlc"))
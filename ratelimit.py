@@ -0,0 +1,178 @@
+import asyncio
+import contextvars
+import hashlib
+import threading
+import time
+
+
+# Заголовки лимитов Bybit (https://bybit-exchange.github.io/docs/v5/rate-limit)
+LIMIT_HEADER = "X-Bapi-Limit"
+LIMIT_STATUS_HEADER = "X-Bapi-Limit-Status"
+LIMIT_RESET_HEADER = "X-Bapi-Limit-Reset-Timestamp"
+
+# Код ошибки Bybit "слишком много запросов"
+RATE_LIMIT_RET_CODE = 10006
+
+# Бюджет до первого ответа с заголовками: осторожно, дальше берем значения биржи
+DEFAULT_LIMIT = 5
+DEFAULT_WINDOW = 1.0
+
+# Сколько запросов держим в запасе, чтобы не упереться в 10006
+RESERVE = 1
+
+# Фоновые загрузки (прогрев кеша) помечаются low_priority и оставляют
+# интерактивным запросам эту долю бюджета окна
+LOW_PRIORITY_SHARE = 0.5
+low_priority = contextvars.ContextVar("ratelimit_low_priority", default=False)
+
+
+class TokenBucket:
+    """Бюджет запросов одной пары (API ключ, эндпоинт)
+
+    Емкость и остаток синхронизируются с заголовками X-Bapi-Limit*, между
+    ответами бюджет расходуется локально. Потокобезопасен, поэтому один
+    и тот же объект обслуживает и синхронный, и асинхронный клиент.
+    """
+
+    def __init__(self, capacity=DEFAULT_LIMIT, window=DEFAULT_WINDOW):
+        self.capacity = capacity
+        self.window = window
+        self.tokens = capacity
+        self.reset_at = time.monotonic() + window
+        self.synced = False
+        self._lock = threading.Lock()
+
+    def reserve(self, keep=RESERVE):
+        """Резервирует один запрос
+
+        Args:
+            keep: сколько запросов окна должно остаться нетронутыми
+
+        Returns:
+            float: 0 если запрос можно отправлять сразу, иначе сколько секунд подождать
+                   (в этом случае бюджет не расходуется, нужно вызвать reserve повторно)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self.reset_at:
+                # Окно сменилось - бюджет восстановлен
+                self.tokens = self.capacity
+                self.reset_at = now + self.window
+
+            if self.tokens > keep:
+                self.tokens -= 1
+                return 0.0
+
+            return max(self.reset_at - now, 0.001)
+
+    def update(self, limit=None, remaining=None, reset_in=None):
+        """Синхронизирует бюджет с ответом биржи
+
+        Args:
+            limit: лимит запросов на окно (X-Bapi-Limit)
+            remaining: остаток запросов в текущем окне (X-Bapi-Limit-Status)
+            reset_in: через сколько секунд окно сбросится (из X-Bapi-Limit-Reset-Timestamp)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if limit:
+                self.capacity = limit
+            if reset_in is not None:
+                reset_at = now + max(reset_in, 0)
+                if not self.synced or reset_at > self.reset_at + self.window / 2:
+                    # Первый ответ или биржа уже в новом окне - ее остаток точнее нашего
+                    self.synced = True
+                    self.reset_at = reset_at
+                    if remaining is not None:
+                        self.tokens = remaining
+                    return
+                self.reset_at = reset_at
+            if remaining is not None:
+                # Внутри окна верим меньшему значению: часть наших запросов еще в пути
+                self.tokens = min(self.tokens, remaining)
+
+    def exhaust(self, reset_in=None):
+        """Помечает бюджет исчерпанным (получен 10006)"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = 0
+            self.reset_at = now + (reset_in if reset_in and reset_in > 0 else self.window)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(api_key, endpoint):
+    """Возвращает бюджет для пары (API ключ, эндпоинт)"""
+    key = (hashlib.md5(api_key.encode()).hexdigest()[:8], endpoint)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.setdefault(key, TokenBucket())
+    return bucket
+
+
+def _keep(bucket):
+    """Запас бюджета для текущего контекста: фоновые загрузки не трогают долю интерактивных"""
+    if low_priority.get():
+        return max(RESERVE, int(bucket.capacity * LOW_PRIORITY_SHARE))
+    return RESERVE
+
+
+def acquire(api_key, endpoint):
+    """Блокирующее ожидание бюджета перед запросом"""
+    bucket = get_bucket(api_key, endpoint)
+    while True:
+        delay = bucket.reserve(_keep(bucket))
+        if not delay:
+            return
+        time.sleep(delay)
+
+
+async def acquire_async(api_key, endpoint):
+    """Асинхронное ожидание бюджета перед запросом"""
+    bucket = get_bucket(api_key, endpoint)
+    while True:
+        delay = bucket.reserve(_keep(bucket))
+        if not delay:
+            return
+        await asyncio.sleep(delay)
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _reset_in(headers, server_time_ms=None):
+    """Секунд до сброса окна по X-Bapi-Limit-Reset-Timestamp
+
+    Отсчитываем от серверного времени ответа (поле "time"), если оно есть,
+    чтобы не зависеть от расхождения часов.
+    """
+    reset_ts = _parse_int(headers.get(LIMIT_RESET_HEADER))
+    if reset_ts is None:
+        return None
+    base_ms = server_time_ms if server_time_ms else time.time() * 1000
+    return (reset_ts - base_ms) / 1000
+
+
+def update_from_response(api_key, endpoint, headers, payload=None):
+    """Обновляет бюджет по заголовкам и телу ответа Bybit"""
+    bucket = get_bucket(api_key, endpoint)
+    server_time_ms = payload.get("time") if isinstance(payload, dict) else None
+    reset_in = _reset_in(headers, _parse_int(server_time_ms))
+
+    if isinstance(payload, dict) and payload.get("retCode") == RATE_LIMIT_RET_CODE:
+        print(f"Превышен лимит запросов для {endpoint}, ждем сброса окна")
+        bucket.exhaust(reset_in)
+        return
+
+    bucket.update(
+        limit=_parse_int(headers.get(LIMIT_HEADER)),
+        remaining=_parse_int(headers.get(LIMIT_STATUS_HEADER)),
+        reset_in=reset_in
+    )
@@ -1,16 +1,28 @@
 import time
 import asyncio
+import contextlib
+import threading
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import httpx
 import uvicorn
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+import config
 import exchange
+import ratelimit
+import utils
+from cache_stats import stats as cache_stats
 import data
 import chart
+import history
+from singleflight import flights
 from datetime import datetime, timezone
-from utils import generate_cache_key, load_from_cache, save_to_cache
+from utils import (
+    generate_cache_key, get_cache_ttl, load_from_cache_async, save_to_cache_async, run_in_cache_pool,
+    cached_content_hash, get_or_build, cache_lock_async
+)
 
 # pip3 install fastapi uvicorn pydantic apscheduler requests
 
@@ -32,11 +44,423 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # WantedBy=multi-user.target
 
 
+# action -> (стандартный период из exchange.PERIOD_RANGES, заголовок)
+ACTION_PERIODS = {
+    "get_pnl_today": ("today", "Range: Today"),
+    "get_pnl_yesterday": ("yesterday", "Range: Yesterday"),
+    "get_pnl_current_month": ("current_month", "Range: Current Month"),
+    "get_pnl_previous_month": ("previous_month", "Range: Previous Month"),
+}
+
+# Закрытые позиции: (эндпоинт exchange.ENDPOINTS, фильтры)
+PNL_FEED = ("closed_pnl", {"category": "linear"})
+
+# Ключ в кеше transfers -> (эндпоинт exchange.ENDPOINTS, фильтры)
+TRANSFER_FEEDS = {
+    "inter": ("inter_transfers", {}),
+    "universal": ("universal_transfers", {}),
+    "deposits": ("deposits", {}),
+    "withdraws": ("withdraws", {}),
+}
+
+# Сколько секунд ждем все источники, прежде чем отрисовать то, что успело загрузиться
+FEEDS_DEADLINE = 120
+
+# Прогрев кеша: вскоре после полуночи UTC и начала месяца закрывшиеся сутки и месяц
+# загружаются заранее, и интерактивный запрос за них сразу попадает в кеш.
+# Аккаунты подключаются в config.PREWARM_ACCOUNTS = [(api_key, api_secret), ...]
+PREWARM_ACCOUNTS = getattr(config, "PREWARM_ACCOUNTS", [])
+PREWARM_CHART_TYPE = "pnl"
+# Пауза между аккаунтами, чтобы прогрев не шел сплошным потоком запросов
+PREWARM_PAUSE = 5
+# Прогрев начинается, когда период уже считается закрытым (CLOSED_PERIOD_DELAY) и
+# прошел запас минут на поздние исполнения: иначе в кеш попал бы незакрытый период
+PREWARM_MARGIN = 5
+PREWARM_MINUTE = -(-utils.CLOSED_PERIOD_DELAY // 60) + PREWARM_MARGIN
+scheduler = AsyncIOScheduler(timezone="UTC")
+
+# Как часто писать сводку статистики кеша в лог, минут
+CACHE_STATS_LOG_INTERVAL = 15
+
+# Накопительные ряды текущих периодов (build_plotly_series): блокировки и оценка памяти на позицию
+_SERIES_LOCKS = [threading.Lock() for _ in range(16)]
+SERIES_POINT_BYTES = 2 * 4 * 32
+
+
+async def fetch_feeds(api_key, api_secret, feeds, start_ms, end_ms, deadline=FEEDS_DEADLINE):
+    """Параллельно загружает независимые источники данных за один диапазон
+
+    Записи берутся из локального хранилища (store), с биржи догружается только
+    то, чего в нем еще нет (history.sync_range_async).
+
+    Args:
+        feeds: dict имя -> (эндпоинт exchange.ENDPOINTS, фильтры)
+        deadline: сколько секунд ждать; незавершенные загрузки отменяются
+
+    Returns:
+        dict: имя -> список записей; None для источников с ошибкой или не успевших к сроку
+    """
+    if not feeds:
+        return {}
+
+    tasks = {
+        name: asyncio.create_task(history.sync_range_async(endpoint, api_key, api_secret, start_ms, end_ms, **filters))
+        for name, (endpoint, filters) in feeds.items()
+    }
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for name, task in tasks.items():
+        if task in pending:
+            print(f"Загрузка {name} не уложилась в {deadline} с и отменена")
+            results[name] = None
+        elif task.exception() is not None:
+            print(f"Ошибка загрузки {name}: {task.exception()}")
+            results[name] = None
+        else:
+            results[name] = task.result()
+    return results
+
+
+async def load_feeds(api_key, api_secret, cache_key, start_ms, end_ms, cache_ttl):
+    """Данные страницы из кеша, недостающие источники - с биржи
+
+    Загрузка идет под блокировкой ключа: другой воркер, начавший ту же загрузку
+    раньше, держит ее до сохранения результата - дожидаемся и берем его из кеша.
+
+    Returns:
+        dict: pnl, executions, transfers, hashes (хеши содержимого трех источников),
+              rollups (дневные итоги PnL, если он загружен, а не взят из кеша),
+              cached (PnL взят из кеша); None, если не удалось загрузить PnL
+    """
+    executions_cache_key = cache_key + "_executions"
+    transfers_cache_key = cache_key + "_transfers"
+
+    async with cache_lock_async(cache_key):
+        # Проверяем кеш
+        pnl_data, executions_data, transfers_cached = await asyncio.gather(
+            load_from_cache_async(cache_key, cache_ttl),
+            load_from_cache_async(executions_cache_key, cache_ttl),
+            load_from_cache_async(transfers_cache_key, cache_ttl)
+        )
+
+        if pnl_data is not None:
+            print(f"Используем кешированные данные для ключа: {cache_key}")
+
+        # Все, чего нет в кеше, запускаем одновременно
+        feeds = {}
+        if pnl_data is None:
+            print(f"Загружаем новые данные для ключа: {cache_key}")
+            feeds["pnl"] = PNL_FEED
+        if executions_data is None:
+            print(f"Загружаем новые данные executions для ключа: {executions_cache_key}")
+            feeds["executions"] = ("executions", {"category": "spot"})
+        else:
+            print(f"Используем кешированные данные executions для ключа: {executions_cache_key}")
+        if transfers_cached is None:
+            print(f"Загружаем новые данные transfers для ключа: {transfers_cache_key}")
+            feeds.update(TRANSFER_FEEDS)
+        else:
+            print(f"Используем кешированные данные transfers для ключа: {transfers_cache_key}")
+
+        fetched = await fetch_feeds(api_key, api_secret, feeds, start_ms, end_ms)
+
+        pnl_fresh = pnl_data is None
+        rollups = None
+        if pnl_fresh:
+            if fetched.get("pnl") is None:
+                return None
+            pnl_data = fetched["pnl"]
+            await save_to_cache_async(cache_key, pnl_data, cache_ttl)
+            # Сводка строится по дневным итогам только что синхронизированных позиций
+            endpoint, filters = PNL_FEED
+            rollups = await history.query_rollups_async(endpoint, api_key, start_ms, end_ms, **filters)
+
+        executions_fresh = executions_data is None
+        if executions_fresh:
+            executions_data = fetched.get("executions")
+            if executions_data is None:
+                executions_data = []
+            else:
+                await save_to_cache_async(executions_cache_key, executions_data, cache_ttl)
+
+        transfers_fresh = transfers_cached is None
+        if transfers_fresh:
+            transfers_cached = {feed: fetched.get(feed) for feed in TRANSFER_FEEDS}
+            # В кеш попадают только полностью загруженные transfers
+            if all(records is not None for records in transfers_cached.values()):
+                await save_to_cache_async(transfers_cache_key, transfers_cached, cache_ttl)
+
+        # Хеши содержимого для производных артефактов пишутся под той же
+        # блокировкой, чтобы не разойтись с только что сохраненными данными
+        pnl_hash, executions_hash, transfers_hash = await asyncio.gather(
+            run_in_cache_pool(cached_content_hash, cache_key, pnl_data, cache_ttl, pnl_fresh),
+            run_in_cache_pool(cached_content_hash, executions_cache_key, executions_data, cache_ttl, executions_fresh),
+            run_in_cache_pool(cached_content_hash, transfers_cache_key, transfers_cached, cache_ttl, transfers_fresh)
+        )
+
+    return {
+        "pnl": pnl_data,
+        "executions": executions_data,
+        "transfers": transfers_cached,
+        "hashes": (pnl_hash, executions_hash, transfers_hash),
+        "rollups": rollups,
+        "cached": not pnl_fresh,
+        "cache_key": cache_key,
+        "cache_ttl": cache_ttl
+    }
+
+
+def _series_lock(cache_key):
+    """Блокировка рядов текущего периода cache_key (фиксированный набор на процесс)"""
+    return _SERIES_LOCKS[hash(cache_key) % len(_SERIES_LOCKS)]
+
+
+def _series_mark(records):
+    """Отметка конца ряда: время последней позиции и id позиций с этим временем"""
+    if not records:
+        return None, []
+    mark = exchange.record_time("closed_pnl", records[-1])
+    ids = []
+    for record in reversed(records):
+        if exchange.record_time("closed_pnl", record) != mark:
+            break
+        ids.append("|".join(exchange.record_id("closed_pnl", record)))
+    return mark, ids
+
+
+def _records_after_mark(state, records):
+    """Позиции, которых еще нет в ряду state, или None, если их не найти за O(новых)
+
+    records идут по времени (store.query_records). Новые - это позиции позже
+    отметки и позиции с временем отметки, которых не было в ряду; если вместе
+    с уже учтенными их меньше, чем записей, значит пришла запоздавшая позиция
+    раньше отметки (или позиции пропали) - ряд нужно строить заново.
+    """
+    mark, mark_ids = state["mark"], set(state["mark_ids"])
+    new_records = []
+    index = len(records)
+    while index and (mark is None or exchange.record_time("closed_pnl", records[index - 1]) >= mark):
+        index -= 1
+        record = records[index]
+        if mark is None or exchange.record_time("closed_pnl", record) > mark \
+                or "|".join(exchange.record_id("closed_pnl", record)) not in mark_ids:
+            new_records.append(record)
+
+    if state["count"] + len(new_records) != len(records):
+        return None
+    new_records.reverse()
+    return new_records
+
+
+def build_plotly_series(feeds_data):
+    """Накопительные ряды PnL текущего периода (cache_ttl задан) по данным load_feeds
+
+    Ряд с накопленными итогами и отметкой конца хранится в памяти процесса: при
+    обновлении к нему дописываются только позиции после отметки
+    (data.append_to_plotly_series). Если отметка нарушена - пришла позиция раньше
+    нее или позиции пропали, - а также в новом процессе ряд строится заново.
+    Вызывать под _series_lock: ряд дописывается на месте.
+    """
+    pnl_data = feeds_data["pnl"]
+    state_key = feeds_data["cache_key"] + "_series"
+
+    found, state = utils.memory_cache.get(state_key)
+    new_records = _records_after_mark(state, pnl_data) if found else None
+    if new_records is None:
+        plotly_data = data.prepare_data_for_plotly(pnl_data)
+    else:
+        plotly_data = data.append_to_plotly_series(state["series"], new_records)
+        if new_records:
+            print(f"Ряды дописаны: новых позиций {len(new_records)} из {len(pnl_data)}")
+
+    mark, mark_ids = _series_mark(pnl_data)
+    state = {"series": plotly_data, "count": len(pnl_data), "mark": mark, "mark_ids": mark_ids}
+    # Оценка памяти: четыре ряда по точке на позицию в каждом символе и в __ALL__
+    utils.memory_cache.put(state_key, state, len(pnl_data) * SERIES_POINT_BYTES)
+    return plotly_data
+
+
+def render_artifacts(feeds_data, chart_type):
+    """HTML блоки страницы результатов по данным load_feeds
+
+    Returns:
+        dict: graph_html (None, если график не построился), summary_html,
+              executions_html, transfers_html
+    """
+    executions_data = feeds_data["executions"]
+    transfers_cached = feeds_data["transfers"]
+    pnl_hash, executions_hash, transfers_hash = feeds_data["hashes"]
+
+    inter_transfers = transfers_cached.get('inter') or []
+    universal_transfers = transfers_cached.get('universal') or []
+    deposits = transfers_cached.get('deposits') or []
+    withdraws = transfers_cached.get('withdraws') or []
+
+    # Производные артефакты адресуются хешем сырых данных: при повторном просмотре
+    # подготовка данных и отрисовка пропускаются, при обновлении данных
+    # пересчитывается только то, что от них зависит
+    live = feeds_data["cache_ttl"] is not None
+
+    def get_plotly_data():
+        # Подготавливаем данные для графика; ряды текущего периода дописываются, а не строятся заново
+        if live:
+            return build_plotly_series(feeds_data)
+        return get_or_build("plotly_series", pnl_hash, lambda: data.prepare_data_for_plotly(feeds_data["pnl"]))
+
+    # Ряды текущего периода дописываются на месте - пока по ним строятся сводка и график, их не трогаем
+    with _series_lock(feeds_data["cache_key"]) if live else contextlib.nullcontext():
+        # Получаем статистику в HTML формате: по дневным итогам, если они есть, иначе по рядам
+        summary_html = get_or_build("summary_html", pnl_hash, lambda: (
+            data.get_rollup_summary_html(feeds_data["rollups"]) if feeds_data["rollups"] is not None
+            else data.get_data_summary_html(get_plotly_data())
+        ))
+
+        # Создаем график с выбранным типом
+        graph_html = get_or_build(f"graph_html_{chart_type}", pnl_hash, lambda: render_graph_html(get_plotly_data(), chart_type))
+    
+    executions_html = ""
+    transfers_html = ""
+    
+    # Обрабатываем executions данные
+    if executions_data:
+        try:
+            executions_html = get_or_build("executions_html", executions_hash, lambda: data.get_executions_summary_html(
+                data.prepare_executions_for_table(executions_data, details=False)
+            ))
+        except Exception as ex:
+            print(f"Ошибка обработки executions: {ex}")
+            executions_html = f"<p>Ошибка обработки данных executions: {ex}</p>"
+    
+    # Обрабатываем transfers данные
+    if inter_transfers or universal_transfers or deposits or withdraws:
+        try:
+            transfers_html = get_or_build("transfers_html", transfers_hash, lambda: data.get_transfers_summary_html(
+                data.prepare_transfers_for_table(
+                    inter_transfers=inter_transfers,
+                    universal_transfers=universal_transfers,
+                    deposits=deposits,
+                    withdraws=withdraws
+                )
+            ))
+        except Exception as ex:
+            print(f"Ошибка обработки transfers: {ex}")
+            transfers_html = f"<p>Ошибка обработки данных transfers: {ex}</p>"
+
+    return {
+        "graph_html": graph_html,
+        "summary_html": summary_html,
+        "executions_html": executions_html,
+        "transfers_html": transfers_html
+    }
+
+
+async def render_artifacts_async(feeds_data, chart_type):
+    """render_artifacts вне event loop: подготовка данных, отрисовка и чтение артефактов
+    из кеша не задерживают другие запросы"""
+    return await asyncio.get_running_loop().run_in_executor(None, render_artifacts, feeds_data, chart_type)
+
+
+def render_graph_html(plotly_data, chart_type):
+    """HTML график с выбранным типом или None, если построить его не удалось"""
+    fig = chart.create_plotly_chart(plotly_data, chart_type=chart_type)
+    if not fig:
+        return None
+    # Преобразуем график в HTML
+    return fig.to_html(full_html=False, include_plotlyjs='cdn')
+
+
+async def prewarm_account(api_key, api_secret, action):
+    """Загружает период action в кеш и строит для него страницу (график PREWARM_CHART_TYPE)"""
+    period, _ = ACTION_PERIODS[action]
+    start_ms, end_ms = exchange.PERIOD_RANGES[period]()
+    cache_key = generate_cache_key(api_key, action)
+
+    feeds_data = await flights.do_async(
+        "load_feeds", cache_key,
+        lambda: load_feeds(api_key, api_secret, cache_key, start_ms, end_ms, get_cache_ttl(end_ms))
+    )
+    if feeds_data is None:
+        raise RuntimeError("не удалось загрузить closed PnL")
+    await render_artifacts_async(feeds_data, PREWARM_CHART_TYPE)
+
+
+async def prewarm(action):
+    """Прогрев закрывшегося периода для всех подключенных аккаунтов
+
+    Аккаунты идут по очереди с низким приоритетом в лимитах запросов
+    (ratelimit.low_priority): интерактивным запросам остается часть бюджета.
+    При нескольких воркерах задачу запускает каждый, но второй упирается
+    в блокировку ключа и получает уже готовый кеш.
+    """
+    token = ratelimit.low_priority.set(True)
+    try:
+        for i, (api_key, api_secret) in enumerate(PREWARM_ACCOUNTS):
+            if i:
+                await asyncio.sleep(PREWARM_PAUSE)
+            started = time.time()
+            try:
+                await prewarm_account(api_key, api_secret, action)
+                print(f"Прогрев {action} для аккаунта {i + 1}/{len(PREWARM_ACCOUNTS)} за {time.time() - started:.1f} с")
+            except Exception as e:
+                print(f"Ошибка прогрева {action} для аккаунта {i + 1}/{len(PREWARM_ACCOUNTS)}: {e}")
+    finally:
+        ratelimit.low_priority.reset(token)
+
+
+def log_cache_stats():
+    print(cache_stats.summary())
+
+
+@app.on_event("startup")
+async def startup_event():
+    scheduler.add_job(log_cache_stats, "interval", minutes=CACHE_STATS_LOG_INTERVAL, id="cache_stats_log")
+    scheduler.start()
+    if not PREWARM_ACCOUNTS:
+        return
+    # Вчерашний день - через PREWARM_MINUTE минут после полуночи UTC, прошлый месяц - 1 числа чуть позже
+    scheduler.add_job(prewarm, "cron", hour=0, minute=PREWARM_MINUTE, args=["get_pnl_yesterday"],
+                      id="prewarm_yesterday", coalesce=True, max_instances=1, misfire_grace_time=3600)
+    scheduler.add_job(prewarm, "cron", day=1, hour=0, minute=PREWARM_MINUTE + 10, args=["get_pnl_previous_month"],
+                      id="prewarm_previous_month", coalesce=True, max_instances=1, misfire_grace_time=3600)
+    print(f"Прогрев кеша включен для аккаунтов: {len(PREWARM_ACCOUNTS)}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    log_cache_stats()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+    # Закрываем общий пул соединений к бирже
+    await exchange.close_async_client()
+    # Начатые записи в кеш должны дойти до диска
+    utils.shutdown_cache_io()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def main_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/cache/stats")
+async def cache_stats_page(format: str = "json"):
+    """Статистика кеша: попадания и промахи, объемы, задержки и вытеснения по видам данных"""
+    if format == "text":
+        return PlainTextResponse(cache_stats.summary())
+    return JSONResponse({
+        "kinds": cache_stats.snapshot(),
+        "memory": {
+            "entries": len(utils.memory_cache),
+            "bytes": utils.memory_cache.size,
+            "max_bytes": utils.memory_cache.max_bytes
+        },
+        "singleflight_saved": dict(flights.saved)
+    })
+
+
 @app.post("/process", response_class=HTMLResponse)
 async def process_form_loading(
     request: Request,
@@ -73,207 +497,47 @@ async def process_form(
     action: str = Form(...)
 ):
     try:
+        # Определяем диапазон один раз - все шесть источников грузятся за один и тот же период
+        if action in ACTION_PERIODS:
+            period, title = ACTION_PERIODS[action]
+            start_ms, end_ms = exchange.PERIOD_RANGES[period]()
+        elif action == "get_pnl_custom":
+            # Для кастомного периода нужно преобразовать даты в миллисекунды
+            if not (start_datetime and end_datetime):
+                return HTMLResponse(content="<h1>Error: Start and End datetime are required for custom range</h1>")
+            start_dt = datetime.fromisoformat(start_datetime).replace(tzinfo=timezone.utc)
+            end_dt = datetime.fromisoformat(end_datetime).replace(tzinfo=timezone.utc)
+            start_ms = int(start_dt.timestamp() * 1000)
+            end_ms = int(end_dt.timestamp() * 1000)
+            title = "Range: Custom Period"
+        else:
+            return HTMLResponse(content="<h1>Error: Unknown action</h1>")
+
         # Генерируем ключ кеша
         cache_key = generate_cache_key(api_key, action, start_datetime, end_datetime)
-        
-        # Проверяем кеш
-        pnl_data = load_from_cache(cache_key)
-        
-        if pnl_data is not None:
-            print(f"Используем кешированные данные для ключа: {cache_key}")
-            title_prefix = "[CACHED] "
-        else:
-            print(f"Загружаем новые данные для ключа: {cache_key}")
-            title_prefix = ""
-            
-            # Получаем данные в зависимости от action
-            if action == "get_pnl_today":
-                pnl_data = exchange.get_pnl_today(api_key, api_secret, category="linear")
-                title = "Range: Today"
-            elif action == "get_pnl_yesterday":
-                pnl_data = exchange.get_pnl_yesterday(api_key, api_secret, category="linear")
-                title = "Range: Yesterday"
-            elif action == "get_pnl_current_month":
-                pnl_data = exchange.get_pnl_current_month(api_key, api_secret, category="linear")
-                title = "Range: Current Month"
-            elif action == "get_pnl_previous_month":
-                pnl_data = exchange.get_pnl_previous_month(api_key, api_secret, category="linear")
-                title = "Range: Previous Month"
-            elif action == "get_pnl_custom":
-                # Для кастомного периода нужно преобразовать даты в миллисекунды
-                if start_datetime and end_datetime:
-                    start_dt = datetime.fromisoformat(start_datetime).replace(tzinfo=timezone.utc)
-                    end_dt = datetime.fromisoformat(end_datetime).replace(tzinfo=timezone.utc)
-                    start_ms = int(start_dt.timestamp() * 1000)
-                    end_ms = int(end_dt.timestamp() * 1000)
-                    pnl_data = exchange.get_all_closed_pnl(api_key, api_secret, category="linear", 
-                                                           start_time=start_ms, end_time=end_ms)
-                    title = f"Range: Custom Period"
-                else:
-                    return HTMLResponse(content="<h1>Error: Start and End datetime are required for custom range</h1>")
-            else:
-                return HTMLResponse(content="<h1>Error: Unknown action</h1>")
-            
-            # Сохраняем в кеш
-            save_to_cache(cache_key, pnl_data)
-        
-        # Устанавливаем заголовок если не был установлен (для кеша)
-        if 'title' not in locals():
-            if action == "get_pnl_today":
-                title = "Range: Today"
-            elif action == "get_pnl_yesterday":
-                title = "Range: Yesterday"
-            elif action == "get_pnl_current_month":
-                title = "Range: Current Month"
-            elif action == "get_pnl_previous_month":
-                title = "Range: Previous Month"
-            elif action == "get_pnl_custom":
-                title = "Range: Custom Period"
-        
-        title = title_prefix + title
-        
-        # Подготавливаем данные для графика
-        plotly_data = data.prepare_data_for_plotly(pnl_data)
-        
-        # Получаем статистику в HTML формате
-        summary_html = data.get_data_summary_html(plotly_data)
-        
-        # Создаем график с выбранным типом
-        fig = chart.create_plotly_chart(plotly_data, chart_type=chart_type)
-        
-        # --- Загрузка дополнительных данных: executions и transfers ---
-        executions_html = ""
-        transfers_html = ""
-        
-        # Проверяем кеш для executions
-        executions_cache_key = cache_key + "_executions"
-        executions_data = load_from_cache(executions_cache_key)
-        
-        if executions_data is not None:
-            print(f"Используем кешированные данные executions для ключа: {executions_cache_key}")
-        else:
-            print(f"Загружаем новые данные executions для ключа: {executions_cache_key}")
-            try:
-                if action == "get_pnl_today":
-                    executions_data = exchange.get_executions_today(api_key, api_secret, category="spot")
-                elif action == "get_pnl_yesterday":
-                    executions_data = exchange.get_executions_yesterday(api_key, api_secret, category="spot")
-                elif action == "get_pnl_current_month":
-                    executions_data = exchange.get_executions_current_month(api_key, api_secret, category="spot")
-                elif action == "get_pnl_previous_month":
-                    executions_data = exchange.get_executions_previous_month(api_key, api_secret, category="spot")
-                elif action == "get_pnl_custom":
-                    if start_datetime and end_datetime:
-                        start_dt = datetime.fromisoformat(start_datetime).replace(tzinfo=timezone.utc)
-                        end_dt = datetime.fromisoformat(end_datetime).replace(tzinfo=timezone.utc)
-                        start_ms = int(start_dt.timestamp() * 1000)
-                        end_ms = int(end_dt.timestamp() * 1000)
-                        executions_data = exchange.get_all_executions(api_key, api_secret, category="spot", 
-                                                                      start_time=start_ms, end_time=end_ms)
-                    else:
-                        executions_data = []
-                else:
-                    executions_data = []
-                
-                save_to_cache(executions_cache_key, executions_data)
-            except Exception as ex:
-                print(f"Ошибка загрузки executions: {ex}")
-                executions_data = []
-        
-        # Обрабатываем executions данные
-        if executions_data:
-            try:
-                executions_table_data = data.prepare_executions_for_table(executions_data)
-                executions_html = data.get_executions_summary_html(executions_table_data)
-            except Exception as ex:
-                print(f"Ошибка обработки executions: {ex}")
-                executions_html = f"<p>Ошибка обработки данных executions: {ex}</p>"
-        
-        # Проверяем кеш для transfers (inter, universal, deposits, withdraws)
-        transfers_cache_key = cache_key + "_transfers"
-        transfers_cached = load_from_cache(transfers_cache_key)
-        
-        if transfers_cached is not None:
-            print(f"Используем кешированные данные transfers для ключа: {transfers_cache_key}")
-            inter_transfers = transfers_cached.get('inter', [])
-            universal_transfers = transfers_cached.get('universal', [])
-            deposits = transfers_cached.get('deposits', [])
-            withdraws = transfers_cached.get('withdraws', [])
-        else:
-            print(f"Загружаем новые данные transfers для ключа: {transfers_cache_key}")
-            inter_transfers = []
-            universal_transfers = []
-            deposits = []
-            withdraws = []
-            
-            try:
-                if action == "get_pnl_today":
-                    inter_transfers = exchange.get_inter_transfers_today(api_key, api_secret)
-                    universal_transfers = exchange.get_universal_transfers_today(api_key, api_secret)
-                    deposits = exchange.get_deposits_today(api_key, api_secret)
-                    withdraws = exchange.get_withdraws_today(api_key, api_secret)
-                elif action == "get_pnl_yesterday":
-                    inter_transfers = exchange.get_inter_transfers_yesterday(api_key, api_secret)
-                    universal_transfers = exchange.get_universal_transfers_yesterday(api_key, api_secret)
-                    deposits = exchange.get_deposits_yesterday(api_key, api_secret)
-                    withdraws = exchange.get_withdraws_yesterday(api_key, api_secret)
-                elif action == "get_pnl_current_month":
-                    inter_transfers = exchange.get_inter_transfers_current_month(api_key, api_secret)
-                    universal_transfers = exchange.get_universal_transfers_current_month(api_key, api_secret)
-                    deposits = exchange.get_deposits_current_month(api_key, api_secret)
-                    withdraws = exchange.get_withdraws_current_month(api_key, api_secret)
-                elif action == "get_pnl_previous_month":
-                    inter_transfers = exchange.get_inter_transfers_previous_month(api_key, api_secret)
-                    universal_transfers = exchange.get_universal_transfers_previous_month(api_key, api_secret)
-                    deposits = exchange.get_deposits_previous_month(api_key, api_secret)
-                    withdraws = exchange.get_withdraws_previous_month(api_key, api_secret)
-                elif action == "get_pnl_custom":
-                    if start_datetime and end_datetime:
-                        start_dt = datetime.fromisoformat(start_datetime).replace(tzinfo=timezone.utc)
-                        end_dt = datetime.fromisoformat(end_datetime).replace(tzinfo=timezone.utc)
-                        start_ms = int(start_dt.timestamp() * 1000)
-                        end_ms = int(end_dt.timestamp() * 1000)
-                        inter_transfers = exchange.get_all_inter_transfers(api_key, api_secret, start_time=start_ms, end_time=end_ms)
-                        universal_transfers = exchange.get_all_universal_transfers(api_key, api_secret, start_time=start_ms, end_time=end_ms)
-                        deposits = exchange.get_all_deposits(api_key, api_secret, start_time=start_ms, end_time=end_ms)
-                        withdraws = exchange.get_all_withdraws(api_key, api_secret, start_time=start_ms, end_time=end_ms)
-                
-                # Сохраняем в кеш все transfers данные вместе
-                save_to_cache(transfers_cache_key, {
-                    'inter': inter_transfers,
-                    'universal': universal_transfers,
-                    'deposits': deposits,
-                    'withdraws': withdraws
-                })
-            except Exception as ex:
-                print(f"Ошибка загрузки transfers: {ex}")
-        
-        # Обрабатываем transfers данные
-        if inter_transfers or universal_transfers or deposits or withdraws:
-            try:
-                transfers_table_data = data.prepare_transfers_for_table(
-                    inter_transfers=inter_transfers,
-                    universal_transfers=universal_transfers,
-                    deposits=deposits,
-                    withdraws=withdraws
-                )
-                transfers_html = data.get_transfers_summary_html(transfers_table_data)
-            except Exception as ex:
-                print(f"Ошибка обработки transfers: {ex}")
-                transfers_html = f"<p>Ошибка обработки данных transfers: {ex}</p>"
-        
-        if fig:
-            # Преобразуем график в HTML
-            graph_html = fig.to_html(full_html=False, include_plotlyjs='cdn')
-            
+
+        # Закрытый период кешируем без срока, текущий - ненадолго: устаревшая запись
+        # обновляется загрузкой только хвоста после последней записи (history)
+        cache_ttl = get_cache_ttl(end_ms)
+
+        # Одинаковые одновременные запросы (двойной клик, две вкладки) делят одну загрузку
+        feeds_data = await flights.do_async(
+            "load_feeds", cache_key,
+            lambda: load_feeds(api_key, api_secret, cache_key, start_ms, end_ms, cache_ttl)
+        )
+        if feeds_data is None:
+            return HTMLResponse(content="<h1>Error: Could not load closed PnL</h1>")
+
+        if feeds_data["cached"]:
+            title = "[CACHED] " + title
+        artifacts = await render_artifacts_async(feeds_data, chart_type)
+
+        if artifacts["graph_html"]:
             # Возвращаем HTML страницу с графиком через шаблон
             return templates.TemplateResponse("results.html", {
                 "request": request,
                 "title": title,
-                "graph_html": graph_html,
-                "summary_html": summary_html,
-                "executions_html": executions_html,
-                "transfers_html": transfers_html,
+                **artifacts,
                 # Echo submitted form values so the results page can render a filled form
                 "api_key": api_key,
                 "api_secret": api_secret,
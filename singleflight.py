@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import Counter
+
+
+class _Call:
+    """Загрузка в процессе выполнения (для синхронных вызовов)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Объединение одинаковых одновременных загрузок внутри процесса
+
+    Пока загрузка по ключу выполняется, повторные вызовы с тем же ключом
+    не запускают свою, а ждут ее и получают тот же результат (или ту же ошибку).
+    Сэкономленные вызовы считаются в saved по виду загрузки.
+    """
+
+    def __init__(self):
+        self.saved = Counter()
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+
+    def do(self, kind, key, func):
+        """Выполняет func() или присоединяется к уже идущему вызову с тем же ключом"""
+        key = (kind, key)
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.saved[kind] += 1
+
+        if not leader:
+            print(f"Присоединяемся к уже идущей загрузке {kind} (сэкономлено: {self.saved[kind]})")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, kind, key, factory):
+        """Асинхронный вариант do: factory() возвращает корутину загрузки
+
+        Общая загрузка отменяется, только когда ее перестали ждать все вызвавшие.
+        """
+        key = (kind, key)
+        entry = self._tasks.get(key)
+        if entry is None:
+            entry = self._tasks[key] = [asyncio.ensure_future(factory()), 0]
+            entry[0].add_done_callback(lambda _: self._tasks.pop(key, None) if self._tasks.get(key) is entry else None)
+        else:
+            self.saved[kind] += 1
+            print(f"Присоединяемся к уже идущей загрузке {kind} (сэкономлено: {self.saved[kind]})")
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+
+flights = SingleFlight()
+
+# Шаг, до которого в ключе округляется конец открытого периода ("текущий месяц" идет
+# до текущего момента) - столько же, сколько кешируется открытый период (utils.LIVE_CACHE_TTL)
+LIVE_KEY_STEP = 60
+
+
+def flight_key(name, api_key, start_time, end_time, filters):
+    """Ключ загрузки: аккаунт, эндпоинт, диапазон и фильтры
+
+    Конец открытого периода - это момент запроса, он у каждого вызова свой. В ключ
+    идет номер шага LIVE_KEY_STEP, на который он приходится, иначе одновременные
+    запросы текущего периода никогда бы не объединялись.
+    """
+    api_hash = hashlib.md5(api_key.encode()).hexdigest()[:8]
+    step_ms = LIVE_KEY_STEP * 1000
+    if end_time is not None and end_time > time.time() * 1000 - step_ms:
+        end_time = ("live", end_time // step_ms)
+    return api_hash, name, start_time, end_time, tuple(sorted(filters.items()))
@@ -0,0 +1,329 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import exchange
+from utils import CACHE_DIR
+
+
+# Локальное хранилище сырых записей биржи: одна таблица на эндпоинт exchange.ENDPOINTS
+STORE_PATH = os.path.join(CACHE_DIR, "trades.sqlite3")
+
+# Дневные итоги по символам (UTC): таблица {эндпоинт}_daily, колонки - суммы за день.
+# Пересчитываются из сырых записей за те дни, в которые пришли новые записи (save_records),
+# так что период любой длины читается как несколько сотен строк итогов
+DAY_MS = 24 * 60 * 60 * 1000
+ROLLUP_COLUMNS = {
+    "closed_pnl": ("trades", "pnl", "fees", "volume"),
+    "executions": (
+        "executions", "volume", "fees",
+        "maker_count", "taker_count", "maker_volume", "taker_volume", "maker_fees", "taker_fees"
+    ),
+}
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def account_hash(api_key):
+    """Хеш API ключа - под ним аккаунт хранится в базе (как и в ключах кеша)"""
+    return hashlib.md5(api_key.encode()).hexdigest()[:8]
+
+
+def filters_key(filters):
+    """Строка фильтров запроса (category, coin...) для колонки category"""
+    return "_".join(str(filters[key]) for key in sorted(filters) if filters[key])
+
+
+def _create_schema(conn):
+    for name in exchange.ENDPOINTS:
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                account TEXT NOT NULL,
+                category TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                time INTEGER NOT NULL,
+                record_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                UNIQUE (account, category, record_id)
+            )
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_symbol_time ON {name} (account, category, symbol, time)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_time ON {name} (account, category, time)")
+
+    # Карта покрытия: интервалы времени (мс), за которые источник полностью загружен с биржи
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS coverage (
+            account TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            category TEXT NOT NULL,
+            start_ms INTEGER NOT NULL,
+            end_ms INTEGER NOT NULL,
+            PRIMARY KEY (account, endpoint, category, start_ms)
+        )
+    """)
+    conn.commit()
+
+
+def _create_rollup_schema(conn):
+    """Таблицы дневных итогов; при первом создании заполняются из уже сохраненных записей
+
+    Проверка, создание и заполнение идут в одной транзакции под блокировкой записи
+    (BEGIN IMMEDIATE): из нескольких процессов таблицу создает и заполняет ровно один,
+    остальные дожидаются его коммита и видят готовую таблицу.
+    """
+    for name, columns in ROLLUP_COLUMNS.items():
+        value_columns = ", ".join(f"{column} REAL NOT NULL" for column in columns)
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (f"{name}_daily",)
+            ).fetchone()
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {name}_daily (
+                    account TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    day INTEGER NOT NULL,
+                    symbol TEXT NOT NULL,
+                    {value_columns},
+                    first_time INTEGER NOT NULL,
+                    last_time INTEGER NOT NULL,
+                    PRIMARY KEY (account, category, day, symbol)
+                )
+            """)
+            if exists:
+                continue
+
+            for account, category, day in conn.execute(
+                f"SELECT DISTINCT account, category, time - time % {DAY_MS} FROM {name}"
+            ).fetchall():
+                _refresh_rollups(conn, name, account, category, [day])
+
+
+def get_connection(path=None):
+    """Соединение с базой для текущего потока (sqlite3 не делит соединения между потоками)"""
+    path = path or STORE_PATH
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if path not in _initialized:
+                _create_schema(conn)
+                _create_rollup_schema(conn)
+                _initialized.add(path)
+        connections[path] = conn
+    return conn
+
+
+def save_records(name, account, category, records, default_time=0):
+    """Сохраняет записи эндпоинта name; повторно пришедшие записи перезаписываются по id
+
+    Args:
+        default_time: время (мс) для записей без времени (депозит в обработке приходит
+                      с successAt "0") - иначе индекс по времени их не найдет, пока
+                      биржа не пришлет запись с временем и она не перезапишется по id
+
+    Returns:
+        int: сколько записей записано
+    """
+    rows = [
+        (
+            account,
+            category,
+            record.get("symbol") or record.get("coin") or "",
+            exchange.record_time(name, record) or default_time,
+            "|".join(exchange.record_id(name, record)),
+            json.dumps(record, ensure_ascii=False)
+        )
+        for record in records
+    ]
+    if not rows:
+        return 0
+
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {name} (account, category, symbol, time, record_id, data) "
+            f"VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        if name in ROLLUP_COLUMNS:
+            _refresh_rollups(conn, name, account, category, {row[3] - row[3] % DAY_MS for row in rows})
+    return len(rows)
+
+
+def _is_maker(record):
+    return record.get("isMaker") in (True, "true", 1)
+
+
+def _rollup_values(name, record):
+    """Вклад одной записи в колонки ROLLUP_COLUMNS[name]"""
+    if name == "closed_pnl":
+        return (
+            1,
+            float(record.get("closedPnl", "0")),
+            float(record.get("closeFee", "0")) + float(record.get("openFee", "0")),
+            float(record.get("cumEntryValue", "0")) + float(record.get("cumExitValue", "0"))
+        )
+
+    value = float(record.get("execValue", "0"))
+    fee = float(record.get("execFee", "0"))
+    maker = _is_maker(record)
+    return (
+        1, value, fee,
+        int(maker), int(not maker),
+        value if maker else 0.0, 0.0 if maker else value,
+        fee if maker else 0.0, 0.0 if maker else fee
+    )
+
+
+def _sum_records(conn, name, account, category, start_ms, end_ms):
+    """Итоги по символам из сырых записей за [start_ms, end_ms]
+
+    Returns:
+        dict: символ -> [суммы колонок ROLLUP_COLUMNS[name], first_time, last_time]
+    """
+    totals = {}
+    rows = conn.execute(
+        f"SELECT symbol, time, data FROM {name} WHERE account = ? AND category = ? "
+        f"AND time BETWEEN ? AND ? ORDER BY time",
+        (account, category, start_ms, end_ms)
+    )
+    for symbol, time_ms, data in rows:
+        values = _rollup_values(name, json.loads(data))
+        symbol_totals = totals.get(symbol)
+        if symbol_totals is None:
+            totals[symbol] = [list(values), time_ms, time_ms]
+        else:
+            sums = symbol_totals[0]
+            for i, value in enumerate(values):
+                sums[i] += value
+            symbol_totals[2] = time_ms
+    return totals
+
+
+def _refresh_rollups(conn, name, account, category, days):
+    """Пересчитывает дневные итоги дней days (начало дня в мс) из сырых записей"""
+    columns = ROLLUP_COLUMNS[name]
+    insert = (
+        f"INSERT INTO {name}_daily (account, category, day, symbol, {', '.join(columns)}, first_time, last_time) "
+        f"VALUES ({', '.join('?' * (len(columns) + 6))})"
+    )
+
+    for day in sorted(days):
+        totals = _sum_records(conn, name, account, category, day, day + DAY_MS - 1)
+        conn.execute(
+            f"DELETE FROM {name}_daily WHERE account = ? AND category = ? AND day = ?",
+            (account, category, day)
+        )
+        conn.executemany(insert, [
+            (account, category, day, symbol, *sums, first_time, last_time)
+            for symbol, (sums, first_time, last_time) in totals.items()
+        ])
+
+
+def query_rollups(name, account, category, start_ms, end_ms):
+    """Итоги эндпоинта name (closed_pnl, executions) по дням и символам за [start_ms, end_ms]
+
+    Целые дни читаются из {name}_daily, а крайние дни, границы которых проходят
+    внутри дня (период "сегодня" до текущего момента, произвольный диапазон),
+    считаются из сырых записей - итоги совпадают с итогами записей периода.
+
+    Returns:
+        list: словари {day (начало дня, мс), symbol, колонки ROLLUP_COLUMNS[name],
+              first_time, last_time} по возрастанию дня
+    """
+    columns = ("day", "symbol") + ROLLUP_COLUMNS[name] + ("first_time", "last_time")
+    conn = get_connection()
+
+    first_day = start_ms - start_ms % DAY_MS
+    last_day = end_ms - end_ms % DAY_MS
+    partial_days = set()
+    if start_ms != first_day:
+        partial_days.add(first_day)
+    if end_ms != last_day + DAY_MS - 1:
+        partial_days.add(last_day)
+
+    full_start = first_day + DAY_MS if first_day in partial_days else first_day
+    full_end = last_day - DAY_MS if last_day in partial_days else last_day
+    result = [
+        dict(zip(columns, row))
+        for row in conn.execute(
+            f"SELECT {', '.join(columns)} FROM {name}_daily WHERE account = ? AND category = ? "
+            f"AND day BETWEEN ? AND ?",
+            (account, category, full_start, full_end)
+        )
+    ]
+    for day in partial_days:
+        totals = _sum_records(conn, name, account, category, max(start_ms, day), min(end_ms, day + DAY_MS - 1))
+        result.extend(
+            dict(zip(columns, (day, symbol, *sums, first_time, last_time)))
+            for symbol, (sums, first_time, last_time) in totals.items()
+        )
+
+    result.sort(key=lambda row: (row["day"], row["symbol"]))
+    return result
+
+
+def query_records(name, account, category, start_ms, end_ms, symbol=None):
+    """Записи эндпоинта name за [start_ms, end_ms] по возрастанию времени (индексный поиск по диапазону)"""
+    sql = f"SELECT data FROM {name} WHERE account = ? AND category = ?"
+    args = [account, category]
+    if symbol:
+        sql += " AND symbol = ?"
+        args.append(symbol)
+    sql += " AND time BETWEEN ? AND ? ORDER BY time"
+    args += [start_ms, end_ms]
+
+    return [json.loads(row[0]) for row in get_connection().execute(sql, args)]
+
+
+def latest_time(name, account, category, start_ms, end_ms):
+    """Время последней записи в [start_ms, end_ms] или None"""
+    row = get_connection().execute(
+        f"SELECT MAX(time) FROM {name} WHERE account = ? AND category = ? AND time BETWEEN ? AND ?",
+        (account, category, start_ms, end_ms)
+    ).fetchone()
+    return row[0]
+
+
+def get_coverage(name, account, category):
+    """Загруженные интервалы источника: отсортированный список (start_ms, end_ms) без пересечений"""
+    rows = get_connection().execute(
+        "SELECT start_ms, end_ms FROM coverage WHERE account = ? AND endpoint = ? AND category = ? ORDER BY start_ms",
+        (account, name, category)
+    )
+    return [(row[0], row[1]) for row in rows]
+
+
+def add_coverage(name, account, category, start_ms, end_ms):
+    """Отмечает [start_ms, end_ms] загруженным, склеивая его с пересекающимися и соседними интервалами"""
+    conn = get_connection()
+    with conn:
+        key = (account, name, category)
+        rows = conn.execute(
+            "SELECT start_ms, end_ms FROM coverage WHERE account = ? AND endpoint = ? AND category = ? "
+            "AND start_ms <= ? AND end_ms >= ?",
+            key + (end_ms + 1, start_ms - 1)
+        ).fetchall()
+        for row_start, row_end in rows:
+            start_ms = min(start_ms, row_start)
+            end_ms = max(end_ms, row_end)
+
+        conn.execute(
+            "DELETE FROM coverage WHERE account = ? AND endpoint = ? AND category = ? "
+            "AND start_ms BETWEEN ? AND ?",
+            key + (start_ms, end_ms)
+        )
+        conn.execute(
+            "INSERT INTO coverage (account, endpoint, category, start_ms, end_ms) VALUES (?, ?, ?, ?, ?)",
+            key + (start_ms, end_ms)
+        )
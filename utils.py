@@ -1,16 +1,74 @@
+import asyncio
 import hashlib
+import json
 import os
-import pickle
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone, timedelta
 import httpx
+import codec
+import exchange
+from cache_backend import create_backend
 import config
+from cache_stats import stats
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
 
 
 # Папка для кеша
 CACHE_DIR = "cache"
+CACHE_EXTENSION = ".pnlc"
+# Файлы старого формата (pickle) больше не читаются, их только вычищает evict_disk_cache
+LEGACY_CACHE_EXTENSION = ".pkl"
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+# Производные артефакты (get_or_build): версия их формата входит в ключ. Увеличивается,
+# когда меняется содержимое артефакта, - например, x рядов plotly_series стали
+# миллисекундами вместо datetime: записи прежнего формата не читаются и вытесняются по сроку
+DERIVED_FORMAT_VERSION = 2
+DERIVED_PREFIX = f"derived_v{DERIVED_FORMAT_VERSION}_"
+
+# Память: горячие ключи отдаются без чтения диска и декодирования
+MEMORY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+MEMORY_CACHE_TTL = 10 * 60
+
+# Хранилище кеша (второй уровень): None - папка CACHE_DIR, "sqlite:путь" - файл SQLite,
+# "redis://хост:порт/база" - сервер Redis, общий для нескольких хостов за балансировщиком
+CACHE_BACKEND_URL = getattr(config, "CACHE_BACKEND_URL", None)
+
+# Диск: файлы, которые не читали дольше срока, удаляются, при превышении объема - самые давно использованные
+DISK_CACHE_TTL = 30 * 24 * 60 * 60
+DISK_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+DISK_EVICT_INTERVAL = 5 * 60
+
+# Потоки для чтения/записи кеша из асинхронного кода: диск и (де)сериализация
+# не блокируют event loop, а число одновременных операций ограничено
+CACHE_IO_WORKERS = 4
+
+# Блокировки ключей между процессами (воркерами uvicorn): пока файл блокировки
+# захвачен, по ключу идет загрузка - остальные ждут ее результата, а не повторяют запросы к бирже
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+os.makedirs(LOCK_DIR, exist_ok=True)
+LOCK_TIMEOUT = 150
+LOCK_POLL_INTERVAL = 0.1
+# Файл блокировки на каждый ключ: свободные файлы старше суток удаляет evict_disk_cache
+LOCK_FILE_TTL = 24 * 60 * 60
+
+# Свежесть: закрытые периоды не меняются и кешируются без срока, а текущие
+# ("сегодня", "текущий месяц") дописываются - их запись считается свежей столько секунд
+LIVE_CACHE_TTL = 60
+# Сколько секунд после конца периода он еще считается текущим
+CLOSED_PERIOD_DELAY = 10 * 60
+
 
 async def send_telegram_message(chat_id: int, chat: int, text: str):
     TOKEN = config.TELEGRAM_BOT_TOKEN 
@@ -71,6 +129,25 @@ def generate_cache_key(api_key: str, action: str, start_datetime: str = None, en
     return sanitize_cache_key(f"{api_hash}_{action}_unknown")
 
 
+def get_cache_ttl(end_ms, now_ms=None):
+    """Срок свежести кеша для диапазона, заканчивающегося в end_ms
+
+    Период закрыт, только если его конец прошел больше CLOSED_PERIOD_DELAY назад:
+    "текущий месяц" заканчивается "сейчас" (момент расчета диапазона), и без
+    запаса он считался бы закрытым уже к моменту проверки. Запас заодно дает
+    бирже время отдать записи, пришедшие с задержкой.
+
+    Returns:
+        None, если период уже закрыт (данные за него не изменятся),
+        иначе LIVE_CACHE_TTL
+    """
+    if now_ms is None:
+        now_ms = time.time() * 1000
+    if end_ms is not None and end_ms + CLOSED_PERIOD_DELAY * 1000 < now_ms:
+        return None
+    return LIVE_CACHE_TTL
+
+
 def sanitize_cache_key(key: str) -> str:
     """Sanitize a cache key so it becomes a valid filename on Windows and other OS.
 
@@ -89,30 +166,389 @@ def sanitize_cache_key(key: str) -> str:
     return safe
 
 
-def get_cache_file_path(cache_key: str) -> str:
-    """Возвращает путь к файлу кеша"""
-    return os.path.join(CACHE_DIR, f"{cache_key}.pkl")
+class MemoryCache:
+    """LRU кеш в памяти с ограничением по объему и сроком жизни записей
 
+    Объем считается по размеру распакованной записи (codec.payload_size) -
+    его все равно получаем при сохранении на диск или чтении с диска.
+    """
 
-def load_from_cache(cache_key: str):
-    """Загружает данные из кеша"""
-    cache_file = get_cache_file_path(cache_key)
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, "rb") as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"Ошибка загрузки кеша: {e}")
-            return None
-    return None
+    def __init__(self, max_bytes=MEMORY_CACHE_MAX_BYTES, ttl=MEMORY_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()   # ключ -> (данные, размер, когда истекает, когда записаны)
+        self._lock = threading.Lock()
+
+    def get(self, key, max_age=None):
+        """Возвращает (True, данные) или (False, None), если записи нет, она истекла
+        или записана раньше, чем max_age секунд назад"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry[2] <= time.monotonic():
+                self._remove(key)
+                return False, None
+            if max_age is not None and time.time() - entry[3] > max_age:
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value, size, ttl=None, written_at=None):
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            ttl = self.ttl if ttl is None else ttl
+            written_at = time.time() if written_at is None else written_at
+            self._entries[key] = (value, size, time.monotonic() + ttl, written_at)
+            self.size += size
+            # Вытесняем самые давно использованные записи
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                stats.count(cache_kind(oldest), "evictions_memory")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pop(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+
+memory_cache = MemoryCache()
+_cache_executor = ThreadPoolExecutor(max_workers=CACHE_IO_WORKERS, thread_name_prefix="cache-io")
+cache_backend = create_backend(
+    CACHE_BACKEND_URL, CACHE_DIR, CACHE_EXTENSION, (LEGACY_CACHE_EXTENSION,),
+    tmp_max_age=LOCK_TIMEOUT, idle_ttl=DISK_CACHE_TTL
+)
+_last_disk_eviction = 0.0
+
+
+def evict_disk_cache(max_age=DISK_CACHE_TTL, max_bytes=DISK_CACHE_MAX_BYTES):
+    """Чистит хранилище кеша: сначала записи, которые не читали дольше max_age,
+    затем самые давно использованные, пока общий объем не станет меньше max_bytes.
+    Заодно удаляет брошенные чекпоинты загрузок (exchange.sweep_checkpoints)
+    и свободные файлы блокировок (evict_lock_files)
+
+    Returns:
+        int: сколько записей удалено
+    """
+    removed = cache_backend.evict(max_age, max_bytes)
+    for cache_key in removed:
+        memory_cache.pop(cache_key)
+        stats.count(cache_kind(cache_key), "evictions_disk")
+
+    if removed:
+        print(f"Из хранилища кеша удалено записей: {len(removed)}")
+
+    checkpoints = exchange.sweep_checkpoints()
+    if checkpoints:
+        print(f"Удалено брошенных чекпоинтов: {checkpoints}")
+    lock_files = evict_lock_files()
+    if lock_files:
+        print(f"Удалено файлов блокировок: {lock_files}")
+    return len(removed)
 
 
-def save_to_cache(cache_key: str, data):
-    """Сохраняет данные в кеш"""
-    cache_file = get_cache_file_path(cache_key)
+def _maybe_evict_disk_cache():
+    """Запускает очистку диска не чаще раза в DISK_EVICT_INTERVAL секунд"""
+    global _last_disk_eviction
+    now = time.monotonic()
+    if now - _last_disk_eviction < DISK_EVICT_INTERVAL:
+        return
+    _last_disk_eviction = now
     try:
-        with open(cache_file, "wb") as f:
-            pickle.dump(data, f)
-        print(f"Данные сохранены в кеш: {cache_file}")
+        evict_disk_cache()
+    except Exception as e:
+        print(f"Ошибка очистки кеша: {e}")
+
+
+def cache_kind(cache_key: str) -> str:
+    """Вид данных записи для статистики: pnl, executions, transfers, hash, series или вид артефакта"""
+    if cache_key.startswith(DERIVED_PREFIX):
+        return cache_key[len(DERIVED_PREFIX):].rsplit("_", 1)[0]
+    for suffix in ("hash", "executions", "transfers", "series"):
+        if cache_key.endswith("_" + suffix):
+            return suffix
+    return "pnl"
+
+
+def load_from_cache(cache_key: str, max_age=None):
+    """Загружает данные из кеша: сначала из памяти, затем из хранилища (cache_backend)
+
+    Args:
+        max_age: сколько секунд с момента записи данные считаются свежими
+                 (None - всегда); устаревшая запись не возвращается, но и не удаляется -
+                 ее перезапишет следующее сохранение
+    """
+    kind = cache_kind(cache_key)
+    started = time.perf_counter()
+    data, outcome = _load(cache_key, kind, max_age)
+    stats.count(kind, outcome)
+    stats.observe(kind, "load_ms", time.perf_counter() - started)
+    return data
+
+
+def _load(cache_key, kind, max_age):
+    """Returns: (данные, исход для статистики)"""
+    found, data = memory_cache.get(cache_key, max_age)
+    if found:
+        return data, "hits_memory"
+
+    try:
+        entry = cache_backend.get(cache_key, max_age)
+        if entry is None:
+            return None, "misses"
+        raw, written_at = entry
+        if raw is None:
+            return None, "stale"
+        decode_started = time.perf_counter()
+        data = codec.loads(raw, allow_pickle=not cache_backend.shared)
+        stats.observe(kind, "decode_ms", time.perf_counter() - decode_started)
+    except Exception as e:
+        print(f"Ошибка загрузки кеша: {e}")
+        return None, "errors"
+
+    stats.count(kind, "bytes_read", len(raw))
+    memory_cache.put(cache_key, data, codec.payload_size(raw), written_at=written_at)
+    return data, "hits_disk"
+
+
+def save_to_cache(cache_key: str, data, ttl=None):
+    """Сохраняет данные в кеш (в хранилище и в память)
+
+    Args:
+        ttl: срок свежести записи в секундах - в памяти она живет не дольше
+             (по умолчанию MEMORY_CACHE_TTL); при чтении свежесть проверяет max_age
+    """
+    kind = cache_kind(cache_key)
+    try:
+        encode_started = time.perf_counter()
+        raw = codec.dumps(data, compact=cache_backend.shared)
+        stats.observe(kind, "encode_ms", time.perf_counter() - encode_started)
+        cache_backend.put(cache_key, raw)
+        print(f"Данные сохранены в кеш: {cache_backend.describe(cache_key)}")
     except Exception as e:
         print(f"Ошибка сохранения в кеш: {e}")
+        stats.count(kind, "errors")
+        return
+
+    stats.count(kind, "writes")
+    stats.count(kind, "bytes_written", len(raw))
+    memory_cache.put(cache_key, data, codec.payload_size(raw), None if ttl is None else min(ttl, MEMORY_CACHE_TTL))
+    _maybe_evict_disk_cache()
+
+
+async def run_in_cache_pool(func, *args):
+    """Выполняет синхронную операцию с кешем в пуле CACHE_IO_WORKERS потоков"""
+    return await asyncio.get_running_loop().run_in_executor(_cache_executor, func, *args)
+
+
+async def load_from_cache_async(cache_key: str, max_age=None):
+    """Асинхронный load_from_cache: попадание в память отдается сразу,
+    чтение с диска и декодирование идут в пуле потоков"""
+    started = time.perf_counter()
+    found, data = memory_cache.get(cache_key, max_age)
+    if found:
+        kind = cache_kind(cache_key)
+        stats.count(kind, "hits_memory")
+        stats.observe(kind, "load_ms", time.perf_counter() - started)
+        return data
+    return await run_in_cache_pool(load_from_cache, cache_key, max_age)
+
+
+async def save_to_cache_async(cache_key: str, data, ttl=None):
+    """Асинхронный save_to_cache: кодирование и запись идут в пуле потоков"""
+    await run_in_cache_pool(save_to_cache, cache_key, data, ttl)
+
+
+def shutdown_cache_io():
+    """Дожидается начатых записей в кеш и останавливает пул потоков"""
+    _cache_executor.shutdown(wait=True)
+
+
+def content_hash(value) -> str:
+    """Хеш содержимого сырых данных - по нему адресуются производные артефакты"""
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+def cached_content_hash(cache_key: str, value, ttl=None, fresh=False) -> str:
+    """Хеш содержимого записи кеша cache_key
+
+    Считается один раз, когда данные сохраняются (fresh=True), и хранится рядом
+    с ними: после чтения с диска codec отдает числа вместо строк, и хеш
+    прочитанного не совпал бы с хешем только что загруженного.
+    """
+    hash_key = cache_key + "_hash"
+    if not fresh:
+        digest = load_from_cache(hash_key)
+        if digest is not None:
+            return digest
+
+    digest = content_hash(value)
+    save_to_cache(hash_key, digest, ttl)
+    return digest
+
+
+def get_or_build(kind: str, content_key: str, build):
+    """Производный артефакт (plotly_data, HTML сводки, графика...) из кеша или build()
+
+    Ключ - вид артефакта и хеш исходных данных: при обновлении сырых данных
+    меняется хеш, и пересчитываются только зависящие от них артефакты.
+    None не кешируется.
+    """
+    cache_key = sanitize_cache_key(f"{DERIVED_PREFIX}{kind}_{content_key}")
+    value = load_from_cache(cache_key)
+    if value is None:
+        value = build()
+        if value is not None:
+            save_to_cache(cache_key, value)
+    return value
+
+
+def _try_lock(fd):
+    """Неблокирующий захват файла блокировки; снимается ОС и при падении процесса"""
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd):
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _lock_path(key):
+    return os.path.join(LOCK_DIR, f"{sanitize_cache_key(key)}.lock")
+
+
+def _try_lock_file(path, fd):
+    """Захват файла блокировки path через открытый fd
+
+    Файл могли удалить (evict_lock_files) между открытием и захватом - тогда
+    захвачен файл, которого никто больше не откроет: открываем путь заново.
+
+    Returns:
+        tuple: (захвачена ли блокировка, fd - новый, если файл открыт заново)
+    """
+    while _try_lock(fd):
+        try:
+            if os.path.samestat(os.fstat(fd), os.stat(path)):
+                return True, fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    return False, fd
+
+
+def evict_lock_files(max_age=LOCK_FILE_TTL):
+    """Удаляет файлы блокировок старше max_age секунд, которые сейчас никто не держит
+
+    Файл удаляется под его же блокировкой: тот, кто открыл его раньше и ждет,
+    после захвата увидит, что файл удален, и откроет путь заново (_try_lock_file).
+
+    Returns:
+        int: сколько файлов удалено
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for file_name in os.listdir(LOCK_DIR):
+        if not file_name.endswith(".lock"):
+            continue
+        path = os.path.join(LOCK_DIR, file_name)
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            print(f"Ошибка удаления файла блокировки: {e}")
+            continue
+
+        try:
+            # Файл по пути мог смениться, пока мы его открывали (удалила очистка в другом процессе)
+            if _try_lock(fd) and os.path.samestat(os.fstat(fd), os.stat(path)):
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Ошибка удаления файла блокировки: {e}")
+        finally:
+            os.close(fd)
+    return removed
+
+
+@contextmanager
+def cache_lock(key: str, timeout=LOCK_TIMEOUT):
+    """Блокировка ключа между процессами и потоками
+
+    Ждет не дольше timeout секунд; если держатель так и не отпустил ключ,
+    работа продолжается без блокировки (в худшем случае - повторная загрузка).
+
+    Yields:
+        bool: захвачена ли блокировка
+    """
+    path = _lock_path(key)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        deadline = time.monotonic() + timeout
+        locked, fd = _try_lock_file(path, fd)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            locked, fd = _try_lock_file(path, fd)
+        if not locked:
+            print(f"Не дождались блокировки {key} за {timeout} с, продолжаем без нее")
+        try:
+            yield locked
+        finally:
+            if locked:
+                _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+@asynccontextmanager
+async def cache_lock_async(key: str, timeout=LOCK_TIMEOUT):
+    """Асинхронный вариант cache_lock: ожидание не блокирует event loop"""
+    path = _lock_path(key)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT)
+    try:
+        deadline = time.monotonic() + timeout
+        locked, fd = _try_lock_file(path, fd)
+        while not locked and time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            locked, fd = _try_lock_file(path, fd)
+        if not locked:
+            print(f"Не дождались блокировки {key} за {timeout} с, продолжаем без нее")
+        try:
+            yield locked
+        finally:
+            if locked:
+                _unlock(fd)
+    finally:
+        os.close(fd)